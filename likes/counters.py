@@ -0,0 +1,189 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, When
+from mosh_django.caching import incr
+
+from .models import LikeCount, LikedItem
+
+PREFIX = 'likes:counter:'
+SEQUENCE_KEY = PREFIX + 'dirty'
+FLUSHED_KEY = PREFIX + 'flushed'
+LOCK_KEY = PREFIX + 'lock'
+# an object whose registration got lost is registered again after this long
+MARK_TIMEOUT = 60 * 60
+LOCK_TIMEOUT = 60 * 5
+# caches no other process sees, deltas buffered there would never be flushed
+LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+def get_cache():
+    return caches[getattr(settings, 'LIKES_COUNTER_CACHE_ALIAS', 'default')]
+
+
+def is_buffered():
+    """
+    Whether likes are buffered in the counter cache. That takes a cache
+    shared by every process (Redis, Memcached...): with a local memory one
+    flush_like_counts would never see the deltas and a restart would lose
+    them, so LikeCount is updated right away instead.
+    """
+    return not isinstance(get_cache(), LOCAL_CACHES)
+
+
+def _delta_key(content_type_id, object_id):
+    return '{}delta:{}:{}'.format(PREFIX, content_type_id, object_id)
+
+
+def _mark_key(content_type_id, object_id):
+    return '{}mark:{}:{}'.format(PREFIX, content_type_id, object_id)
+
+
+def _dirty_key(sequence):
+    return '{}dirty:{}'.format(PREFIX, sequence)
+
+
+def add(content_type_id, object_id, delta):
+    """
+    Count `delta` more likes for the object.
+
+    Only the cache is written: a pending delta per object, and the first
+    change since the last flush registers the object for `flush()`. Without
+    a shared cache (see is_buffered()) LikeCount is updated in place.
+    """
+    if not is_buffered():
+        _write_now(content_type_id, object_id, delta)
+        return
+    cache = get_cache()
+    incr(cache, _delta_key(content_type_id, object_id), delta)
+    if cache.add(_mark_key(content_type_id, object_id), 1, timeout=MARK_TIMEOUT):
+        sequence = incr(cache, SEQUENCE_KEY)
+        cache.set(_dirty_key(sequence), (content_type_id, object_id), timeout=None)
+
+
+def get_counts(content_type_id, object_ids):
+    """
+    `{object_id: likes}` for the objects, the flushed count plus what is still pending.
+    """
+    counts = dict.fromkeys(object_ids, 0)
+    counts.update(
+        LikeCount.objects.filter(content_type_id=content_type_id, object_id__in=object_ids)
+        .values_list('object_id', 'count')
+    )
+    if not is_buffered():
+        return counts
+    keys = {_delta_key(content_type_id, object_id): object_id for object_id in object_ids}
+    for key, delta in get_cache().get_many(keys).items():
+        counts[keys[key]] += delta
+    return counts
+
+
+def _pending(cache, batch_size):
+    # batches of the objects registered since the last flush, with their dirty keys
+    flushed = cache.get(FLUSHED_KEY, 0)
+    last = cache.get(SEQUENCE_KEY, 0)
+    for start in range(flushed + 1, last + 1, batch_size):
+        sequences = range(start, min(start + batch_size, last + 1))
+        dirty_keys = [_dirty_key(sequence) for sequence in sequences]
+        objects = set(cache.get_many(dirty_keys).values())
+        # changes from here on register the object again for the next flush
+        cache.delete_many([_mark_key(*obj) for obj in objects])
+        yield objects
+        cache.delete_many(dirty_keys)
+        cache.set(FLUSHED_KEY, sequences[-1], timeout=None)
+
+
+def flush(batch_size=1000):
+    """
+    Move the pending deltas into LikeCount and return how many objects were written.
+
+    Every object costs one cache decrement and a share of a few bulk
+    queries, however many likes it received in between. Only one flush
+    runs at a time, a concurrent call returns None. Nothing is pending
+    when likes are not buffered.
+    """
+    if not is_buffered():
+        return 0
+    cache = get_cache()
+    if not cache.add(LOCK_KEY, 1, timeout=LOCK_TIMEOUT):
+        return None
+    try:
+        written = 0
+        for objects in _pending(cache, batch_size):
+            keys = {_delta_key(*obj): obj for obj in objects}
+            pending = {key: delta for key, delta in cache.get_many(keys).items() if delta}
+            _write({keys[key]: delta for key, delta in pending.items()})
+            for key, delta in pending.items():
+                # take away exactly what was written, likes arriving meanwhile stay pending
+                try:
+                    cache.decr(key, delta)
+                except ValueError:
+                    # evicted since it was read, nothing of it is left to take away
+                    pass
+            written += len(pending)
+        return written
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def _write_now(content_type_id, object_id, delta):
+    counts = LikeCount.objects.filter(content_type_id=content_type_id, object_id=object_id)
+    with transaction.atomic():
+        if counts.update(count=F('count') + delta):
+            return
+        try:
+            with transaction.atomic():
+                LikeCount.objects.create(content_type_id=content_type_id, object_id=object_id, count=delta)
+        except IntegrityError:
+            # created by a concurrent like
+            counts.update(count=F('count') + delta)
+
+
+def _write(deltas):
+    by_content_type = defaultdict(dict)
+    for (content_type_id, object_id), delta in deltas.items():
+        by_content_type[content_type_id][object_id] = delta
+
+    with transaction.atomic():
+        for content_type_id, object_deltas in by_content_type.items():
+            counts = LikeCount.objects.filter(content_type_id=content_type_id, object_id__in=object_deltas)
+            existing = set(counts.values_list('object_id', flat=True))
+            if existing:
+                counts.update(count=Case(
+                    *(When(object_id=object_id, then=F('count') + object_deltas[object_id]) for object_id in existing),
+                    default=F('count')
+                ))
+            LikeCount.objects.bulk_create(
+                LikeCount(content_type_id=content_type_id, object_id=object_id, count=delta)
+                for object_id, delta in object_deltas.items() if object_id not in existing
+            )
+
+
+def rebuild(batch_size=1000):
+    """
+    Recount LikeCount from the liked items, dropping the pending deltas
+    since the liked items already hold them. Best run while few likes come in.
+    """
+    cache = get_cache()
+    if not cache.add(LOCK_KEY, 1, timeout=LOCK_TIMEOUT):
+        return False
+    try:
+        for objects in _pending(cache, batch_size):
+            cache.delete_many([_delta_key(*obj) for obj in objects])
+        with transaction.atomic():
+            LikeCount.objects.all().delete()
+            LikeCount.objects.bulk_create(
+                (
+                    LikeCount(**row)
+                    for row in LikedItem.objects.values('content_type_id', 'object_id')
+                    .annotate(count=Count('pk')).order_by()
+                ),
+                batch_size=batch_size
+            )
+        return True
+    finally:
+        cache.delete(LOCK_KEY)
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from likes import counters
+
+
+class Command(BaseCommand):
+    help = 'Writes the like counts buffered in the cache to LikeCount, meant to run from cron every minute or so.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--rebuild', action='store_true', help='Recount every object from the liked items instead.')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            if not counters.rebuild(options['batch_size']):
+                raise CommandError('A flush is running, try again later.')
+            self.stdout.write(self.style.SUCCESS('Like counts rebuilt.'))
+            return
+        if not counters.is_buffered():
+            self.stdout.write(self.style.WARNING(
+                'The like counter cache is local to each process, likes are counted without buffering.'
+            ))
+            return
+        written = counters.flush(options['batch_size'])
+        if written is None:
+            raise CommandError('A flush is running, try again later.')
+        self.stdout.write(self.style.SUCCESS('{} like count(s) flushed.'.format(written)))
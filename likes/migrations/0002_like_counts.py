@@ -0,0 +1,66 @@
+# Generated by Django 5.0.3 on 2026-10-18 10:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def drop_duplicates(apps, schema_editor):
+    # the same user liking the same object twice, keep the first
+    LikedItem = apps.get_model('likes', 'LikedItem')
+    duplicates = (
+        LikedItem.objects.values('user', 'content_type', 'object_id')
+        .annotate(first=Min('pk'), count=Count('pk')).filter(count__gt=1).order_by()
+    )
+    for duplicate in duplicates:
+        LikedItem.objects.filter(
+            user=duplicate['user'], content_type=duplicate['content_type'], object_id=duplicate['object_id']
+        ).exclude(pk=duplicate['first']).delete()
+
+
+def count_likes(apps, schema_editor):
+    LikedItem = apps.get_model('likes', 'LikedItem')
+    LikeCount = apps.get_model('likes', 'LikeCount')
+    LikeCount.objects.bulk_create(
+        (
+            LikeCount(**row)
+            for row in LikedItem.objects.values('content_type_id', 'object_id').annotate(count=Count('pk')).order_by()
+        ),
+        batch_size=2000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('likes', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LikeCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(drop_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='likeditem',
+            constraint=models.UniqueConstraint(fields=('user', 'content_type', 'object_id'), name='likes_likeditem_unique'),
+        ),
+        migrations.AddField(
+            model_name='likecount',
+            name='content_type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype'),
+        ),
+        migrations.AddConstraint(
+            model_name='likecount',
+            constraint=models.UniqueConstraint(fields=('content_type', 'object_id'), name='likes_likecount_unique'),
+        ),
+        migrations.RunPython(count_likes, migrations.RunPython.noop),
+    ]
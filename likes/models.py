@@ -6,10 +6,41 @@ from django.db import models
 # Create your models here.
 
 
+class LikedItemManager(models.Manager):
+    def liked_by(self, user, content_type, object_ids):
+        """
+        The ids among `object_ids` the user likes, in one query.
+        """
+        if not user.is_authenticated:
+            return set()
+        return set(
+            self.filter(user=user, content_type=content_type, object_id__in=object_ids)
+            .values_list('object_id', flat=True)
+        )
+
+
 class LikedItem(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     object_id = models.PositiveIntegerField()
     content_object = GenericForeignKey()
 
+    objects = LikedItemManager()
+
+    class Meta:
+        # also serves the "liked by me" lookups of a user over a page of objects
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'content_type', 'object_id'], name='likes_likeditem_unique')
+        ]
+
+
+class LikeCount(models.Model):
+    # likes per object as of the last flush of likes.counters
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    count = models.IntegerField(default=0)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['content_type', 'object_id'], name='likes_likecount_unique')
+        ]
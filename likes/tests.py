@@ -1,3 +1,125 @@
-from django.test import TestCase
+import os
+from decimal import Decimal
+from io import StringIO
+from tempfile import gettempdir
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from store.models import Collection, Product
+
+from . import counters
+from .models import LikeCount
+
+
+# buffering takes a cache every process shares, files will do
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'likes': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(gettempdir(), 'likes-counter-tests'),
+        },
+    },
+    LIKES_COUNTER_CACHE_ALIAS='likes',
+)
+class CounterTests(TestCase):
+    def setUp(self):
+        caches['likes'].clear()
+        self.content_type_id = ContentType.objects.get_for_model(LikeCount).pk
+
+    def test_likes_are_buffered_until_flushed(self):
+        for _ in range(500):
+            counters.add(self.content_type_id, 1, 1)
+        counters.add(self.content_type_id, 2, 1)
+        counters.add(self.content_type_id, 2, -1)
+
+        self.assertFalse(LikeCount.objects.exists())
+        self.assertEqual(counters.get_counts(self.content_type_id, [1, 2]), {1: 500, 2: 0})
+
+        # object 2 nets out to nothing and is not written
+        self.assertEqual(counters.flush(), 1)
+        counters.add(self.content_type_id, 1, 1)
+        self.assertEqual(counters.flush(), 1)
+
+        self.assertEqual(list(LikeCount.objects.values_list('object_id', 'count')), [(1, 501)])
+        self.assertEqual(counters.get_counts(self.content_type_id, [1, 2]), {1: 501, 2: 0})
+
+    def test_flush_survives_evicted_deltas(self):
+        counters.add(self.content_type_id, 1, 3)
+
+        def write(deltas):
+            caches['likes'].delete(counters._delta_key(self.content_type_id, 1))
+            LikeCount.objects.create(content_type_id=self.content_type_id, object_id=1, count=3)
+
+        with mock.patch.object(counters, '_write', write):
+            self.assertEqual(counters.flush(), 1)
+        self.assertEqual(counters.get_counts(self.content_type_id, [1]), {1: 3})
+        self.assertEqual(counters.flush(), 0)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class UnbufferedCounterTests(TestCase):
+    def setUp(self):
+        self.content_type_id = ContentType.objects.get_for_model(LikeCount).pk
+
+    def test_local_memory_caches_are_not_buffered_in(self):
+        self.assertFalse(counters.is_buffered())
+        counters.add(self.content_type_id, 1, 1)
+        counters.add(self.content_type_id, 1, 2)
+        self.assertEqual(list(LikeCount.objects.values_list('object_id', 'count')), [(1, 3)])
+        self.assertEqual(counters.get_counts(self.content_type_id, [1, 2]), {1: 3, 2: 0})
+        self.assertEqual(counters.flush(), 0)
+        out = StringIO()
+        call_command('flush_like_counts', stdout=out)
+        self.assertIn('local to each process', out.getvalue())
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class LikeViewTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.user = get_user_model().objects.create_user('liker', 'liker@b.com', 'secret')
+        self.product = Product.objects.create(
+            title='Liked', slug='liked', inventory=1, unit_price=Decimal(1),
+            collection=Collection.objects.create(title='Likes')
+        )
+        self.url = '/likes/store.product/{}/'.format(self.product.pk)
+
+    def like(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.put(self.url)
+
+    def test_like_and_unlike(self):
+        self.assertEqual(self.client.put(self.url).status_code, 403)
+        self.client.force_login(self.user)
+
+        self.assertEqual(self.like().status_code, 201)
+        # liking twice counts once
+        self.assertEqual(self.like().status_code, 200)
+        self.assertEqual(self.client.get(self.url).json(), {'object_id': self.product.pk, 'count': 1, 'liked': True})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(self.url).status_code, 204)
+        self.assertEqual(self.client.get(self.url).json(), {'object_id': self.product.pk, 'count': 0, 'liked': False})
+
+    def test_counts(self):
+        self.client.force_login(self.user)
+        self.like()
+        counters.flush()
+        response = self.client.get('/likes/store.product/', {'ids': '{},0'.format(self.product.pk)})
+        self.assertEqual(response.json(), [
+            {'object_id': self.product.pk, 'count': 1, 'liked': True},
+            {'object_id': 0, 'count': 0, 'liked': False},
+        ])
+        self.assertEqual(self.client.get('/likes/store.product/', {'ids': 'a'}).status_code, 400)
+        self.assertEqual(self.client.get('/likes/store.nothing/', {'ids': '1'}).status_code, 404)
+
+    def test_unknown_objects_and_stale_content_types(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.put('/likes/store.product/0/').status_code, 404)
+        ContentType.objects.create(app_label='store', model='removed')
+        self.assertEqual(self.client.put('/likes/store.removed/1/').status_code, 400)
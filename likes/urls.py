@@ -0,0 +1,8 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('<str:content_type>/', views.LikeListView.as_view(), name='likes'),
+    path('<str:content_type>/<int:object_id>/', views.LikeDetailView.as_view(), name='like-detail'),
+]
@@ -1,3 +1,83 @@
-from django.shortcuts import render
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, transaction
+from rest_framework import status
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from . import counters
+from .models import LikedItem
+
+MAX_IDS = 100
+
+
+class LikeView(APIView):
+    """
+    Likes of any model, addressed as `<app_label>.<model>`, e.g. `store.product`.
+    Counts come from likes.counters, so with a shared counter cache liking
+    never writes to a shared row.
+    """
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    @staticmethod
+    def get_content_type(content_type):
+        try:
+            return ContentType.objects.get_by_natural_key(*content_type.split('.'))
+        except (ContentType.DoesNotExist, TypeError):
+            raise NotFound('Unknown content type "{}".'.format(content_type))
+
+    def get_likes(self, request, content_type, object_ids):
+        counts = counters.get_counts(content_type.pk, object_ids)
+        liked = LikedItem.objects.liked_by(request.user, content_type, object_ids)
+        return [
+            {'object_id': object_id, 'count': counts[object_id], 'liked': object_id in liked}
+            for object_id in object_ids
+        ]
+
+
+class LikeListView(LikeView):
+    def get(self, request, content_type):
+        """
+        Counts and "liked by me" of a page of objects: `?ids=1,2,3`.
+        """
+        content_type = self.get_content_type(content_type)
+        try:
+            object_ids = list(dict.fromkeys(int(value) for value in request.query_params.get('ids', '').split(',')))
+        except ValueError:
+            raise ValidationError({'ids': 'A comma separated list of ids.'})
+        if len(object_ids) > MAX_IDS:
+            raise ValidationError({'ids': 'At most {} ids.'.format(MAX_IDS)})
+        return Response(self.get_likes(request, content_type, object_ids))
+
+
+class LikeDetailView(LikeView):
+    def get(self, request, content_type, object_id):
+        content_type = self.get_content_type(content_type)
+        return Response(self.get_likes(request, content_type, [object_id])[0])
+
+    def put(self, request, content_type, object_id):
+        content_type = self.get_content_type(content_type)
+        model = content_type.model_class()
+        if model is None:
+            # a content type left behind by a removed model
+            raise ValidationError({'content_type': 'No model for this content type.'})
+        if not model._base_manager.filter(pk=object_id).exists():
+            raise NotFound()
+        try:
+            with transaction.atomic():
+                LikedItem.objects.create(user=request.user, content_type=content_type, object_id=object_id)
+        except IntegrityError:
+            # liked already
+            return Response(self.get_likes(request, content_type, [object_id])[0])
+        transaction.on_commit(lambda: counters.add(content_type.pk, object_id, 1))
+        return Response(self.get_likes(request, content_type, [object_id])[0], status=status.HTTP_201_CREATED)
+
+    def delete(self, request, content_type, object_id):
+        content_type = self.get_content_type(content_type)
+        deleted, _ = LikedItem.objects.filter(
+            user=request.user, content_type=content_type, object_id=object_id
+        ).delete()
+        if deleted:
+            transaction.on_commit(lambda: counters.add(content_type.pk, object_id, -1))
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,10 @@
+def incr(cache, key, delta=1):
+    """
+    `cache.incr()` that starts missing keys at 0, never expiring, rather
+    than raising ValueError.
+    """
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        return cache.incr(key, delta)
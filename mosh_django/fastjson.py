@@ -0,0 +1,64 @@
+import io
+
+import orjson
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# DRF escapes these two, JavaScript string literals can not hold them raw
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer on orjson, byte for byte the same output for the
+    compact, unicode, strict JSON the API renders, several times faster.
+
+    Whatever orjson does not take natively (Decimal, datetime, lazy
+    strings...) goes through DRF's JSONEncoder.default(), so it comes out
+    the way DRF writes it, e.g. datetimes as isoformat() with microseconds
+    and `Z` for UTC. Indented output, the other JSON settings and ints past
+    64 bits are left to JSONRenderer. Known differences: floats from 1e16
+    up or under 1e-4 are written `1e16` rather than `1e+16`, and NaN
+    becomes null where JSONRenderer refuses it.
+    """
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    default = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (
+            not (self.compact and not self.ensure_ascii and self.strict)
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.default, option=self.options)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        for raw, escaped in LINE_SEPARATORS:
+            if raw in ret:
+                ret = ret.replace(raw, escaped)
+        return ret
+
+
+class ORJSONParser(JSONParser):
+    """
+    JSONParser on orjson for UTF-8 bodies. Bodies orjson turns down go
+    through JSONParser again, for the same ParseError as ever. One known
+    difference: integers past 64 bits come back as floats.
+    """
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return super().parse(io.BytesIO(body), media_type, parser_context)
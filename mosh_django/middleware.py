@@ -0,0 +1,238 @@
+import bisect
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .routers import replica_reads
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# upper bounds of the per-route histogram buckets, the last bucket takes the rest
+DURATION_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)  # ms
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = Counter()
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+
+
+_request_stats = ContextVar('request_stats', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_time += time.perf_counter() - started
+        stats.queries[context['connection'].alias] += 1
+
+
+def install_query_recorder(sender=None, connection=None, **kwargs):
+    # the execute_wrapper() of every connection, for good
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+def get_request_stats():
+    """
+    RequestStats of the current request so far, None outside of ServerTimingMiddleware.
+    """
+    return _request_stats.get()
+
+
+def get_query_counts():
+    """
+    `{alias: queries}` of the current request so far, None outside of ServerTimingMiddleware.
+    """
+    stats = _request_stats.get()
+    return stats.queries if stats is not None else None
+
+
+class RouteStats:
+    def __init__(self):
+        self.requests = 0
+        self.duration = 0.0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.queries = 0
+        self.max_queries = 0
+        self.durations = [0] * (len(DURATION_BUCKETS) + 1)
+        self.query_counts = [0] * (len(QUERY_BUCKETS) + 1)
+
+    def add(self, duration, stats):
+        queries = sum(stats.queries.values())
+        self.requests += 1
+        self.duration += duration
+        self.db_time += stats.db_time
+        self.serialize_time += stats.serialize_time
+        self.queries += queries
+        self.max_queries = max(self.max_queries, queries)
+        self.durations[bisect.bisect_left(DURATION_BUCKETS, duration * 1000)] += 1
+        self.query_counts[bisect.bisect_left(QUERY_BUCKETS, queries)] += 1
+
+    def as_dict(self):
+        def histogram(buckets, counts):
+            return dict(zip([*buckets, 'inf'], counts))
+
+        return {
+            'requests': self.requests,
+            'mean_ms': 1000 * self.duration / self.requests,
+            'mean_db_ms': 1000 * self.db_time / self.requests,
+            'mean_serialize_ms': 1000 * self.serialize_time / self.requests,
+            'mean_queries': self.queries / self.requests,
+            'max_queries': self.max_queries,
+            'duration_ms': histogram(DURATION_BUCKETS, self.durations),
+            'queries': histogram(QUERY_BUCKETS, self.query_counts),
+        }
+
+
+_routes = {}
+_routes_lock = threading.Lock()
+
+
+def get_route_stats():
+    """
+    `{'GET products-list': {...}}` for the requests this process served,
+    with histograms keyed on their buckets' upper bounds.
+    """
+    with _routes_lock:
+        return {route: stats.as_dict() for route, stats in _routes.items()}
+
+
+def reset_route_stats():
+    with _routes_lock:
+        _routes.clear()
+
+
+class ServerTimingMiddleware:
+    """
+    Times every request, its queries (through an execute wrapper on every
+    connection) and the rendering of its response body, and reports them
+    in a `Server-Timing` header:
+
+        Server-Timing: db;dur=1.9;desc="4 queries", serialize;dur=0.4, total;dur=7.2
+
+    Totals are kept per route (method and URL name) for get_route_stats().
+    With DATABASE_QUERY_COUNTS_HEADER on, queries per database alias go in
+    an `X-DB-Queries` header. Cheap enough to stay on in production, list
+    it first so it sees the whole request.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        # connections opened before this module was imported
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection=connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        return self.process_response(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        return self.process_response(request, response, stats, time.perf_counter() - started)
+
+    def process_template_response(self, request, response):
+        # runs last of the template response hooks, right before DRF renders the body
+        stats = _request_stats.get()
+        started = time.perf_counter()
+
+        def rendered(response):
+            stats.serialize_time += time.perf_counter() - started
+
+        if stats is not None:
+            response.add_post_render_callback(rendered)
+        return response
+
+    def process_response(self, request, response, stats, duration):
+        match = request.resolver_match
+        if match is not None and match.view_name:
+            route = '{} {}'.format(request.method, match.view_name)
+            with _routes_lock:
+                _routes.setdefault(route, RouteStats()).add(duration, stats)
+
+        response['Server-Timing'] = 'db;dur={:.1f};desc="{} queries", serialize;dur={:.1f}, total;dur={:.1f}'.format(
+            1000 * stats.db_time, sum(stats.queries.values()), 1000 * stats.serialize_time, 1000 * duration
+        )
+        if getattr(settings, 'DATABASE_QUERY_COUNTS_HEADER', False):
+            response['X-DB-Queries'] = ', '.join(
+                '{}={}'.format(alias, count) for alias, count in sorted(stats.queries.items())
+            )
+        return response
+
+
+class ReplicaMiddleware:
+    """
+    Serves the reads of safe requests from the replicas (see
+    mosh_django.routers.ReplicaRouter) and pins clients that just wrote
+    to default: every unsafe request sets a cookie that keeps the
+    client's reads on default for DATABASE_REPLICA_PIN_SECONDS, so it
+    reads its own writes whatever the replication lag.
+    """
+    sync_capable = True
+    async_capable = True
+    cookie_name = 'db_pin'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with replica_reads(self.use_replicas(request)):
+            response = self.get_response(request)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        with replica_reads(self.use_replicas(request)):
+            response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def use_replicas(self, request):
+        return request.method in SAFE_METHODS and self.cookie_name not in request.COOKIES
+
+    def process_response(self, request, response):
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(
+                self.cookie_name, '1', max_age=getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 5),
+                httponly=True, samesite='Lax'
+            )
+        return response
@@ -0,0 +1,201 @@
+import datetime
+import decimal
+from collections.abc import Mapping
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ObjectDoesNotExist
+from django.db import models
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject, PrimaryKeyRelatedField
+from rest_framework.settings import api_settings
+
+# {(serializer class, readable field names): plan}
+_plans = {}
+
+# to_representation() of these is the builtin, call it straight
+BUILTIN_REPRESENTATIONS = {
+    serializers.CharField.to_representation: str,
+    serializers.IntegerField.to_representation: int,
+    serializers.ReadOnlyField.to_representation: lambda value: value,
+}
+
+
+def get_plan(serializer):
+    """
+    `[(field name, read(serializer, instance))]` for the readable fields of
+    the serializer, compiled once per serializer class and set of fields,
+    kept on the serializer for the instances it serializes after that.
+    """
+    plan = serializer.__dict__.get('_read_plan')
+    if plan is None:
+        fields = [field for field in serializer.fields.values() if not field.write_only]
+        key = (type(serializer), tuple(field.field_name for field in fields))
+        plan = _plans.get(key)
+        if plan is None:
+            plan = _plans[key] = [(field.field_name, compile_field(field)) for field in fields]
+        serializer._read_plan = plan
+    return plan
+
+
+def render(serializer, instance):
+    ret = {}
+    for name, read in get_plan(serializer):
+        try:
+            ret[name] = read(serializer, instance)
+        except SkipField:
+            pass
+    return ret
+
+
+def inlines(serializer):
+    # nested serializers whose output render() gives as well
+    return type(serializer).to_representation in (
+        serializers.Serializer.to_representation, CompiledReadMixin.to_representation
+    )
+
+
+def get_model_field(field):
+    model = getattr(getattr(field.parent, 'Meta', None), 'model', None)
+    if model is None or len(field.source_attrs) != 1:
+        return None
+    try:
+        return model._meta.get_field(field.source_attrs[0])
+    except FieldDoesNotExist:
+        # `product_id` rather than `product`
+        return next((f for f in model._meta.concrete_fields if f.attname == field.source_attrs[0]), None)
+
+
+def compile_field(field):
+    """
+    `read(serializer, instance)` giving what `serializer.fields[name]` would
+    for the instance, the serializer being the one the field belongs to.
+    Fields it knows no shortcut for are read the way DRF does.
+    """
+    name = field.field_name
+    model_field = get_model_field(field)
+
+    if isinstance(field, serializers.SerializerMethodField):
+        method_name = field.method_name
+        return lambda serializer, instance: getattr(serializer, method_name)(instance)
+
+    if isinstance(field, serializers.ListSerializer) and model_field is not None and inlines(field.child):
+        attr = field.source_attrs[0]
+
+        def read(serializer, instance):
+            value = getattr(instance, attr)
+            if value is None:
+                return None
+            child = serializer.fields[name].child
+            return [render(child, item) for item in (value.all() if isinstance(value, models.Manager) else value)]
+        return read
+
+    if isinstance(field, serializers.BaseSerializer):
+        if model_field is None or not model_field.is_relation or not inlines(field):
+            return read_field(name)
+        attr = field.source_attrs[0]
+
+        def read(serializer, instance):
+            try:
+                value = getattr(instance, attr)
+            except ObjectDoesNotExist:
+                return None
+            return None if value is None else render(serializer.fields[name], value)
+        return read
+
+    if model_field is None or not model_field.concrete:
+        return read_field(name)
+    attname = model_field.attname
+
+    if model_field.is_relation and field.source_attrs[0] != attname:
+        pk_only = (
+            isinstance(field, PrimaryKeyRelatedField) and field.pk_field is None
+            and type(field).to_representation is PrimaryKeyRelatedField.to_representation
+        )
+        if not pk_only or not (model_field.many_to_one or model_field.one_to_one):
+            return read_field(name)
+        # the column, as the pk only optimization reads it
+        return lambda serializer, instance: getattr(instance, attname)
+
+    if type(field) is serializers.UUIDField and field.uuid_format == 'hex_verbose':
+        represent = str
+    elif type(field) is serializers.DecimalField and field.decimal_places is not None and not field.localize:
+        represent = decimal_representation(field)
+    elif (
+        type(field) is serializers.DateTimeField and not hasattr(field, 'timezone')
+        and (getattr(field, 'format', api_settings.DATETIME_FORMAT) or '').lower() == ISO_8601
+    ):
+        return read_datetime(field, attname)
+    else:
+        represent = BUILTIN_REPRESENTATIONS.get(type(field).to_representation, field.to_representation)
+
+    def read(serializer, instance):
+        value = getattr(instance, attname)
+        return None if value is None else represent(value)
+    return read
+
+
+def decimal_representation(field):
+    # DecimalField.to_representation() with its quantize context made once
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.Context(prec=field.max_digits) if field.max_digits is not None else decimal.Context()
+    rounding = field.rounding
+
+    def represent(value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        value = value.quantize(exponent, rounding=rounding, context=context)
+        return '{:f}'.format(value) if coerce_to_string else value
+    return represent
+
+
+def read_datetime(field, attname):
+    # DateTimeField.to_representation() for aware datetimes in ISO 8601, the rest is left to it.
+    # The current time zone is looked up once per serializer, it does not change while a response is built
+    def read(serializer, instance):
+        value = getattr(instance, attname)
+        if value is None:
+            return None
+        if settings.USE_TZ and isinstance(value, datetime.datetime) and value.utcoffset() is not None:
+            tz = serializer.__dict__.get('_read_timezone')
+            if tz is None:
+                tz = serializer._read_timezone = timezone.get_current_timezone()
+            try:
+                value = value.astimezone(tz).isoformat()
+            except OverflowError:
+                return field.to_representation(value)
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return field.to_representation(value)
+    return read
+
+
+def read_field(name):
+    # what Serializer.to_representation() does for one field
+    def read(serializer, instance):
+        field = serializer.fields[name]
+        attribute = field.get_attribute(instance)
+        if (attribute.pk if isinstance(attribute, PKOnlyObject) else attribute) is None:
+            return None
+        return field.to_representation(attribute)
+    return read
+
+
+class CompiledReadMixin:
+    """
+    Serializes instances through a plan compiled from the fields of the
+    serializer, see get_plan(): per field one closure reading the model
+    attribute and converting it, nested serializers inlined, instead of
+    DRF's get_attribute() / to_representation() walk over every field of
+    every nested serializer for every instance.
+
+    The output is the same, fields are still bound to their serializer so
+    method fields see its context. Dicts (`.values()` rows) go through DRF.
+    """
+    compiled_reads = True
+
+    def to_representation(self, instance):
+        if not self.compiled_reads or isinstance(instance, Mapping):
+            return super().to_representation(instance)
+        return render(self, instance)
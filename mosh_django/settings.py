@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+from decimal import Decimal
+from importlib.util import find_spec
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -40,7 +42,6 @@ INSTALLED_APPS = [
 
     # third party apps
     'coreapi',
-    'debug_toolbar',
     'django_filters',
 
     # internal apps
@@ -57,16 +58,24 @@ INTERNAL_IPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so it times everything else
+    'mosh_django.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # before anything that reads, sessions included
+    'mosh_django.middleware.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
 ]
 
+# development only, it records every query and its stack trace
+if DEBUG:
+    INSTALLED_APPS += ['debug_toolbar']
+    MIDDLEWARE += ['debug_toolbar.middleware.DebugToolbarMiddleware']
+
 ROOT_URLCONF = 'mosh_django.urls'
 
 TEMPLATES = [
@@ -103,8 +112,19 @@ DATABASES = {
         'PORT': '27018',
         'PASSWORD': 'P@ssw0rd'
     }
+    # read-only copies of 'default' are added as further aliases and listed
+    # in DATABASE_REPLICAS, e.g.
+    # 'replica': {..., 'TEST': {'MIRROR': 'default'}},
 }
 
+# aliases safe requests read from, see mosh_django.routers
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['mosh_django.routers.ReplicaRouter']
+# seconds a client's reads stay on 'default' after it wrote
+DATABASE_REPLICA_PIN_SECONDS = 5
+# queries per alias of every request in an X-DB-Queries header, see mosh_django.middleware
+DATABASE_QUERY_COUNTS_HEADER = DEBUG
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -144,10 +164,49 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# orjson renders and parses the API's JSON like DRF does, only faster, see mosh_django.fastjson;
+# it is in requirements.txt, installs without it fall back to DRF's own JSON classes
+FAST_JSON = find_spec('orjson') is not None
+
 REST_FRAMEWORK = {
     'COERCE_DECIMAL_TO_STRING': False,
+    'DEFAULT_RENDERER_CLASSES': [
+        'mosh_django.fastjson.ORJSONRenderer' if FAST_JSON else 'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'mosh_django.fastjson.ORJSONParser' if FAST_JSON else 'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     # api documentations endpoints settings
     'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.coreapi.AutoSchema',
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10
 }
+
+# tax applied to unit_price for the price_with_tax field, 0.1 is 10%
+STORE_TAX_RATE = Decimal('0.1')
+
+# local memory by default, point 'default' at a shared backend in production:
+# 'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379'
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# product and collection GET responses, see store.cache
+STORE_RESPONSE_CACHE_ALIAS = 'default'
+STORE_RESPONSE_CACHE_TIMEOUT = 60 * 5
+
+# products ?search=, store.search.LikeSearchBackend skips the index
+STORE_SEARCH_BACKEND = 'store.search.InvertedIndexBackend'
+
+# seconds stock stays held by a store.models.Reservation
+STORE_RESERVATION_TTL = 60 * 10
+
+# like counts are buffered in this cache when it is shared between processes
+# (Redis, Memcached...) and written out by flush_like_counts; with local
+# memory they go to the database on every like, see likes.counters
+LIKES_COUNTER_CACHE_ALIAS = 'default'
@@ -0,0 +1,106 @@
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+from .serializers import get_model_field
+
+# {serializer class: {field name: column or None}}
+_columns = {}
+
+
+def get_requested_names(request, param):
+    # `?fields=a,b&fields=c`, None when the parameter is missing or blank
+    names = [
+        name.strip() for value in request.query_params.getlist(param) for name in value.split(',') if name.strip()
+    ]
+    return set(names) if names else None
+
+
+def sparse_fields(names, request):
+    """
+    The field `names` a read request asks for with `?fields=a,b` and/or
+    `?exclude=c`, in their order. Unknown names are ignored, requests that
+    write get every field.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return list(names)
+    fields = get_requested_names(request, 'fields')
+    exclude = get_requested_names(request, 'exclude') or ()
+    return [name for name in names if (fields is None or name in fields) and name not in exclude]
+
+
+def get_columns(serializer_class):
+    """
+    `{field name: column}` for the readable fields of the serializer, the
+    column being None for fields not read straight from a plain column of
+    the model (method fields, relations, annotations...).
+    """
+    columns = _columns.get(serializer_class)
+    if columns is None:
+        columns = {}
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            model_field = get_model_field(field)
+            plain = (
+                model_field is not None and model_field.concrete and not model_field.is_relation
+                and not model_field.primary_key
+            )
+            columns[name] = model_field.name if plain else None
+        _columns[serializer_class] = columns
+    return columns
+
+
+def get_ordering_names(view):
+    # what the ordering filter and keyset cursors may read off the rows
+    names = []
+    for ordering in (
+        getattr(view, 'ordering', None),
+        getattr(view, 'ordering_fields', None),
+        getattr(view.pagination_class, 'ordering', None),
+    ):
+        if isinstance(ordering, str):
+            ordering = [ordering] if ordering != '__all__' else []
+        names += [item.lstrip('-') for item in ordering or ()]
+    return names
+
+
+class SparseFieldsMixin:
+    """
+    Leaves out of the response the fields a read request does not ask
+    for with `?fields=` / `?exclude=`, see sparse_fields(). Only the
+    top level serializer (or the child of a top level list) is narrowed,
+    nested serializers keep their fields.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            return fields
+        return {name: fields[name] for name in sparse_fields(fields, self.context.get('request'))}
+
+
+class SparseQuerySetMixin:
+    """
+    Defers the columns behind the fields a `?fields=` / `?exclude=` read
+    leaves out of the response, so large text columns are not read when
+    nobody asked for them. Columns the ordering and the cursors need are
+    read either way. The serializer is expected to use SparseFieldsMixin,
+    and `get_queryset()` overrides to build on `super().get_queryset()`.
+    """
+
+    def get_sparse_fields(self):
+        return sparse_fields(get_columns(self.get_serializer_class()), self.request)
+
+    def get_deferred_columns(self):
+        columns = get_columns(self.get_serializer_class())
+        kept = {columns[name] for name in self.get_sparse_fields()}
+        kept.update(get_ordering_names(self))
+        return [column for column in columns.values() if column is not None and column not in kept]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        deferred = self.get_deferred_columns()
+        return queryset.defer(*deferred) if deferred else queryset
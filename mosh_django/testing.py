@@ -0,0 +1,31 @@
+from contextlib import ExitStack
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin that fails a request running more queries than its
+    viewset's `query_budget` allows for the action, `{action: queries}`.
+
+    Budgets are fixed numbers, so a lookup per row (N+1) breaks them as
+    soon as the test data has more rows than the budget.
+    """
+
+    def assertWithinQueryBudget(self, viewset, action, url, method='get', data=None, **extra):
+        budget = viewset.query_budget[action]
+        with ExitStack() as stack:
+            captured = [
+                stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in sorted(self.databases)
+            ]
+            response = getattr(self.client, method)(url, data, **extra)
+        self.assertLess(response.status_code, 400, response.content)
+
+        queries = [query['sql'] for context in captured for query in context.captured_queries]
+        if len(queries) > budget:
+            self.fail('{} {} ran {} queries, {}.{} allows {}:\n{}'.format(
+                method.upper(), url, len(queries), viewset.__name__, action, budget,
+                '\n'.join('{}. {}'.format(index, sql) for index, sql in enumerate(queries, 1))
+            ))
+        return response
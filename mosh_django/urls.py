@@ -14,6 +14,7 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.documentation import include_docs_urls
@@ -27,5 +28,8 @@ urlpatterns = [
     path('api/docs/', include_docs_urls(title='Mesutfd Docs')),
     path('playground/', include('playground.urls')),
     path('store/', include('store.urls')),
-    path("__debug__/", include("debug_toolbar.urls")),
+    path('likes/', include('likes.urls')),
 ]
+
+if 'debug_toolbar' in settings.INSTALLED_APPS:
+    urlpatterns += [path("__debug__/", include("debug_toolbar.urls"))]
@@ -1,10 +1,10 @@
 from django.contrib import admin
-from django.db.models import Count
 from django.utils.html import format_html
 from django.utils.http import urlencode
 from rest_framework.reverse import reverse
 
 from .models import Product, Collection
+from .pagination import EstimatedCountPaginator
 
 
 # Register your models here.
@@ -15,13 +15,20 @@ class ProductAdmin(admin.ModelAdmin):
     list_display = ['title', 'unit_price']
     ordering = ['-unit_price']
     list_display_links = ['title', 'unit_price']
-    search_fields = ['collections']
+    # prefix matches, served by the title index (also what featured_product autocompletes on)
+    search_fields = ['^title']
+    paginator = EstimatedCountPaginator
+    # no second COUNT(*) of the whole table when filtering
+    show_full_result_count = False
 
 
 @admin.register(Collection)
 class CollectionAdmin(admin.ModelAdmin):
     autocomplete_fields = ['featured_product']
     list_display = ['id', 'title', 'products_count']
+    search_fields = ['^title']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     @admin.display(ordering='products_count')
     def products_count(self, collection: Collection):
@@ -32,9 +39,4 @@ class CollectionAdmin(admin.ModelAdmin):
             'collection__id': str(collection.id)
         })
         )
-        return format_html('<a href="{}">{} Products</a>', url, collection.products.count())
-
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(
-            products_count=Count('products')
-        )
\ No newline at end of file
+        return format_html('<a href="{}">{} Products</a>', url, collection.products_count)
\ No newline at end of file
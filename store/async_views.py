@@ -0,0 +1,111 @@
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.http import Http404, HttpResponse
+from django.views import View
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+from tags.models import TaggedItem
+
+from .models import Product
+from .views import CartViewSet, CollectionViewSet, ProductViewSet
+
+
+async def aget_object_or_404(queryset, **filters):
+    try:
+        return await queryset.aget(**filters)
+    except (ObjectDoesNotExist, TypeError, ValueError, ValidationError):
+        raise Http404
+
+
+class AsyncReadView(View):
+    """
+    Async GET endpoint answering with the payload `viewset_class` gives
+    for `action`.
+
+    The viewset still builds the queryset, applies its filters and
+    serializes, only the queries go through the async ORM (filtering runs in
+    a thread, validating a filter may query the database), so under ASGI
+    the request is not handed to a worker thread as a whole. Responses
+    are plain JSON: no browsable API, response cache or ETag. Permissions
+    are checked, authentication is not run, which keeps these views to
+    anonymous reads.
+    """
+    http_method_names = ['get']
+    viewset_class = None
+    action = None
+    # the API's JSON renderer, first of the defaults
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+
+    def get_viewset(self, request, **kwargs):
+        viewset = self.viewset_class(
+            action_map={'get': self.action}, args=(), kwargs=kwargs, format_kwarg=None, headers={}
+        )
+        viewset.request = viewset.initialize_request(request, **kwargs)
+        return viewset
+
+    async def get(self, request, **kwargs):
+        viewset = self.get_viewset(request, **kwargs)
+        try:
+            viewset.check_permissions(viewset.request)
+            data, status = await self.get_data(viewset), 200
+        except Exception as exc:
+            response = exception_handler(exc, {'view': viewset, 'request': viewset.request})
+            if response is None:
+                raise
+            data, status = response.data, response.status_code
+        return HttpResponse(self.renderer.render(data), status=status, content_type=self.renderer.media_type)
+
+    @staticmethod
+    async def afilter_queryset(viewset):
+        # django-filter validates choices such as `collection_id` with a synchronous query
+        return await sync_to_async(viewset.filter_queryset)(viewset.get_queryset())
+
+    async def get_data(self, viewset):
+        raise NotImplementedError('`get_data()` must be implemented.')
+
+
+class ProductListView(AsyncReadView):
+    viewset_class = ProductViewSet
+    action = 'list'
+
+    async def get_data(self, viewset):
+        queryset = await self.afilter_queryset(viewset)
+        page = await viewset.paginator.apaginate_queryset(queryset, viewset.request, view=viewset)
+        # the rows of ProductViewSet's values() fast path
+        labels = {}
+        if 'tags' in viewset.get_sparse_fields():
+            labels = await TaggedItem.objects.aget_labels_for(Product, [row['id'] for row in page])
+        serializer = viewset.get_serializer(page, many=True, context={
+            **viewset.get_serializer_context(), 'tag_labels': labels
+        })
+        return viewset.paginator.get_paginated_response(serializer.data).data
+
+
+class ProductDetailView(AsyncReadView):
+    viewset_class = ProductViewSet
+    action = 'retrieve'
+
+    async def get_data(self, viewset):
+        queryset = await self.afilter_queryset(viewset)
+        # the tags are prefetched by the same call
+        product = await aget_object_or_404(queryset, pk=viewset.kwargs['pk'])
+        return viewset.get_serializer(product).data
+
+
+class CollectionListView(AsyncReadView):
+    viewset_class = CollectionViewSet
+    action = 'list'
+
+    async def get_data(self, viewset):
+        queryset = await self.afilter_queryset(viewset)
+        page = await viewset.paginator.apaginate_queryset(queryset, viewset.request, view=viewset)
+        return viewset.paginator.get_paginated_response(viewset.get_serializer(page, many=True).data).data
+
+
+class CartDetailView(AsyncReadView):
+    viewset_class = CartViewSet
+    action = 'retrieve'
+
+    async def get_data(self, viewset):
+        cart = await aget_object_or_404(await self.afilter_queryset(viewset), pk=viewset.kwargs['pk'])
+        return viewset.get_serializer(cart).data
@@ -0,0 +1,143 @@
+import time
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from mosh_django.caching import incr
+from mosh_django.routers import replica_reads
+from rest_framework import status
+from rest_framework.response import Response
+
+PRODUCTS = 'products'
+COLLECTIONS = 'collections'
+TAGS = 'tags'
+
+HITS_KEY = 'store:response-cache:hits'
+MISSES_KEY = 'store:response-cache:misses'
+
+
+def get_cache():
+    return caches[getattr(settings, 'STORE_RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def _version_key(namespace, pk=None):
+    return 'store:response-cache:version:{}:{}'.format(namespace, '*' if pk is None else pk)
+
+
+def get_versions(namespace, pk=None):
+    """
+    Versions the cached list (or the `pk` detail) of the namespace is valid for.
+
+    Versions are nanosecond timestamps of the last invalidation, which is
+    what conditional GETs use for Last-Modified.
+    """
+    cache = get_cache()
+    keys = [_version_key(namespace), _version_key(namespace, pk if pk is not None else 'list')]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # seeded from the clock so an evicted version never comes back
+            # with a value that old entries were stored under
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _bump(*keys):
+    cache = get_cache()
+    for key in keys:
+        version = cache.get(key, 0)
+        cache.set(key, max(time.time_ns(), version + 1), timeout=None)
+
+
+def _bump_on_commit(*keys):
+    # bumped before the commit, a concurrent read could cache the old rows under the new version
+    transaction.on_commit(lambda: _bump(*keys))
+
+
+def invalidate(namespace, *pks):
+    """
+    Drop the cached lists of the namespace and the detail entries of `pks`,
+    once the current transaction commits (right away outside of one).
+    """
+    _bump_on_commit(_version_key(namespace, 'list'), *(_version_key(namespace, pk) for pk in pks if pk is not None))
+
+
+def invalidate_all(namespace):
+    _bump_on_commit(_version_key(namespace))
+
+
+def get_object_pk(view, kwargs):
+    """
+    The pk named by the URL of a detail view, in the form `invalidate()` is
+    given it: `/products/05/` and `/products/5/` share their versions.
+    """
+    value = kwargs[view.lookup_url_kwarg or view.lookup_field]
+    try:
+        return view.get_queryset().model._meta.pk.to_python(value)
+    except ValidationError:
+        # not a pk at all, the view answers 404
+        return value
+
+
+def get_request_digest(request):
+    # blank parameters are dropped since the filters ignore them anyway
+    params = sorted(
+        (name, [value for value in values if value != ''])
+        for name, values in request.query_params.lists()
+    )
+    params = [(name, values) for name, values in params if values]
+    return md5(repr((request.get_host(), request.path, params)).encode()).hexdigest()
+
+
+def get_response_key(namespace, request, pk=None):
+    digest = get_request_digest(request)
+    versions = get_versions(namespace, pk)
+    return 'store:response-cache:{}:{}:{}:{}'.format(
+        namespace, 'list' if pk is None else pk, '.'.join(map(str, versions)), digest
+    )
+
+
+def get_stats():
+    hits, misses = (get_cache().get(key, 0) for key in (HITS_KEY, MISSES_KEY))
+    return {'hits': hits, 'misses': misses}
+
+
+class CachedResponseMixin:
+    """
+    Caches the data of successful `list` and `retrieve` responses.
+
+    Entries are keyed on the normalized query string and carry version
+    numbers that the receivers in `store.signals` bump once a write to the
+    underlying rows commits, so nothing stale is served after it. Updates that
+    bypass signals (`QuerySet.update()`, `bulk_create()`, ...) have to call
+    `invalidate()` themselves. Misses are read from the primary: a lagging
+    replica would get its rows cached under the version of a newer write.
+    """
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(None, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(get_object_pk(self, kwargs), super().retrieve, request, *args, **kwargs)
+
+    def get_cached_response(self, object_pk, view, request, *args, **kwargs):
+        cache = get_cache()
+        key = get_response_key(self.cache_namespace, request, object_pk)
+        data = cache.get(key)
+        if data is not None:
+            incr(get_cache(), HITS_KEY)
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        incr(get_cache(), MISSES_KEY)
+        with replica_reads(False):
+            response = view(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, getattr(settings, 'STORE_RESPONSE_CACHE_TIMEOUT', 300))
+        response['X-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,58 @@
+from hashlib import md5
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from mosh_django.routers import replica_reads
+
+from . import cache
+
+
+class ConditionalGetMixin:
+    """
+    `ETag` / `Last-Modified` on `list` and `retrieve`, answering 304 when the
+    client's copy is still current.
+
+    Validators are worked out before the view runs and without serializing
+    anything: by default from the response cache versions of
+    `cache_namespace`, which every write to the namespace bumps. Viewsets
+    without a namespace override `get_validators()`. Validators and body
+    are read from the primary, a lagging replica would pair old rows with
+    the validators of a newer write.
+    """
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(None, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        object_pk = cache.get_object_pk(self, kwargs)
+        return self.get_conditional_response(object_pk, super().retrieve, request, *args, **kwargs)
+
+    def get_validators(self, request, object_pk=None):
+        """
+        Return `(etag, last_modified)`, either may be None.
+        """
+        versions = cache.get_versions(self.cache_namespace, object_pk)
+        return self.make_etag(request, versions), max(versions) // 10 ** 9
+
+    @staticmethod
+    def make_etag(request, state):
+        # the same state renders differently as JSON and as the browsable API
+        renderer = request.accepted_renderer
+        key = (cache.get_request_digest(request), renderer.format, request.accepted_media_type, state)
+        return md5(repr(key).encode()).hexdigest()
+
+    def get_conditional_response(self, object_pk, view, request, *args, **kwargs):
+        with replica_reads(False):
+            etag, last_modified = self.get_validators(request, object_pk)
+            if etag is not None:
+                etag = quote_etag(etag)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            if etag is not None:
+                response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
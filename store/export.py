@@ -0,0 +1,79 @@
+import csv
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from .filters import ProductFilter
+from .models import Product, Order, OrderItem
+from .pricing import price_with_tax
+
+
+class Export:
+    def __init__(self, get_queryset, columns, filterset_class=None):
+        self.get_queryset = get_queryset
+        self.columns = columns
+        self.filterset_class = filterset_class
+
+
+EXPORTS = {
+    'products': Export(
+        lambda: Product.objects.annotate(price_with_tax=price_with_tax()),
+        ['id', 'title', 'slug', 'description', 'unit_price', 'price_with_tax', 'inventory', 'last_update',
+         'collection_id'],
+        filterset_class=ProductFilter,
+    ),
+    'orders': Export(
+        lambda: Order.objects.all(),
+        ['id', 'placed_at', 'payment_status', 'completed_at', 'customer_id'],
+    ),
+    'order-items': Export(
+        lambda: OrderItem.objects.all(),
+        ['id', 'order_id', 'product_id', 'quantity', 'unit_price'],
+    ),
+}
+
+
+def iter_rows(queryset, columns, chunk_size=2000):
+    """
+    Yield `.values()` rows of the queryset in primary key order, one chunk at a time.
+
+    Each chunk is a separate `pk > last` query rather than one long cursor,
+    since MySQLdb buffers a whole result set on the client and memory would
+    grow with the table.
+    """
+    queryset = queryset.order_by('pk').values(*columns)
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows = list(chunk[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last_pk = rows[-1]['id']
+
+
+def ndjson_lines(rows, columns):
+    encoder = JSONEncoder()
+    for row in rows:
+        yield encoder.encode({column: row[column] for column in columns}) + '\n'
+
+
+class _Echo:
+    # file-like object for csv.writer that hands each line back
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows, columns):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in (row[column] for column in columns)
+        ])
+
+
+def render_lines(rows, columns, output_format):
+    if output_format == 'csv':
+        return csv_lines(rows, columns)
+    return ndjson_lines(rows, columns)
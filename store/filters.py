@@ -1,12 +1,56 @@
-from django_filters.rest_framework import FilterSet
+from django_filters.rest_framework import FilterSet, NumberFilter
+from rest_framework.filters import SearchFilter
 
 from .models import Product
+from .search import get_search_backend
 
 
 class ProductFilter(FilterSet):
+    # a tag id, matched through a single join on the tagged items
+    tag = NumberFilter(field_name='tags__tag')
+
     class Meta:
         model = Product
         fields = {
             'collection_id': ['exact'],
             'unit_price': ['gte', 'lte'],  # order matters
+            'effective_price': ['gte', 'lte'],
         }
+
+
+class ProductSearchFilter(SearchFilter):
+    """
+    `?search=` handled by the configured search backend (STORE_SEARCH_BACKEND)
+    instead of `icontains` lookups on `search_fields`.
+
+    Without an explicit `?ordering=` the results come most relevant first.
+    That ordering is handed to cursor pagination through `get_ordering()`,
+    so this backend has to be listed before OrderingFilter.
+    """
+    rank_ordering = ('-search_rank',)
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return get_search_backend().search(queryset, terms)
+
+    def get_ordering(self, request, queryset, view):
+        if self.get_search_terms(request) and not self.get_requested_ordering(request, view):
+            return self.rank_ordering
+        ordering_filter = self.get_ordering_filter(view)
+        if ordering_filter is not None:
+            return ordering_filter.get_ordering(request, queryset, view)
+        return getattr(view, 'ordering', None)
+
+    def get_ordering_filter(self, view):
+        for backend in getattr(view, 'filter_backends', []):
+            if backend is not type(self) and hasattr(backend, 'get_ordering'):
+                return backend()
+        return None
+
+    def get_requested_ordering(self, request, view):
+        ordering_filter = self.get_ordering_filter(view)
+        if ordering_filter is None:
+            return None
+        return request.query_params.get(ordering_filter.ordering_param)
@@ -0,0 +1,156 @@
+import csv
+import io
+import json
+import os
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.utils.text import slugify
+
+from .models import Collection, Product
+
+FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+# what a row is made of, `collection` is the title of one
+COLUMNS = ['slug', 'title', 'description', 'unit_price', 'inventory', 'collection']
+# what an import overwrites on the products that already exist
+UPDATE_FIELDS = ['title', 'description', 'unit_price', 'inventory', 'collection', 'last_update']
+
+
+def guess_format(name):
+    return FORMATS.get(os.path.splitext(name or '')[1].lower())
+
+
+def open_text(binary):
+    # utf-8-sig drops the byte order mark spreadsheets like to start CSV files with
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+
+
+def read_rows(lines, input_format):
+    """
+    Yield `(line number, row)` of CSV or NDJSON text lines as they are read.
+    A row is a dict, or None for a line that is not valid JSON.
+    """
+    if input_format == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, None
+
+
+class ProductImport:
+    """
+    Upserts products by slug from `read_rows()` rows, `chunk_size` of them
+    per `bulk_create(update_conflicts=True)`, so memory stays flat whatever
+    the size of the file. Collections are referenced by title and created
+    the first time a row names one that does not exist.
+
+    Invalid rows are skipped: all of them are counted, the first
+    `max_errors` kept with their line number and messages.
+    """
+
+    def __init__(self, chunk_size=1000, max_errors=100):
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+        # {title: pk} of every collection seen so far
+        self.collections = {}
+        self.rows = 0
+        self.imported = 0
+        self.invalid = 0
+        self.collections_created = 0
+        self.errors = []
+
+    def run(self, rows, progress=None):
+        """
+        Import every row, calling `progress(self)` after each chunk.
+        """
+        rows = iter(rows)
+        while chunk := list(islice(rows, self.chunk_size)):
+            self.rows += len(chunk)
+            self.write(self.clean_chunk(chunk))
+            if progress is not None:
+                progress(self)
+        return self
+
+    def clean_chunk(self, chunk):
+        # {slug: cleaned row}, the last row of a slug wins
+        cleaned = {}
+        for number, row in chunk:
+            try:
+                values = self.clean(row)
+            except ValidationError as error:
+                self.add_error(number, error.message_dict)
+            else:
+                cleaned[values['slug']] = values
+        return cleaned
+
+    @staticmethod
+    def clean(row):
+        if not isinstance(row, dict):
+            raise ValidationError({'__all__': ['Not a JSON object.']})
+        # CSV gives empty strings for empty cells
+        row = {column: None if row.get(column) == '' else row.get(column) for column in COLUMNS}
+        if row['slug'] is None and isinstance(row['title'], str):
+            row['slug'] = slugify(row['title'])
+
+        values, errors = {}, {}
+        for column in COLUMNS:
+            field = Collection._meta.get_field('title') if column == 'collection' else Product._meta.get_field(column)
+            try:
+                values[column] = field.clean(row[column], None)
+            except ValidationError as error:
+                errors[column] = error.messages
+        if errors:
+            raise ValidationError(errors)
+        return values
+
+    def add_error(self, line, errors):
+        self.invalid += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def get_collection_ids(self, titles):
+        missing = set(titles) - set(self.collections)
+        if missing:
+            # the oldest collection of a title is the one rows refer to
+            for title, pk in Collection.objects.filter(title__in=missing).order_by('-pk').values_list('title', 'pk'):
+                self.collections[title] = pk
+            new = [Collection(title=title) for title in sorted(missing - set(self.collections))]
+            if new:
+                Collection.objects.bulk_create(new)
+                self.collections.update((collection.title, collection.pk) for collection in new)
+                self.collections_created += len(new)
+        return self.collections
+
+    def write(self, cleaned):
+        if not cleaned:
+            return
+        collection_ids = self.get_collection_ids({values['collection'] for values in cleaned.values()})
+        products = []
+        for values in cleaned.values():
+            collection_id = collection_ids[values.pop('collection')]
+            products.append(Product(**values, collection_id=collection_id))
+        Product.objects.bulk_create(
+            products,
+            update_conflicts=True,
+            update_fields=UPDATE_FIELDS,
+            # MySQL upserts on any unique key and takes no conflict target
+            unique_fields=['slug'] if connection.features.supports_update_conflicts_with_target else None,
+        )
+        self.imported += len(products)
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'imported': self.imported,
+            'invalid': self.invalid,
+            'collections_created': self.collections_created,
+            'errors': self.errors,
+        }
@@ -0,0 +1,164 @@
+import asyncio
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from store.management.latency import percentile
+from store.models import Cart, CartItem, Collection, Product
+
+ENDPOINTS = {
+    # name: (sync url name, async url name, takes the object's pk)
+    'products': ('products-list', 'async-products-list', False),
+    'product': ('products-detail', 'async-products-detail', True),
+    'collections': ('collection-list', 'async-collection-list', False),
+    'cart': ('carts-detail', 'async-carts-detail', True),
+}
+
+
+def wsgi_get(application, path, query):
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': 'localhost',
+        'HTTP_ACCEPT': 'application/json', 'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO(),
+        'wsgi.url_scheme': 'http', 'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    statuses = []
+    response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        b''.join(response)
+    finally:
+        response.close()
+    return int(statuses[0].split()[0])
+
+
+async def asgi_get(application, path, query):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'root_path': '', 'query_string': query.encode(),
+        'headers': [(b'host', b'localhost'), (b'accept', b'application/json')],
+        'server': ('localhost', 80), 'client': ('127.0.0.1', 0),
+    }
+    messages = []
+    received = False
+    finished = asyncio.Event()
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # Django listens for a client disconnect until the response is out
+        await finished.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        messages.append(message)
+        if message['type'] == 'http.response.body' and not message.get('more_body'):
+            finished.set()
+
+    await application(scope, receive, send)
+    return messages[0]['status']
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares requests/s and latency of the sync read endpoints served through mosh_django.wsgi against '
+        'their async versions served through mosh_django.asgi, calling both applications in-process under '
+        'concurrent load, no HTTP server involved. Meant for a local SQLite database with DEBUG off; '
+        'the products, collection and cart it reads are created for the run and removed afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint and server.')
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--products', type=int, default=100)
+        parser.add_argument('--endpoint', choices=list(ENDPOINTS), action='append')
+
+    def handle(self, *args, **options):
+        if settings.DEBUG:
+            self.stderr.write('DEBUG is on: queries are recorded and the debug toolbar runs, numbers will be off.')
+
+        from mosh_django.asgi import application as asgi_application
+        from mosh_django.wsgi import application as wsgi_application
+
+        collection = Collection.objects.create(title='ASGI benchmark')
+        products = [
+            Product.objects.create(
+                title='Benchmark {}'.format(index), slug='benchmark-{}'.format(index),
+                inventory=10, unit_price=index + 1, collection=collection
+            )
+            for index in range(options['products'])
+        ]
+        cart = Cart.objects.create()
+        for product in products[:5]:
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+        pks = {'product': products[0].pk, 'cart': cart.pk}
+
+        self.stdout.write('{requests} requests per endpoint, {concurrency} concurrent'.format(**options))
+        self.stdout.write('{:<12} {:<5} {:>9} {:>9} {:>9} {:>9} {:>7}'.format(
+            'endpoint', 'via', 'seconds', 'req/s', 'p50 ms', 'p99 ms', 'errors'
+        ))
+        try:
+            for name in options['endpoint'] or list(ENDPOINTS):
+                sync_name, async_name, detail = ENDPOINTS[name]
+                args = [pks[name]] if detail else []
+                runs = (
+                    ('wsgi', self.run_wsgi, wsgi_application, reverse(sync_name, args=args)),
+                    ('asgi', self.run_asgi, asgi_application, reverse(async_name, args=args)),
+                )
+                for via, run, application, path in runs:
+                    stats = run(application, path, options['requests'], options['concurrency'])
+                    self.stdout.write('{:<12} {:<5} {:>9.2f} {:>9.1f} {:>9.2f} {:>9.2f} {:>7}'.format(
+                        name, via, stats['seconds'], options['requests'] / stats['seconds'],
+                        1000 * percentile(stats['latencies'], 0.5), 1000 * percentile(stats['latencies'], 0.99),
+                        stats['errors']
+                    ))
+        finally:
+            cart.delete()
+            Product.objects.filter(collection=collection).delete()
+            collection.delete()
+
+    @staticmethod
+    def get_query(index):
+        # a distinct query string per request keeps the sync views' response cache out of the numbers
+        return urlencode({'run': index})
+
+    def run_wsgi(self, application, path, requests, concurrency):
+        def timed(index):
+            started = time.perf_counter()
+            status = wsgi_get(application, path, self.get_query(index))
+            return time.perf_counter() - started, status
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = list(executor.map(timed, range(requests)))
+        return self.get_stats(results, time.perf_counter() - started)
+
+    def run_asgi(self, application, path, requests, concurrency):
+        async def run():
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def timed(index):
+                async with semaphore:
+                    started = time.perf_counter()
+                    status = await asgi_get(application, path, self.get_query(index))
+                    return time.perf_counter() - started, status
+
+            return await asyncio.gather(*(timed(index) for index in range(requests)))
+
+        started = time.perf_counter()
+        results = asyncio.run(run())
+        return self.get_stats(results, time.perf_counter() - started)
+
+    @staticmethod
+    def get_stats(results, seconds):
+        return {
+            'seconds': seconds,
+            'latencies': [latency for latency, _ in results],
+            'errors': sum(1 for _, status in results if status != 200),
+        }
@@ -0,0 +1,103 @@
+import random
+import threading
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, transaction
+
+from store.models import Collection, Product, Reservation
+
+
+def buy_with_row_lock(product_id, quantity):
+    with transaction.atomic():
+        product = Product.objects.select_for_update().only('inventory').get(pk=product_id)
+        if product.inventory < quantity:
+            raise ValidationError('Sold out.')
+        Product.objects.filter(pk=product_id).update(inventory=product.inventory - quantity)
+
+
+def buy_with_reservation(product_id, quantity):
+    Reservation.objects.reserve(product_id, quantity)
+
+
+STRATEGIES = {
+    'lock': buy_with_row_lock,
+    'reserve': buy_with_reservation,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Hammers a few products from many threads, buying one unit at a time, and reports throughput '
+        'and abort rate of row locking against conditional-update reservations. '
+        'Writes to the configured database, the products it creates are removed afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--products', type=int, default=4)
+        parser.add_argument('--attempts', type=int, default=200, help='Purchases per thread.')
+        parser.add_argument('--stock', type=int, help='Inventory per product, enough for every attempt by default.')
+        parser.add_argument('--strategy', choices=sorted(STRATEGIES), action='append')
+
+    def handle(self, *args, **options):
+        stock = options['stock'] or options['threads'] * options['attempts']
+        self.stdout.write('{threads} threads x {products} products, {attempts} attempts per thread'.format(**options))
+        self.stdout.write('{:<8} {:>9} {:>8} {:>8} {:>8} {:>10} {:>7}'.format(
+            'strategy', 'seconds', 'sold', 'soldout', 'aborted', 'sold/s', 'abort%'
+        ))
+        for name in options['strategy'] or sorted(STRATEGIES):
+            stats = self.run(STRATEGIES[name], options['threads'], options['products'], options['attempts'], stock)
+            attempts = options['threads'] * options['attempts']
+            self.stdout.write('{:<8} {:>9.2f} {:>8} {:>8} {:>8} {:>10.1f} {:>7.2f}'.format(
+                name, stats['seconds'], stats['sold'], stats['soldout'], stats['aborted'],
+                stats['sold'] / stats['seconds'], 100 * stats['aborted'] / attempts
+            ))
+
+    @staticmethod
+    def run(buy, threads, products, attempts, stock):
+        collection = Collection.objects.create(title='Inventory benchmark')
+        product_ids = [
+            Product.objects.create(
+                title='Benchmark {}'.format(index), slug='benchmark-{}'.format(index),
+                inventory=stock, unit_price=1, collection=collection
+            ).pk
+            for index in range(products)
+        ]
+        stats = {'sold': 0, 'soldout': 0, 'aborted': 0}
+        lock = threading.Lock()
+        barrier = threading.Barrier(threads + 1)
+
+        def worker():
+            counts = {'sold': 0, 'soldout': 0, 'aborted': 0}
+            try:
+                barrier.wait()
+                for _ in range(attempts):
+                    try:
+                        buy(random.choice(product_ids), 1)
+                        counts['sold'] += 1
+                    except ValidationError:
+                        counts['soldout'] += 1
+                    except DatabaseError:
+                        # deadlocks, lock wait timeouts, serialization failures
+                        counts['aborted'] += 1
+            finally:
+                connection.close()
+                with lock:
+                    for key, value in counts.items():
+                        stats[key] += value
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in workers:
+            thread.join()
+        stats['seconds'] = time.perf_counter() - started
+
+        Reservation.objects.filter(product_id__in=product_ids).delete()
+        Product.objects.filter(pk__in=product_ids).delete()
+        collection.delete()
+        return stats
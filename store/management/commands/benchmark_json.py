@@ -0,0 +1,100 @@
+import io
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from tags.models import TaggedItem
+
+from store.models import Cart, CartItem, Collection, Customer, Order, OrderItem, Product
+from store.pricing import price_with_tax
+from store.serializers import CartSerializer, OrderSerializer, ProductSerializer
+from store.views import CartViewSet, OrderViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        "Times DRF's JSONRenderer and JSONParser against mosh_django.fastjson's orjson versions on large product, "
+        'cart and order payloads, and checks both give the same bytes and data. The rows it serializes are created '
+        'for the run and removed afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=20, help='Renders and parses per payload and class.')
+
+    def handle(self, *args, **options):
+        from mosh_django.fastjson import ORJSONParser, ORJSONRenderer  # needs orjson
+
+        collection = Collection.objects.create(title='JSON benchmark')
+        Product.objects.bulk_create([
+            Product(
+                title='Benchmark {}'.format(index), slug='json-benchmark-{}'.format(index),
+                description='Product number {}, "quoted" and ünïcödé'.format(index),
+                inventory=index, unit_price='{}.{:02}'.format(index % 1000, index % 100), collection=collection
+            )
+            for index in range(options['products'])
+        ])
+        products = Product.objects.filter(collection=collection)
+        cart = Cart.objects.create()
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=product, quantity=product.inventory % 5 + 1) for product in products
+        ])
+        customer = Customer.objects.create(first_name='JSON', last_name='Benchmark', email='json@b.com', phone='1')
+        for index in range(options['orders']):
+            order = Order.objects.create(customer=customer)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, quantity=2, unit_price=product.unit_price)
+                for product in products[index % 50:index % 50 + 5]
+            ])
+
+        try:
+            payloads = {
+                'products': ProductSerializer(
+                    products.annotate(price_with_tax=price_with_tax()).prefetch_related(
+                        Prefetch('tags', queryset=TaggedItem.objects.select_related('tag'))
+                    ),
+                    many=True
+                ).data,
+                'cart': CartSerializer(CartViewSet.queryset.get(pk=cart.pk)).data,
+                'orders': OrderSerializer(OrderViewSet.queryset.filter(customer=customer), many=True).data,
+            }
+            self.stdout.write('{} renders and parses per payload'.format(options['repeat']))
+            self.stdout.write('{:<10} {:>8} {:<7} {:>10} {:>10} {:>8} {:>6}'.format(
+                'payload', 'KB', 'step', 'drf ms', 'orjson ms', 'speedup', 'same'
+            ))
+            for name, data in payloads.items():
+                steps = (
+                    ('render', JSONRenderer().render, ORJSONRenderer().render, data),
+                    ('parse', self.parser(JSONParser()), self.parser(ORJSONParser()), JSONRenderer().render(data)),
+                )
+                for step, drf, fast, argument in steps:
+                    expected, drf_seconds = self.time(drf, argument, options['repeat'])
+                    result, fast_seconds = self.time(fast, argument, options['repeat'])
+                    self.stdout.write('{:<10} {:>8.1f} {:<7} {:>10.2f} {:>10.2f} {:>7.1f}x {:>6}'.format(
+                        name, len(JSONRenderer().render(data)) / 1024, step, 1000 * drf_seconds,
+                        1000 * fast_seconds, drf_seconds / fast_seconds, 'yes' if result == expected else 'NO'
+                    ))
+        finally:
+            OrderItem.objects.filter(order__customer=customer).delete()
+            Order.objects.filter(customer=customer).delete()
+            customer.delete()
+            cart.delete()
+            products.delete()
+            collection.delete()
+
+    @staticmethod
+    def parser(parser):
+        return lambda body: parser.parse(io.BytesIO(body), parser.media_type, {'encoding': 'utf-8'})
+
+    @staticmethod
+    def time(function, argument, repeat):
+        # best of `repeat`, per call
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = function(argument)
+            best = min(best, time.perf_counter() - started)
+        return result, best
@@ -0,0 +1,89 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+from mosh_django.serializers import CompiledReadMixin
+from tags.models import TaggedItem
+
+from store.models import Cart, CartItem, Collection, Product, Review
+from store.pricing import price_with_tax
+from store.serializers import CartSerializer, ProductSerializer, ReviewSerializer
+from store.views import CartViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        'Times the compiled reads of CartSerializer, ProductSerializer and ReviewSerializer (see '
+        "mosh_django.serializers) against DRF's field by field serialization of the same instances, and checks "
+        'both give the same data. The rows it serializes are created for the run and removed afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--cart-items', type=int, default=50)
+        parser.add_argument('--reviews', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=20, help='Serializations per payload and mode.')
+
+    def handle(self, *args, **options):
+        collection = Collection.objects.create(title='Serializer benchmark')
+        Product.objects.bulk_create([
+            Product(
+                title='Benchmark {}'.format(index), slug='serializer-benchmark-{}'.format(index),
+                description='Product number {}'.format(index) if index % 3 else None,
+                inventory=index, unit_price='{}.{:02}'.format(index % 1000, index % 100), collection=collection
+            )
+            for index in range(max(options['products'], options['cart_items'], 1))
+        ])
+        products = Product.objects.filter(collection=collection)
+        cart = Cart.objects.create()
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=product, quantity=product.inventory % 5 + 1)
+            for product in products[:options['cart_items']]
+        ])
+        Review.objects.bulk_create([
+            Review(product=products[0], name='Reviewer {}'.format(index), description='Review {}'.format(index))
+            for index in range(options['reviews'])
+        ])
+        products.refresh_review_stats()
+
+        try:
+            tags = Prefetch('tags', queryset=TaggedItem.objects.select_related('tag').order_by('tag__label', 'pk'))
+            payloads = {
+                'cart': (CartSerializer, CartViewSet.queryset.get(pk=cart.pk), False),
+                'products': (
+                    ProductSerializer,
+                    list(products.annotate(price_with_tax=price_with_tax()).prefetch_related(tags)),
+                    True
+                ),
+                'reviews': (ReviewSerializer, list(Review.objects.filter(product__collection=collection)), True),
+            }
+            self.stdout.write('{} serializations per payload, instances loaded up front'.format(options['repeat']))
+            self.stdout.write('{:<10} {:>7} {:>10} {:>12} {:>8} {:>6}'.format(
+                'payload', 'objects', 'drf ms', 'compiled ms', 'speedup', 'same'
+            ))
+            for name, (serializer_class, instance, many) in payloads.items():
+                CompiledReadMixin.compiled_reads = False
+                try:
+                    expected, drf_seconds = self.time(serializer_class, instance, many, options['repeat'])
+                finally:
+                    CompiledReadMixin.compiled_reads = True
+                result, compiled_seconds = self.time(serializer_class, instance, many, options['repeat'])
+                self.stdout.write('{:<10} {:>7} {:>10.2f} {:>12.2f} {:>7.1f}x {:>6}'.format(
+                    name, len(instance) if many else len(expected['items']), 1000 * drf_seconds,
+                    1000 * compiled_seconds, drf_seconds / compiled_seconds, 'yes' if result == expected else 'NO'
+                ))
+        finally:
+            Review.objects.filter(product__collection=collection).delete()
+            cart.delete()
+            products.delete()
+            collection.delete()
+
+    @staticmethod
+    def time(serializer_class, instance, many, repeat):
+        # best of `repeat`, per serialization
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = serializer_class(instance, many=many).data
+            best = min(best, time.perf_counter() - started)
+        return result, best
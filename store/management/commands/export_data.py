@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+
+from store.export import EXPORTS, iter_rows, render_lines
+
+
+class Command(BaseCommand):
+    help = 'Streams products, orders or order items out as NDJSON or CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('export', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson')
+        parser.add_argument('--output', '-o', help='File to write to, stdout when omitted.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument(
+            '--filter', action='append', default=[], metavar='NAME=VALUE',
+            help='ProductFilter parameter, e.g. --filter collection_id=3 --filter unit_price__gte=10'
+        )
+
+    def handle(self, *args, **options):
+        export = EXPORTS[options['export']]
+        queryset = export.get_queryset()
+
+        if options['filter']:
+            if export.filterset_class is None:
+                raise CommandError('The {} export can not be filtered.'.format(options['export']))
+            filterset = export.filterset_class(data=QueryDict('&'.join(options['filter'])), queryset=queryset)
+            if not filterset.is_valid():
+                raise CommandError(filterset.errors.as_text())
+            queryset = filterset.qs
+
+        lines = render_lines(iter_rows(queryset, export.columns, options['chunk_size']), export.columns, options['format'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(lines)
+        else:
+            sys.stdout.writelines(lines)
@@ -0,0 +1,50 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.imports import ProductImport, guess_format, open_text, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Upserts products by slug from a CSV or NDJSON file with slug, title, description, unit_price, '
+        'inventory and collection (a title) columns, creating the collections that do not exist.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='File to read, - for stdin.')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Guessed from the extension when omitted.')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--max-errors', type=int, default=100, help='Invalid rows to list at the end.')
+
+    def handle(self, *args, **options):
+        input_format = options['format'] or guess_format(options['file'])
+        if input_format is None:
+            raise CommandError('Can not tell the format of {}, pass --format.'.format(options['file']))
+
+        importer = ProductImport(chunk_size=options['chunk_size'], max_errors=options['max_errors'])
+        try:
+            if options['file'] == '-':
+                importer.run(read_rows(open_text(sys.stdin.buffer), input_format), self.progress)
+            else:
+                with open(options['file'], 'rb') as file:
+                    importer.run(read_rows(open_text(file), input_format), self.progress)
+        except (OSError, UnicodeDecodeError) as error:
+            raise CommandError(error)
+
+        for error in importer.errors:
+            self.stderr.write('line {}: {}'.format(error['line'], '; '.join(
+                '{}: {}'.format(field, ' '.join(messages)) for field, messages in error['errors'].items()
+            )))
+        if importer.invalid > len(importer.errors):
+            self.stderr.write('... and {} more invalid rows'.format(importer.invalid - len(importer.errors)))
+        self.stdout.write(self.style.SUCCESS(
+            '{} products imported, {} invalid rows skipped, {} collections created'.format(
+                importer.imported, importer.invalid, importer.collections_created
+            )
+        ))
+
+    def progress(self, importer):
+        self.stdout.write('{} rows read, {} imported, {} invalid'.format(
+            importer.rows, importer.imported, importer.invalid
+        ))
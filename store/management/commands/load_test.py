@@ -0,0 +1,198 @@
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+
+from store.management.latency import percentile
+from store.models import Collection, Customer, Order, Product
+from store.search import tokenize
+
+MIX = {'browse': 40, 'search': 15, 'filter': 20, 'cart': 15, 'checkout': 10}
+
+
+def parse_mix(value):
+    try:
+        mix = {name: int(weight) for name, weight in (item.split('=') for item in value.split(','))}
+    except ValueError:
+        raise CommandError('--mix takes name=weight pairs, e.g. browse=40,checkout=10')
+    unknown = set(mix) - set(MIX)
+    if unknown:
+        raise CommandError('Unknown scenarios: {}'.format(', '.join(sorted(unknown))))
+    return mix
+
+
+class Session:
+    """
+    One simulated client: a Django test client (cookies included) and the
+    scenarios it replays, every request timed under an endpoint label.
+    """
+
+    def __init__(self, data, results, seed):
+        self.client = Client(HTTP_HOST='localhost', HTTP_ACCEPT='application/json', raise_request_exception=False)
+        self.data = data
+        self.results = results
+        self.random = random.Random(seed)
+        # checkouts are placed as the customer of the user signed in
+        self.client.force_login(get_user_model().objects.get(pk=self.random.choice(data['users'])))
+
+    def request(self, label, method, path, data=None):
+        started = time.perf_counter()
+        if method == 'get':
+            response = self.client.get(path, data)
+        else:
+            response = self.client.post(path, data, content_type='application/json')
+        self.results[label].append((time.perf_counter() - started, response.status_code))
+        return response
+
+    def browse(self):
+        ordering = self.random.choice([None, 'unit_price', '-unit_price', '-last_update'])
+        params = {'ordering': ordering} if ordering else None
+        response = self.request('GET products-list', 'get', '/store/products/', params)
+        if response.status_code == 200 and response.json()['next'] and self.random.random() < 0.5:
+            self.request('GET products-list next', 'get', response.json()['next'])
+        product_id = self.random.choice(self.data['products'])
+        self.request('GET products-detail', 'get', '/store/products/{}/'.format(product_id))
+        if self.random.random() < 0.3:
+            self.request('GET collection-list', 'get', '/store/collections/')
+
+    def search(self):
+        terms = self.random.sample(self.data['terms'], self.random.choice([1, 1, 2]))
+        self.request('GET products-list search', 'get', '/store/products/', {'search': ' '.join(terms)})
+
+    def filter(self):
+        low = self.random.choice(self.data['prices'])
+        self.request('GET products-list filter', 'get', '/store/products/', {
+            'collection_id': self.random.choice(self.data['collections']),
+            'unit_price__gte': low,
+            'unit_price__lte': low * 3,
+        })
+
+    def cart(self):
+        response = self.request('POST carts-list', 'post', '/store/carts/', {})
+        if response.status_code != 201:
+            return None
+        cart_id = response.json()['id']
+        for product_id in self.random.sample(self.data['products'], self.random.randint(1, 3)):
+            self.request('POST cart-items-list', 'post', '/store/carts/{}/cart-items/'.format(cart_id), {
+                'product_id': product_id, 'quantity': self.random.randint(1, 2)
+            })
+        self.request('GET carts-detail', 'get', '/store/carts/{}/'.format(cart_id))
+        return cart_id
+
+    def checkout(self):
+        cart_id = self.cart()
+        if cart_id is not None:
+            self.request('POST orders-list', 'post', '/store/orders/', {'cart_id': cart_id})
+
+
+class Command(BaseCommand):
+    help = (
+        'Replays a weighted mix of API scenarios (browse, search, filter, cart, checkout) against the API '
+        'in-process, from --concurrency threads for --duration seconds, and prints throughput and p50/p95/p99 '
+        'latency per endpoint as JSON. Checkouts place real orders and take stock, so run it against a database '
+        'seeded with seed_data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run.')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument(
+            '--mix', type=parse_mix, default=MIX,
+            help='Weights of the scenarios, default {}.'.format(','.join('{}={}'.format(*item) for item in MIX.items()))
+        )
+        parser.add_argument('--seed', type=int)
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        data = self.get_data()
+        mix = options['mix']
+        scenarios, weights = list(mix), list(mix.values())
+        results = [defaultdict(list) for _ in range(options['concurrency'])]
+        seeder = random.Random(options['seed'])
+        sessions = [Session(data, results[index], seeder.random()) for index in range(options['concurrency'])]
+        deadline = time.perf_counter() + options['duration']
+
+        def worker(session):
+            try:
+                while time.perf_counter() < deadline:
+                    getattr(session, session.random.choices(scenarios, weights)[0])()
+            finally:
+                connection.close()
+
+        started_at = timezone.now()
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(session,)) for session in sessions]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - started
+
+        report = self.get_report(results, seconds)
+        report.update({
+            'started_at': started_at.isoformat(),
+            'concurrency': options['concurrency'],
+            'mix': mix,
+            'dataset': {
+                'products': len(data['products']), 'collections': len(data['collections']),
+                'customers': len(data['customers']), 'orders': Order.objects.count(),
+            },
+        })
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    @staticmethod
+    def get_data():
+        products = list(Product.objects.filter(inventory__gt=0).values_list('pk', flat=True))
+        customers = list(Customer.objects.values_list('pk', flat=True))
+        users = list(Customer.objects.filter(user__isnull=False).values_list('user_id', flat=True))
+        if not products or not users:
+            raise CommandError('No products or customers with accounts to work with, run seed_data first.')
+        sample = Product.objects.order_by('?').values_list('title', 'unit_price')[:500]
+        return {
+            'products': products,
+            'customers': customers,
+            'users': users,
+            'collections': list(Collection.objects.values_list('pk', flat=True)),
+            'terms': sorted({term for title, _ in sample for term in tokenize(title)}),
+            'prices': [int(unit_price) or 1 for _, unit_price in sample],
+        }
+
+    @staticmethod
+    def get_report(results, seconds):
+        merged = defaultdict(list)
+        for session_results in results:
+            for label, samples in session_results.items():
+                merged[label].extend(samples)
+
+        endpoints = {}
+        for label, samples in sorted(merged.items()):
+            latencies = [latency for latency, _ in samples]
+            endpoints[label] = {
+                'requests': len(samples),
+                'errors': sum(1 for _, status in samples if status >= 400),
+                'throughput': round(len(samples) / seconds, 2),
+                'mean_ms': round(1000 * sum(latencies) / len(latencies), 2),
+                'p50_ms': round(1000 * percentile(latencies, 0.5), 2),
+                'p95_ms': round(1000 * percentile(latencies, 0.95), 2),
+                'p99_ms': round(1000 * percentile(latencies, 0.99), 2),
+            }
+        requests = sum(endpoint['requests'] for endpoint in endpoints.values())
+        return {
+            'seconds': round(seconds, 2),
+            'requests': requests,
+            'errors': sum(endpoint['errors'] for endpoint in endpoints.values()),
+            'throughput': round(requests / seconds, 2),
+            'endpoints': endpoints,
+        }
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from store.models import Collection, actual_products_count
+
+
+class Command(BaseCommand):
+    help = 'Recounts Collection.products_count where it drifted from the product table.'
+
+    def handle(self, *args, **options):
+        drifted = list(
+            Collection.objects.annotate(actual_count=actual_products_count())
+            .exclude(products_count=F('actual_count'))
+            .values_list('pk', flat=True)
+        )
+        if drifted:
+            Collection.objects.filter(pk__in=drifted).refresh_products_count()
+        self.stdout.write(self.style.SUCCESS('{} collection(s) fixed.'.format(len(drifted))))
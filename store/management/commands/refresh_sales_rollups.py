@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from store.analytics import refresh_sales_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Refreshes the daily product and collection sales rollups from the last high-water mark. Collection '
+        'sales count under the collection each order item was placed in, not the product\'s current one.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild every day instead.')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        since = refresh_sales_rollups(full=options['full'], batch_size=options['batch_size'])
+        if since is None:
+            self.stdout.write(self.style.SUCCESS('Sales rollups rebuilt.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Sales rollups refreshed from {}.'.format(since.isoformat())))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.models import Reservation
+
+
+class Command(BaseCommand):
+    help = 'Gives the stock of expired reservations back to their products, meant to run from cron.'
+
+    def handle(self, *args, **options):
+        released = Reservation.objects.expired().release()
+        self.stdout.write(self.style.SUCCESS('{} reservation(s) released.'.format(released)))
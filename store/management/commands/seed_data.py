@@ -0,0 +1,358 @@
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import accumulate, islice
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import models
+from django.db.models import Case, Max, Value, When
+from django.utils import timezone
+from django.utils.text import slugify
+from likes import counters
+from likes.models import LikedItem
+from tags.models import Tag, TaggedItem
+
+from store import cache
+from store.analytics import refresh_sales_rollups
+from store.models import (
+    Address, BulkCreateQuerySet, Cart, CartItem, Collection, Customer, Order, OrderItem, Product, Promotion, Review,
+)
+
+CATEGORIES = [
+    'Beauty', 'Books', 'Cleaning', 'Clothing', 'Electronics', 'Garden', 'Grocery', 'Health', 'Home', 'Kitchen',
+    'Music', 'Office', 'Outdoors', 'Pets', 'Shoes', 'Sports', 'Stationery', 'Tools', 'Toys', 'Travel',
+]
+ADJECTIVES = [
+    'Classic', 'Compact', 'Deluxe', 'Eco', 'Ergonomic', 'Essential', 'Foldable', 'Heavy Duty', 'Lightweight',
+    'Modern', 'Organic', 'Portable', 'Premium', 'Rustic', 'Sleek', 'Smart', 'Vintage', 'Waterproof', 'Wireless',
+]
+MATERIALS = [
+    'Aluminum', 'Bamboo', 'Ceramic', 'Copper', 'Cotton', 'Glass', 'Leather', 'Linen', 'Marble', 'Oak', 'Rubber',
+    'Silicone', 'Steel', 'Walnut', 'Wool',
+]
+NOUNS = [
+    'Backpack', 'Blanket', 'Bottle', 'Bowl', 'Brush', 'Chair', 'Clock', 'Desk', 'Headphones', 'Jacket', 'Kettle',
+    'Keyboard', 'Lamp', 'Mug', 'Notebook', 'Pan', 'Pillow', 'Planter', 'Scarf', 'Shelf', 'Speaker', 'Tent',
+    'Towel', 'Tray', 'Umbrella', 'Wallet', 'Watch',
+]
+FIRST_NAMES = [
+    'Ada', 'Ahmed', 'Amir', 'Ana', 'Ben', 'Chen', 'Chloe', 'David', 'Elif', 'Emma', 'Hana', 'Ivan', 'Kemal', 'Leila',
+    'Lucas', 'Maria', 'Mehmet', 'Mina', 'Noah', 'Omar', 'Priya', 'Reza', 'Sara', 'Tom', 'Yuki', 'Zeynep',
+]
+LAST_NAMES = [
+    'Ahmadi', 'Brown', 'Costa', 'Demir', 'Garcia', 'Ivanova', 'Kaya', 'Khan', 'Kim', 'Lee', 'Martin', 'Moreau',
+    'Muller', 'Nguyen', 'Novak', 'Rossi', 'Sato', 'Silva', 'Smith', 'Wang', 'Yilmaz',
+]
+CITIES = ['Ankara', 'Berlin', 'Istanbul', 'Lisbon', 'London', 'Madrid', 'Paris', 'Tehran', 'Tokyo', 'Toronto']
+STREETS = ['Oak', 'Maple', 'Cedar', 'Park', 'Lake', 'Hill', 'Station', 'Market', 'Church', 'Mill']
+REVIEW_WORDS = [
+    'great', 'value', 'sturdy', 'cheap', 'quality', 'arrived', 'late', 'broke', 'love', 'recommend', 'perfect',
+    'size', 'color', 'smaller', 'than', 'expected', 'works', 'well', 'again', 'would', 'buy',
+]
+TAG_WORDS = [
+    'bestseller', 'new', 'sale', 'gift', 'eco', 'handmade', 'limited', 'imported', 'local', 'premium', 'budget',
+    'bundle', 'clearance', 'seasonal', 'trending',
+]
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = (
+        'Adds a realistic dataset to the configured database with chunked bulk_create: collections, products with '
+        'promotions, customers with addresses and accounts, orders over the last --days, carts, reviews, tags and '
+        'likes. Popularity is skewed, a few products and customers account for most orders, reviews and likes. '
+        'Denormalized counts, effective prices, the search index, like counts and sales rollups are brought up '
+        'to date afterwards. Run it on an otherwise idle database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collections', type=int, default=20)
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--promotions', type=int, default=10)
+        parser.add_argument('--customers', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=5000)
+        parser.add_argument('--carts', type=int, default=300)
+        parser.add_argument('--reviews', type=int, default=5000)
+        parser.add_argument('--tags', type=int, default=40)
+        parser.add_argument('--users', type=int, default=300, help='Users that like products.')
+        parser.add_argument('--likes', type=int, default=5000)
+        parser.add_argument('--days', type=int, default=180, help='Orders and reviews spread over this many days.')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, help='Seed of the random generator, for repeatable datasets.')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        self.days = options['days']
+        self.now = timezone.now()
+
+        self.stage('collections', self.seed_collections, options['collections'])
+        self.stage('promotions', self.seed_promotions, options['promotions'])
+        self.stage('products', self.seed_products, options['products'])
+        self.stage('tags', self.seed_tags, options['tags'])
+        self.stage('customers', self.seed_customers, options['customers'])
+        self.stage('orders', self.seed_orders, options['orders'])
+        self.stage('carts', self.seed_carts, options['carts'])
+        self.stage('reviews', self.seed_reviews, options['reviews'])
+        self.stage('likes', self.seed_likes, options['users'], options['likes'])
+        self.stage('sales rollups', self.seed_sales_rollups)
+
+    def stage(self, name, seed, *args):
+        started = time.perf_counter()
+        created = seed(*args)
+        self.stdout.write('{:<14} {:>9} in {:.2f}s'.format(
+            name, '' if created is None else created, time.perf_counter() - started
+        ))
+
+    def create(self, model, objs):
+        """
+        bulk_create() `objs` in chunks and return their pks, in order.
+        """
+        pks = []
+        for chunk in batched(objs, self.chunk_size):
+            pks.extend(self.create_chunk(model, chunk))
+        return pks
+
+    @staticmethod
+    def create_chunk(model, objs):
+        queryset = model.objects.all()
+        if not isinstance(queryset, BulkCreateQuerySet):
+            # MySQL returns no ids, BulkCreateQuerySet looks them up
+            queryset = BulkCreateQuerySet(model)
+        queryset.bulk_create(objs)
+        return [obj.pk for obj in objs]
+
+    @staticmethod
+    def backdate(model, field, dates):
+        # auto_now_add fields are always stamped with the current time by bulk_create()
+        model.objects.filter(pk__in=dates).update(**{field: Case(
+            *(When(pk=pk, then=Value(value)) for pk, value in dates.items()), output_field=models.DateTimeField()
+        )})
+
+    def popularity(self, count):
+        # cumulative weights with a long tail: a handful of rows get most of the traffic
+        return list(accumulate(self.random.paretovariate(1.2) for _ in range(count)))
+
+    def pick(self, population, cum_weights, count):
+        # `count` distinct members, or fewer when there are not that many
+        picked = set()
+        for _ in range(count * 3):
+            picked.add(self.random.choices(population, cum_weights=cum_weights)[0])
+            if len(picked) >= count:
+                break
+        return picked
+
+    def past(self):
+        return self.now - timedelta(seconds=self.random.randint(0, self.days * 24 * 60 * 60))
+
+    @staticmethod
+    def next_number(model):
+        # numbers new unique emails, phones and usernames so reruns add rows instead of colliding
+        return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+    def seed_collections(self, count):
+        start = self.next_number(Collection)
+        self.collection_ids = self.create(Collection, (
+            Collection(title='{} {}'.format(CATEGORIES[index % len(CATEGORIES)], start + index))
+            for index in range(count)
+        ))
+        return len(self.collection_ids)
+
+    def seed_promotions(self, count):
+        self.promotion_ids = self.create(Promotion, (
+            Promotion(description='Promotion {}'.format(index + 1), discount=self.random.choice([0.05, 0.1, 0.2, 0.3]))
+            for index in range(count)
+        ))
+        return len(self.promotion_ids)
+
+    def seed_products(self, count):
+        collection_weights = self.popularity(len(self.collection_ids))
+        start = self.next_number(Product)
+        self.prices = {}
+        self.collections = {}
+
+        def products():
+            for index in range(count):
+                title = '{} {} {}'.format(
+                    self.random.choice(ADJECTIVES), self.random.choice(MATERIALS), self.random.choice(NOUNS)
+                )
+                yield Product(
+                    title=title,
+                    slug='{}-{}'.format(slugify(title), start + index),
+                    description='{} made of {}. {}'.format(
+                        title, title.split()[-2].lower(), ' '.join(self.random.sample(REVIEW_WORDS, 6))
+                    ),
+                    unit_price=Decimal(str(round(min(9999, max(1.0, self.random.lognormvariate(3, 0.9))), 2))),
+                    inventory=0 if self.random.random() < 0.05 else self.random.randint(1, 1000),
+                    collection_id=self.random.choices(self.collection_ids, cum_weights=collection_weights)[0],
+                )
+
+        self.product_ids = []
+        for chunk in batched(products(), self.chunk_size):
+            self.create_chunk(Product, chunk)
+            self.product_ids.extend(product.pk for product in chunk)
+            self.prices.update((product.pk, product.unit_price) for product in chunk)
+            self.collections.update((product.pk, product.collection_id) for product in chunk)
+        self.product_weights = self.popularity(len(self.product_ids))
+
+        if self.promotion_ids:
+            Through = Product.promotions.through
+            promoted = [product_id for product_id in self.product_ids if self.random.random() < 0.15]
+            self.create(Through, (
+                Through(product_id=product_id, promotion_id=promotion_id)
+                for product_id in promoted
+                for promotion_id in self.random.sample(
+                    self.promotion_ids, self.random.randint(1, min(2, len(self.promotion_ids)))
+                )
+            ))
+            for chunk in batched(promoted, self.chunk_size):
+                Product.objects.filter(pk__in=chunk).refresh_effective_price()
+        return len(self.product_ids)
+
+    def seed_tags(self, count):
+        start = self.next_number(Tag)
+        tag_ids = self.create(Tag, (
+            Tag(label='{}-{}'.format(TAG_WORDS[index % len(TAG_WORDS)], start + index)) for index in range(count)
+        ))
+        if not tag_ids:
+            return 0
+        tag_weights = self.popularity(len(tag_ids))
+        content_type = ContentType.objects.get_for_model(Product)
+        self.create(TaggedItem, (
+            TaggedItem(tag_id=tag_id, content_type=content_type, object_id=product_id)
+            for product_id in self.product_ids
+            for tag_id in self.pick(tag_ids, tag_weights, self.random.randint(0, 3))
+        ))
+        cache.invalidate_all(cache.TAGS)
+        return len(tag_ids)
+
+    def seed_customers(self, count):
+        start = self.next_number(Customer)
+        self.customer_ids = []
+        for chunk in batched(range(start, start + count), self.chunk_size):
+            customers = []
+            for number in chunk:
+                first_name, last_name = self.random.choice(FIRST_NAMES), self.random.choice(LAST_NAMES)
+                customers.append(Customer(
+                    first_name=first_name,
+                    last_name=last_name,
+                    email='{}.{}.{}@example.com'.format(first_name, last_name, number).lower(),
+                    phone='+1{:011d}'.format(number),
+                    birth_date=date(1950, 1, 1) + timedelta(days=self.random.randint(0, 365 * 55)),
+                    membership=self.random.choices('BSG', [70, 20, 10])[0],
+                ))
+            # the accounts they check out with
+            user_ids = self.create_chunk(User, [
+                User(username=customer.email, email=customer.email, password='!') for customer in customers
+            ])
+            for customer, user_id in zip(customers, user_ids):
+                customer.user_id = user_id
+            customer_ids = self.create_chunk(Customer, customers)
+            self.create_chunk(Address, [
+                Address(
+                    street='{} {} Street'.format(self.random.randint(1, 200), self.random.choice(STREETS)),
+                    city=self.random.choice(CITIES),
+                    customer_id=customer_id,
+                )
+                for customer_id in customer_ids
+                for _ in range(self.random.choice([1, 1, 1, 2]))
+            ])
+            self.customer_ids.extend(customer_ids)
+        self.customer_weights = self.popularity(len(self.customer_ids))
+        return len(self.customer_ids)
+
+    def seed_orders(self, count):
+        if not self.customer_ids or not self.product_ids:
+            return 0
+        for chunk in batched(range(count), self.chunk_size):
+            orders, placed_at = [], []
+            for _ in chunk:
+                placed = self.past()
+                status = self.random.choices([Order.COMPLETE, Order.PENDING, Order.FAILED], [85, 10, 5])[0]
+                orders.append(Order(
+                    customer_id=self.random.choices(self.customer_ids, cum_weights=self.customer_weights)[0],
+                    payment_status=status,
+                    completed_at=placed + timedelta(minutes=self.random.randint(1, 30))
+                    if status == Order.COMPLETE else None,
+                ))
+                placed_at.append(placed)
+            order_ids = self.create_chunk(Order, orders)
+            self.backdate(Order, 'placed_at', dict(zip(order_ids, placed_at)))
+            self.create_chunk(OrderItem, [
+                OrderItem(
+                    order_id=order_id, product_id=product_id,
+                    quantity=self.random.choice([1, 1, 1, 2, 3]), unit_price=self.prices[product_id],
+                    collection_id=self.collections[product_id]
+                )
+                for order_id in order_ids
+                for product_id in self.pick(self.product_ids, self.product_weights, self.random.randint(1, 5))
+            ])
+        return count
+
+    def seed_carts(self, count):
+        if not self.product_ids:
+            return 0
+        for chunk in batched(range(count), self.chunk_size):
+            carts = self.create_chunk(Cart, [Cart() for _ in chunk])
+            self.create_chunk(CartItem, [
+                CartItem(cart_id=cart_id, product_id=product_id, quantity=self.random.randint(1, 3))
+                for cart_id in carts
+                for product_id in self.pick(self.product_ids, self.product_weights, self.random.randint(1, 4))
+            ])
+        return count
+
+    def seed_reviews(self, count):
+        if not self.product_ids:
+            return 0
+        reviewed = set()
+        for chunk in batched(range(count), self.chunk_size):
+            reviews, dates = [], []
+            for _ in chunk:
+                product_id = self.random.choices(self.product_ids, cum_weights=self.product_weights)[0]
+                reviewed.add(product_id)
+                reviews.append(Review(
+                    product_id=product_id,
+                    name=self.random.choice(FIRST_NAMES),
+                    description=' '.join(self.random.sample(REVIEW_WORDS, self.random.randint(3, 12))),
+                ))
+                dates.append(self.past())
+            self.backdate(Review, 'date', dict(zip(self.create_chunk(Review, reviews), dates)))
+        for chunk in batched(sorted(reviewed), self.chunk_size):
+            Product.objects.filter(pk__in=chunk).refresh_review_stats()
+        return count
+
+    def seed_likes(self, users, count):
+        if not users or not self.product_ids:
+            return 0
+        start = self.next_number(User)
+        user_ids = self.create(User, (
+            User(username='shopper{}'.format(number), password='!') for number in range(start, start + users)
+        ))
+        user_weights = self.popularity(len(user_ids))
+        content_type = ContentType.objects.get_for_model(Product)
+        likes = set()
+        for _ in range(count * 3):
+            likes.add((
+                self.random.choices(user_ids, cum_weights=user_weights)[0],
+                self.random.choices(self.product_ids, cum_weights=self.product_weights)[0],
+            ))
+            if len(likes) >= count:
+                break
+        self.create(LikedItem, (
+            LikedItem(user_id=user_id, content_type=content_type, object_id=product_id)
+            for user_id, product_id in sorted(likes)
+        ))
+        counters.rebuild()
+        return len(likes)
+
+    @staticmethod
+    def seed_sales_rollups():
+        refresh_sales_rollups(full=True)
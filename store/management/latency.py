@@ -0,0 +1,6 @@
+def percentile(latencies, fraction):
+    """
+    The latency `fraction` of the samples are at or under, e.g. 0.99 for p99.
+    """
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.3 on 2026-10-18 10:34
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_products(apps, schema_editor):
+    Collection = apps.get_model('store', 'Collection')
+    Product = apps.get_model('store', 'Product')
+    actual = (
+        Product.objects.filter(collection_id=OuterRef('pk')).order_by()
+        .values('collection_id').annotate(count=Count('pk')).values('count')
+    )
+    Collection.objects.update(products_count=Coalesce(Subquery(actual), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_productsearchterm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='products_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.3 on 2026-10-18 10:46
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def collect_review_stats(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    Review = apps.get_model('store', 'Review')
+    stats = Review.objects.filter(product_id=OuterRef('pk')).order_by().values('product_id')
+    Product.objects.update(
+        reviews_count=Coalesce(Subquery(stats.annotate(count=Count('pk')).values('count')), 0),
+        last_review_at=Subquery(stats.annotate(latest=Max('date')).values('latest'))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_reservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='last_review_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='reviews_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'date'], name='store_revie_product_a44095_idx'),
+        ),
+        migrations.RunPython(collect_review_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.0.3 on 2026-10-18 10:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+
+
+def stamp_completed_orders(apps, schema_editor):
+    # the best guess there is for orders that completed before the field existed
+    Order = apps.get_model('store', 'Order')
+    Order.objects.filter(payment_status='C').update(completed_at=F('placed_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_product_review_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='CollectionDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.PositiveIntegerField()),
+                ('revenue', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('collection', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.collection')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='store_colle_day_cb00e4_idx')],
+                'unique_together': {('collection', 'day')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.PositiveIntegerField()),
+                ('revenue', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='store_produ_day_6c2b4b_idx')],
+                'unique_together': {('product', 'day')},
+            },
+        ),
+        migrations.RunPython(stamp_completed_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.3 on 2026-10-18 10:58
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import DecimalField, F, FloatField, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, Greatest, Least, Round
+
+
+def price_products(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    Promotion = apps.get_model('store', 'Promotion')
+    discount = Subquery(
+        Promotion.objects.filter(product=OuterRef('pk')).order_by()
+        .values('product').annotate(discount=Max('discount')).values('discount')
+    )
+    discount = Least(Greatest(Coalesce(discount, Value(0.0)), Value(0.0)), Value(1.0), output_field=FloatField())
+    Product.objects.update(effective_price=Round(
+        F('unit_price') * (Value(Decimal(1)) - Cast(discount, DecimalField(max_digits=7, decimal_places=6))),
+        2,
+        output_field=DecimalField(max_digits=6, decimal_places=2)
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, editable=False, max_digits=6),
+            preserve_default=False,
+        ),
+        migrations.RunPython(price_products, migrations.RunPython.noop),
+    ]
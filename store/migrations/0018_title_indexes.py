@@ -0,0 +1,22 @@
+# Generated by Django 5.0.3 on 2026-10-18 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0017_product_effective_price'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='collection',
+            name='title',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['title'], name='store_produ_title_244706_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.3 on 2026-10-18 14:20
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def dedupe_slugs(apps, schema_editor):
+    # the first product keeps a slug, the others get their id appended
+    Product = apps.get_model('store', 'Product')
+    duplicated = (
+        Product.objects.order_by().values('slug').annotate(count=Count('pk')).filter(count__gt=1)
+        .values_list('slug', flat=True)
+    )
+    for slug in list(duplicated):
+        for pk in Product.objects.filter(slug=slug).order_by('pk').values_list('pk', flat=True)[1:]:
+            suffix = '-{}'.format(pk)
+            Product.objects.filter(pk=pk).update(slug=slug[:50 - len(suffix)] + suffix)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0018_title_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='product',
+            name='slug',
+            field=models.SlugField(unique=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_collections(apps, schema_editor):
+    # the collections of past orders are not known, the products' current ones are the best guess
+    OrderItem = apps.get_model('store', 'OrderItem')
+    Product = apps.get_model('store', 'Product')
+    OrderItem.objects.update(collection_id=Subquery(
+        Product.objects.filter(pk=OuterRef('product_id')).values('collection_id')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0020_customer_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='collection',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='store.collection'),
+        ),
+        migrations.RunPython(backfill_collections, migrations.RunPython.noop),
+    ]
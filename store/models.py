@@ -1,6 +1,19 @@
+from collections import Counter
+from datetime import timedelta
+from functools import reduce
+from operator import or_
 from uuid import uuid4
 
-from django.db import models
+from django.conf import settings
+from django.contrib.contenttypes.fields import GenericRelation
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import Case, Count, F, Max, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from . import cache
+from .pricing import effective_price
 
 
 # Create your models here.
@@ -10,23 +23,235 @@ class Promotion(models.Model):
     discount = models.FloatField()
 
 
+def actual_products_count():
+    # COUNT(*) of a collection's products as a correlated subquery
+    return Coalesce(Subquery(
+        Product.objects.filter(collection_id=OuterRef('pk')).order_by()
+        .values('collection_id').annotate(count=Count('pk')).values('count')
+    ), 0)
+
+
+class BulkCreateQuerySet(models.QuerySet):
+    """
+    `bulk_create()` that sets the pks of the rows it inserts on backends
+    that return none (MySQL). Plain inserts only, the objects of upserts
+    are left as they are. Usable for any model: `BulkCreateQuerySet(User)`.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        if (
+            kwargs.get('ignore_conflicts') or kwargs.get('update_conflicts')
+            or connections[self.db].features.can_return_rows_from_bulk_insert
+        ):
+            return super().bulk_create(objs, *args, **kwargs)
+        rows = self.model._base_manager.using(self.db).order_by('pk')
+        with transaction.atomic(using=self.db):
+            last_pk = rows.reverse().values_list('pk', flat=True).first()
+            created = super().bulk_create(objs, *args, **kwargs)
+            if any(obj.pk is None for obj in objs):
+                # auto-increment hands out the ids of an INSERT in row order, all above the last one
+                for obj, pk in zip(objs, rows.filter(pk__gt=last_pk or 0).values_list('pk', flat=True)):
+                    obj.pk = pk
+        return created
+
+
+class CollectionQuerySet(BulkCreateQuerySet):
+    def adjust_products_count(self, deltas):
+        """
+        Apply `{collection_id: delta}` to the stored products_count, in the database.
+        """
+        for collection_id, delta in deltas.items():
+            if delta and collection_id is not None:
+                self.filter(pk=collection_id).update(products_count=F('products_count') + delta)
+        cache.invalidate(cache.COLLECTIONS, *deltas)
+
+    def refresh_products_count(self):
+        """
+        Recount products_count for the collections of this queryset.
+        """
+        updated = self.update(products_count=actual_products_count())
+        cache.invalidate_all(cache.COLLECTIONS)
+        return updated
+
+
 class Collection(models.Model):
-    title = models.CharField(max_length=255)
+    title = models.CharField(max_length=255, db_index=True)
     featured_product = models.ForeignKey('Product', on_delete=models.SET_NULL, null=True, related_name='+')
+    # denormalized, kept up to date by store.signals and ProductQuerySet
+    products_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = CollectionQuerySet.as_manager()
 
     def __str__(self):
         return self.title
 
 
+class ProductQuerySet(BulkCreateQuerySet):
+    """
+    Bulk writes that keep `Collection.products_count`, the search index and
+    `effective_price` in step, since they bypass the save/delete signals
+    that maintain them for single rows.
+    """
+    # updates of more products than this drop every cached product response
+    invalidate_limit = 100
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from .search import get_search_backend  # store.search imports this module
+
+        objs = list(objs)
+        if not objs:
+            return objs
+        for obj in objs:
+            # new products have no promotions yet
+            if obj.effective_price is None:
+                obj.effective_price = obj.unit_price
+        with transaction.atomic(using=self.db):
+            unique_fields = kwargs.get('unique_fields') or self._get_unique_fields()
+            moved = {'collection', 'collection_id'} & set(kwargs.get('update_fields') or [])
+            left = None
+            if kwargs.get('update_conflicts') and moved and unique_fields:
+                # the collections the updated rows are about to leave
+                left = set(self._filter_unique(objs, unique_fields).values_list('collection_id', flat=True))
+            created = super().bulk_create(objs, *args, **kwargs)
+
+            if left is not None:
+                Collection.objects.filter(pk__in=left | {obj.collection_id for obj in objs}).refresh_products_count()
+            elif kwargs.get('update_conflicts') and moved:
+                # updated rows may have left collections we know nothing about
+                Collection.objects.refresh_products_count()
+            elif kwargs.get('ignore_conflicts') or kwargs.get('update_conflicts'):
+                # which rows were inserted and which were updated is unknown here
+                Collection.objects.filter(pk__in={obj.collection_id for obj in objs}).refresh_products_count()
+            else:
+                Collection.objects.adjust_products_count(Counter(obj.collection_id for obj in objs))
+
+            rows = self._get_written(objs, unique_fields)
+            get_search_backend().index(rows)
+            if kwargs.get('update_conflicts') and 'unit_price' in (kwargs.get('update_fields') or []):
+                # updated rows may have promotions
+                self.model.objects.filter(pk__in=[row.pk for row in rows]).refresh_effective_price()
+        cache.invalidate_all(cache.PRODUCTS)
+        return created
+
+    def _get_written(self, objs, unique_fields):
+        if all(obj.pk is not None for obj in objs):
+            return objs
+        # upserts: look the rows up again by their conflict target
+        rows = list(self._filter_unique(objs, unique_fields))
+        # callers serializing the objects still need their ids
+        attnames = [self.model._meta.get_field(field).attname for field in unique_fields]
+        pks = {tuple(getattr(row, attname) for attname in attnames): row.pk for row in rows}
+        for obj in objs:
+            obj.pk = pks.get(tuple(getattr(obj, attname) for attname in attnames))
+        return rows
+
+    def _get_unique_fields(self):
+        # the conflict target of upserts on backends that take none (MySQL)
+        return [field.name for field in self.model._meta.local_fields if field.unique and not field.primary_key]
+
+    def _filter_unique(self, objs, unique_fields):
+        if len(unique_fields) == 1:
+            field = unique_fields[0]
+            return self.model.objects.filter(**{field + '__in': [getattr(obj, field) for obj in objs]})
+        return self.model.objects.filter(reduce(or_, (
+            Q(**{field: getattr(obj, field) for field in unique_fields}) for obj in objs
+        )))
+
+    def refresh_effective_price(self):
+        """
+        Recompute effective_price of the products of this queryset from their promotions.
+        """
+        return self.update(effective_price=effective_price())
+
+    def update(self, **kwargs):
+        # bulk_update() goes through here as well
+        moves = 'collection' in kwargs or 'collection_id' in kwargs
+        reindex = 'title' in kwargs or 'description' in kwargs
+        reprice = 'unit_price' in kwargs
+        if not moves and not reindex and not reprice:
+            pks = list(self.order_by().values_list('pk', flat=True)[:self.invalidate_limit + 1])
+            updated = super().update(**kwargs)
+            self._invalidate(pks)
+            return updated
+
+        from .search import get_search_backend
+
+        with transaction.atomic(using=self.db):
+            pks = list(self.values_list('pk', flat=True))
+            affected = self.model.objects.filter(pk__in=pks).order_by()
+            # the new collection may be an expression (bulk_update uses CASE),
+            # so compare the grouping of the affected rows before and after
+            deltas = Counter()
+            if moves:
+                deltas.subtract(dict(affected.values_list('collection_id').annotate(Count('pk'))))
+            updated = super().update(**kwargs)
+            if moves:
+                deltas.update(dict(affected.values_list('collection_id').annotate(Count('pk'))))
+                Collection.objects.adjust_products_count(deltas)
+            if reindex:
+                get_search_backend().index(affected)
+            if reprice:
+                affected.refresh_effective_price()
+        self._invalidate(pks)
+        return updated
+
+    def _invalidate(self, pks):
+        # the cached details of the updated products, or all of them past invalidate_limit
+        if len(pks) > self.invalidate_limit:
+            cache.invalidate_all(cache.PRODUCTS)
+        else:
+            cache.invalidate(cache.PRODUCTS, *pks)
+
+    def add_review(self, review):
+        """
+        Count a new review into the product's stored review stats, in the database.
+        """
+        date = Value(review.date, output_field=models.DateTimeField())
+        return self.filter(pk=review.product_id).update(
+            reviews_count=F('reviews_count') + 1,
+            last_review_at=Greatest(Coalesce('last_review_at', date), date)
+        )
+
+    def refresh_review_stats(self):
+        """
+        Recount reviews_count and last_review_at for the products of this
+        queryset, after reviews were written without signals (bulk_create()).
+        """
+        stats = Review.objects.filter(product_id=OuterRef('pk')).order_by().values('product_id')
+        return self.update(
+            reviews_count=Coalesce(Subquery(stats.annotate(count=Count('pk')).values('count')), 0),
+            last_review_at=Subquery(stats.annotate(latest=Max('date')).values('latest'))
+        )
+
+    def remove_review(self, review):
+        """
+        Take a deleted review out of the product's stored review stats, in the database.
+        """
+        latest = Review.objects.filter(product_id=OuterRef('pk')).order_by('-date').values('date')[:1]
+        return self.filter(pk=review.product_id).update(
+            reviews_count=F('reviews_count') - 1,
+            last_review_at=Subquery(latest)
+        )
+
+
 class Product(models.Model):
     title = models.CharField(max_length=255)  # VARCHAR 255
-    slug = models.SlugField()
+    slug = models.SlugField(unique=True)
     description = models.TextField(null=True, blank=True)
     unit_price = models.DecimalField(max_digits=6, decimal_places=2)
+    # unit_price less the best promotion, kept up to date by store.signals and ProductQuerySet
+    effective_price = models.DecimalField(max_digits=6, decimal_places=2, editable=False, db_index=True)
     inventory = models.IntegerField()
     last_update = models.DateTimeField(auto_now=True)
     collection = models.ForeignKey(Collection, on_delete=models.PROTECT, related_name='products')
     promotions = models.ManyToManyField(Promotion, null=True, blank=True)
+    # denormalized, kept up to date by store.signals
+    reviews_count = models.PositiveIntegerField(default=0, editable=False)
+    last_review_at = models.DateTimeField(null=True, editable=False)
+    tags = GenericRelation('tags.TaggedItem', related_query_name='product')
+
+    objects = ProductQuerySet.as_manager()
 
     def __str__(self):
         return "id: {} -- {} - Price: {} - Update Time: {}".format(
@@ -38,6 +263,19 @@ class Product(models.Model):
 
     class Meta:
         ordering = ['title']
+        indexes = [
+            models.Index(fields=['title'])
+        ]
+
+
+class ProductSearchTerm(models.Model):
+    # inverted index behind the product search, see store.search
+    term = models.CharField(max_length=64)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    weight = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = [['term', 'product']]
 
 
 class Customer(models.Model):
@@ -53,6 +291,8 @@ class Customer(models.Model):
     phone = models.CharField(max_length=13, unique=True)
     birth_date = models.DateField(null=True)
     membership = models.CharField(max_length=1, choices=MEMBERSHIP_CHOICES, default='B')
+    # the account that checks out as this customer
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
 
     class Meta:
         indexes = [
@@ -61,6 +301,52 @@ class Customer(models.Model):
         ]
 
 
+class OrderQuerySet(models.QuerySet):
+    def place(self, cart_id, customer_id):
+        """
+        Turn the cart into an order of the customer and return the order.
+
+        Everything happens in one transaction and in the same handful of
+        queries whatever the size of the cart. The cart items and then their
+        products are locked in primary key order, so concurrent checkouts
+        over the same products queue up instead of deadlocking, and the
+        inventory is checked and decremented while the locks are held. Order
+        items keep the unit price and collection the product had at the time.
+        Raises ValidationError when the cart is empty or a product is short.
+        """
+        with transaction.atomic(using=self.db):
+            quantities = dict(
+                CartItem.objects.using(self.db).select_for_update().filter(cart_id=cart_id)
+                .order_by('product_id').values_list('product_id', 'quantity')
+            )
+            if not quantities:
+                raise ValidationError({'cart_id': 'The cart is empty.'})
+
+            products = list(
+                Product.objects.using(self.db).select_for_update().filter(pk__in=quantities)
+                .order_by('pk').only('pk', 'title', 'inventory', 'unit_price', 'collection')
+            )
+            short = [
+                'Only {} of "{}" left in stock.'.format(max(product.inventory, 0), product.title)
+                for product in products if product.inventory < quantities[product.pk]
+            ]
+            if short:
+                raise ValidationError({'items': short})
+
+            Product.objects.using(self.db).filter(pk__in=quantities).update(inventory=Case(
+                *(When(pk=product_id, then=F('inventory') - quantity) for product_id, quantity in quantities.items()),
+                default=F('inventory')
+            ))
+            order = self.create(customer_id=customer_id)
+            OrderItem.objects.using(self.db).bulk_create(
+                OrderItem(order=order, product_id=product.pk, quantity=quantities[product.pk],
+                          unit_price=product.unit_price, collection_id=product.collection_id)
+                for product in products
+            )
+            Cart.objects.using(self.db).filter(pk=cart_id).delete()
+        return order
+
+
 class Order(models.Model):
     PENDING, COMPLETE, FAILED = ('P', 'C', 'F')
     PAYMENT_STATUS_CHOICES = [
@@ -70,19 +356,64 @@ class Order(models.Model):
     ]
     placed_at = models.DateTimeField(auto_now_add=True)
     payment_status = models.CharField(max_length=1, choices=PAYMENT_STATUS_CHOICES, default=PENDING)
+    # when the order turned complete, sales rollups refresh from it
+    completed_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT)
 
+    objects = OrderQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        # updates through QuerySet.update() have to set completed_at themselves
+        if self.payment_status == self.COMPLETE and self.completed_at is None:
+            self.completed_at = timezone.now()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'completed_at'}
+        super().save(*args, **kwargs)
+
 
 class Cart(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4)
     created_at = models.DateTimeField(auto_now_add=True)
 
 
+class CartItemQuerySet(models.QuerySet):
+    def add(self, cart_id, product_id, quantity):
+        """
+        Put `quantity` more of the product into the cart and return the item.
+
+        An in-place `quantity = quantity + n` UPDATE, or an INSERT when the
+        item is not there yet. Two requests racing to insert the same item
+        collide on the (cart, product) unique constraint, and the loser
+        falls back to the UPDATE, so no addition is ever lost. Raises
+        ValidationError when the quantity would not fit the column.
+        """
+        item = self.filter(cart_id=cart_id, product_id=product_id)
+        # the UPDATE only matches an item with room left for `quantity` more
+        room = item.filter(quantity__lte=CartItem.MAX_QUANTITY - quantity)
+        with transaction.atomic(using=self.db):
+            if not room.update(quantity=F('quantity') + quantity):
+                try:
+                    with transaction.atomic(using=self.db):
+                        return self.create(cart_id=cart_id, product_id=product_id, quantity=quantity)
+                except IntegrityError:
+                    # the item is there, either without room or inserted by a racing request
+                    if not room.update(quantity=F('quantity') + quantity):
+                        raise ValidationError(
+                            {'quantity': 'At most {} of a product fit in a cart.'.format(CartItem.MAX_QUANTITY)}
+                        )
+            return item.get()
+
+
 class CartItem(models.Model):
+    # what a PositiveSmallIntegerField holds on every backend
+    MAX_QUANTITY = 32767
+
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveSmallIntegerField()
 
+    objects = CartItemQuerySet.as_manager()
+
     class Meta:
         unique_together = [['cart', 'product']]
 
@@ -92,6 +423,90 @@ class OrderItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name='orderitems')
     quantity = models.PositiveSmallIntegerField()
     unit_price = models.DecimalField(max_digits=6, decimal_places=2)
+    # the product's collection when the order was placed, what the collection sales rollups group by
+    collection = models.ForeignKey(Collection, on_delete=models.SET_NULL, null=True, editable=False, related_name='+')
+
+
+class ReservationQuerySet(models.QuerySet):
+    """
+    Stock held for a buyer for a limited time.
+
+    Taking stock is a single conditional `UPDATE ... WHERE inventory >= n`
+    rather than a locking read followed by a write, so the product row is
+    only locked for the duration of that statement. Reservations that run
+    out are handed back by `release()`, either lazily when a product looks
+    sold out or by the release_expired_reservations command.
+    """
+
+    def reserve(self, product_id, quantity, ttl=None):
+        """
+        Hold `quantity` of the product for `ttl` seconds and return the reservation.
+
+        Raises ValidationError when there is not enough stock left.
+        """
+        if ttl is None:
+            ttl = getattr(settings, 'STORE_RESERVATION_TTL', 60 * 10)
+        reservation = self._take(product_id, quantity, ttl)
+        # the stock may be sitting in reservations nobody is going to complete
+        if reservation is None and self.filter(product_id=product_id).expired().release():
+            reservation = self._take(product_id, quantity, ttl)
+        if reservation is None:
+            raise ValidationError({'quantity': 'Not enough of the product left in stock.'})
+        return reservation
+
+    def _take(self, product_id, quantity, ttl):
+        with transaction.atomic(using=self.db):
+            taken = Product.objects.using(self.db).filter(pk=product_id, inventory__gte=quantity).update(
+                inventory=F('inventory') - quantity
+            )
+            if taken:
+                return self.create(
+                    product_id=product_id, quantity=quantity, expires_at=timezone.now() + timedelta(seconds=ttl)
+                )
+        return None
+
+    def expired(self):
+        return self.filter(expires_at__lte=timezone.now())
+
+    def active(self):
+        return self.filter(expires_at__gt=timezone.now())
+
+    def confirm(self):
+        """
+        Turn the active reservations of this queryset into sales, the
+        inventory stays taken. Returns how many were confirmed.
+        """
+        return self.active().delete()[0]
+
+    def release(self):
+        """
+        Delete the reservations of this queryset and give their stock back.
+        Returns how many were released.
+        """
+        skip_locked = connections[self.db].features.has_select_for_update_skip_locked
+        with transaction.atomic(using=self.db):
+            # rows another release or a confirm holds are theirs to deal with
+            rows = list(self.select_for_update(skip_locked=skip_locked).values_list('pk', 'product_id', 'quantity'))
+            if not rows:
+                return 0
+            quantities = Counter()
+            for _, product_id, quantity in rows:
+                quantities[product_id] += quantity
+            Product.objects.using(self.db).filter(pk__in=sorted(quantities)).update(inventory=Case(
+                *(When(pk=product_id, then=F('inventory') + quantity) for product_id, quantity in quantities.items()),
+                default=F('inventory')
+            ))
+            self.model.objects.using(self.db).filter(pk__in=[pk for pk, _, _ in rows]).delete()
+        return len(rows)
+
+
+class Reservation(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveSmallIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    objects = ReservationQuerySet.as_manager()
 
 
 class Address(models.Model):
@@ -105,3 +520,41 @@ class Review(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField()
     date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'date'])
+        ]
+
+
+class ProductDailySales(models.Model):
+    # rollup of completed order items, see store.analytics
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    day = models.DateField()
+    quantity = models.PositiveIntegerField()
+    revenue = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        unique_together = [['product', 'day']]
+        indexes = [
+            models.Index(fields=['day'])
+        ]
+
+
+class CollectionDailySales(models.Model):
+    collection = models.ForeignKey(Collection, on_delete=models.CASCADE, related_name='+')
+    day = models.DateField()
+    quantity = models.PositiveIntegerField()
+    revenue = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        unique_together = [['collection', 'day']]
+        indexes = [
+            models.Index(fields=['day'])
+        ]
+
+
+class RollupWatermark(models.Model):
+    # how far each rollup has been refreshed
+    name = models.CharField(max_length=50, unique=True)
+    value = models.DateTimeField(null=True)
@@ -1,5 +1,289 @@
-from rest_framework.pagination import PageNumberPagination
+from asgiref.sync import sync_to_async
+from django.core import signing
+from django.core.paginator import InvalidPage, Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination, CursorPagination, Cursor
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class DefaultPagination(PageNumberPagination):
     page_size = 10
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        `paginate_queryset()` for async views, counting and fetching the page with the async ORM.
+        """
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # a cached_property, filled in up front so locating the page runs no COUNT of its own
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+        self.page.object_list = [item async for item in self.page.object_list]
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.request = request
+        return self.page.object_list
+
+
+def table_row_estimate(model, using='default'):
+    """
+    Row count of the model's table taken from the database statistics,
+    or None when the backend has no cheap estimate to offer.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables '
+                'WHERE table_schema = DATABASE() AND table_name = %s',
+                [table]
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def estimate_count(queryset, limit=1000):
+    """
+    Approximate number of rows in the queryset, as `(count, exact)`.
+
+    Unfiltered querysets are answered from table statistics, anything else
+    is counted exactly but never past `limit` rows, so a count of `limit`
+    is only a lower bound. `exact` is False in both cases.
+    """
+    if not queryset.query.where:
+        estimate = table_row_estimate(queryset.model, queryset.db)
+        if estimate is not None and estimate >= limit:
+            return estimate, False
+    count = queryset.order_by()[:limit].count()
+    return count, count < limit
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Django paginator, for the admin, that takes the total of unfiltered
+    querysets from table statistics once the table has grown past
+    `threshold` rows, instead of a COUNT(*) over all of it.
+    """
+    threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            estimate = table_row_estimate(queryset.model, queryset.db)
+            if estimate is not None and estimate >= self.threshold:
+                return estimate
+        return super().count
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination over any combination of ordering fields.
+
+    Rows are located with a `WHERE (a, b, pk) > (x, y, z)` style filter
+    instead of an OFFSET, and the primary key is always appended as a
+    tie-breaker so pages stay stable when ordering values repeat.
+    The cursor is a signed token holding the boundary row's values.
+
+    With a `count_mode` the page also carries `count`, and `count_is_exact`
+    telling an exact total from an estimate or a lower bound, see
+    estimate_count().
+    """
+    page_size = 10
+    ordering = 'pk'
+    tiebreaker = 'pk'
+    # None, 'exact' or 'approximate'
+    count_mode = None
+    count_limit = 1000
+    cursor_salt = 'store.pagination.keyset'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self._start(queryset, request, view):
+            return None
+        if self.count_mode == 'exact':
+            self.count, self.count_is_exact = queryset.count(), True
+        elif self.count_mode == 'approximate':
+            self.count, self.count_is_exact = estimate_count(queryset, self.count_limit)
+        return self._set_page(list(self._get_page_queryset(queryset)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        `paginate_queryset()` for async views, counting and fetching the page with the async ORM.
+        """
+        if not self._start(queryset, request, view):
+            return None
+        if self.count_mode == 'exact':
+            self.count, self.count_is_exact = await queryset.acount(), True
+        elif self.count_mode == 'approximate':
+            self.count, self.count_is_exact = await sync_to_async(estimate_count)(queryset, self.count_limit)
+        return self._set_page([row async for row in self._get_page_queryset(queryset)])
+
+    def _start(self, queryset, request, view):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return False
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.keys = [self._get_key(queryset, item) for item in self.ordering]
+        self.cursor = self.decode_cursor(request)
+        self.count = self.count_is_exact = None
+        return True
+
+    def _get_page_queryset(self, queryset):
+        reverse = self.cursor is not None and self.cursor.reverse
+        queryset = queryset.order_by(*self._get_order_by(reverse))
+        if self.cursor is not None:
+            queryset = queryset.filter(self._get_keyset_filter(self.cursor.position, reverse))
+        return queryset[:self.page_size + 1]
+
+    def _set_page(self, results):
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if self.cursor is not None and self.cursor.reverse:
+            self.page.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous, self.has_next = self.cursor is not None, has_more
+
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        pk_names = {'pk', queryset.model._meta.pk.name}
+        if not any(item.lstrip('-') in pk_names for item in ordering):
+            ordering += (self.tiebreaker,)
+        return ordering
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self._get_position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self._get_position(self.page[0])))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            tokens = self.get_signer().unsign_object(encoded)
+            position = [
+                field.to_python(value) for (_, field, _), value in zip(self.keys, tokens['p'], strict=True)
+            ]
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        # a cursor issued for another ordering can not be positioned in this one
+        if tokens.get('o') != list(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        return Cursor(offset=0, reverse=bool(tokens.get('r')), position=position)
+
+    def get_signer(self):
+        # no timestamp, cursors never expire and the same page always gets the same one
+        return signing.Signer(salt=self.cursor_salt)
+
+    def encode_cursor(self, cursor):
+        tokens = {'p': cursor.position, 'o': list(self.ordering)}
+        if cursor.reverse:
+            tokens['r'] = 1
+        encoded = self.get_signer().sign_object(tokens, compress=True)
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_paginated_response(self, data):
+        payload = {}
+        if self.count is not None:
+            payload['count'] = self.count
+            payload['count_is_exact'] = self.count_is_exact
+        payload['next'] = self.get_next_link()
+        payload['previous'] = self.get_previous_link()
+        payload['results'] = data
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        if self.count_mode is not None:
+            response_schema['properties']['count'] = {'type': 'integer', 'example': 123}
+            response_schema['properties']['count_is_exact'] = {
+                'type': 'boolean',
+                'description': 'False when `count` is estimated, or only a lower bound on a large filtered result.',
+            }
+        return response_schema
+
+    @staticmethod
+    def _get_key(queryset, item):
+        name = item.lstrip('-')
+        assert '__' not in name, 'Keyset pagination only supports ordering on fields of the model itself.'
+        if name in queryset.query.annotations:
+            # e.g. a rank annotated by a filter backend
+            return name, queryset.query.annotations[name].output_field, item.startswith('-')
+        field = queryset.model._meta.pk if name == 'pk' else queryset.model._meta.get_field(name)
+        assert not field.null, 'Keyset pagination can not order on nullable field "{}".'.format(name)
+        return field.attname, field, item.startswith('-')
+
+    def _get_order_by(self, reverse):
+        return [
+            ('-' if descending != reverse else '') + name
+            for name, _, descending in self.keys
+        ]
+
+    def _get_keyset_filter(self, position, reverse):
+        # (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND pk > z)
+        keyset_filter = Q()
+        equal = Q()
+        for (name, _, descending), value in zip(self.keys, position):
+            lookup = 'lt' if descending != reverse else 'gt'
+            keyset_filter |= equal & Q(**{'{}__{}'.format(name, lookup): value})
+            equal &= Q(**{name: value})
+
+        # a plain range on the leading column lets the database use its index
+        leading_name, _, descending = self.keys[0]
+        bound = 'lte' if descending != reverse else 'gte'
+        return Q(**{'{}__{}'.format(leading_name, bound): position[0]}) & keyset_filter
+
+    def _get_position(self, instance):
+        position = []
+        for name, field, _ in self.keys:
+            if isinstance(instance, dict):
+                # rows of a `.values()` queryset
+                value = instance[name] if name in instance else instance[field.name]
+            else:
+                value = getattr(instance, name)
+            position.append(value.isoformat() if hasattr(value, 'isoformat') else str(value))
+        return position
+
+
+class ProductPagination(KeysetPagination):
+    count_mode = 'approximate'
+
+
+class ReviewPagination(KeysetPagination):
+    # newest first, served by the (product, date) index
+    ordering = '-date'
@@ -0,0 +1,47 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.db.models import DecimalField, F, FloatField, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, Greatest, Least, Round
+
+CENTS = Decimal('0.01')
+
+
+def get_tax_multiplier():
+    # settings.STORE_TAX_RATE is the rate itself, e.g. 0.1 for 10%
+    return 1 + Decimal(str(getattr(settings, 'STORE_TAX_RATE', '0.1')))
+
+
+def apply_tax(price):
+    # half-up, the same rounding ROUND() does on DECIMAL columns
+    return (price * get_tax_multiplier()).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def price_with_tax(field='unit_price'):
+    """
+    Database side counterpart of `apply_tax`, for use in `annotate()`.
+    """
+    return Round(
+        F(field) * Value(get_tax_multiplier(), output_field=DecimalField()),
+        2,
+        output_field=DecimalField(max_digits=9, decimal_places=2)
+    )
+
+
+def effective_price(field='unit_price'):
+    """
+    `unit_price` less the biggest discount among the product's promotions,
+    for use in `update()`. Promotions do not stack.
+    """
+    from .models import Promotion  # store.models imports this module
+
+    discount = Subquery(
+        Promotion.objects.filter(product=OuterRef('pk')).order_by()
+        .values('product').annotate(discount=Max('discount')).values('discount')
+    )
+    discount = Least(Greatest(Coalesce(discount, Value(0.0)), Value(0.0)), Value(1.0), output_field=FloatField())
+    return Round(
+        F(field) * (Value(Decimal(1)) - Cast(discount, DecimalField(max_digits=7, decimal_places=6))),
+        2,
+        output_field=DecimalField(max_digits=6, decimal_places=2)
+    )
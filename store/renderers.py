@@ -0,0 +1,29 @@
+from rest_framework.renderers import BaseRenderer
+
+from .export import csv_lines, ndjson_lines
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Newline delimited JSON. Exports stream their rows themselves, this
+    renders the occasional non-streamed payload such as an error.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rows = data if isinstance(data, list) else [data]
+        columns = list(rows[0]) if rows else []
+        return ''.join(ndjson_lines(rows, columns)).encode(self.charset)
+
+
+class CSVRenderer(BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rows = data if isinstance(data, list) else [data]
+        columns = list(rows[0]) if rows else []
+        return ''.join(csv_lines(rows, columns)).encode(self.charset)
@@ -0,0 +1,128 @@
+import re
+from collections import Counter
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils.module_loading import import_string
+
+from .models import Product, ProductSearchTerm
+
+TOKEN_RE = re.compile(r'\w+')
+MAX_TERM_LENGTH = ProductSearchTerm._meta.get_field('term').max_length
+
+
+def tokenize(text):
+    return [token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall((text or '').casefold())]
+
+
+class BaseSearchBackend:
+    """
+    Search over products.
+
+    `search()` narrows a product queryset down to the matches of the given
+    terms and annotates it with a `search_rank`, higher is more relevant.
+    `index()` and `unindex()` are called as products are saved and deleted.
+    """
+
+    def search(self, queryset, terms):
+        raise NotImplementedError('`search()` must be implemented.')
+
+    def index(self, products):
+        pass
+
+    def unindex(self, product_ids):
+        pass
+
+    def rebuild(self, chunk_size=2000):
+        pass
+
+
+class LikeSearchBackend(BaseSearchBackend):
+    """
+    The plain `icontains` search of DRF's SearchFilter, without an index.
+    """
+    search_fields = ['title', 'description']
+
+    def search(self, queryset, terms):
+        for term in terms:
+            queryset = queryset.filter(
+                reduce(or_, (Q(**{'{}__icontains'.format(field): term}) for field in self.search_fields))
+            )
+        return queryset.annotate(search_rank=Value(0))
+
+
+class InvertedIndexBackend(BaseSearchBackend):
+    """
+    Search through the `ProductSearchTerm` table.
+
+    Every token of a product's title and description is stored once per
+    product with a weight of its occurrences (title tokens count more).
+    Each query token is matched as a prefix of the indexed terms, a product
+    has to match all of them, and the rank sums the weights of the matched
+    terms with exact matches counting double.
+    """
+    field_weights = {'title': 3, 'description': 1}
+
+    def get_terms(self, product):
+        weights = Counter()
+        for field, weight in self.field_weights.items():
+            for token in tokenize(product[field] if isinstance(product, dict) else getattr(product, field)):
+                weights[token] += weight
+        return weights
+
+    def get_entries(self, products):
+        for product in products:
+            product_id = product['id'] if isinstance(product, dict) else product.pk
+            for term, weight in self.get_terms(product).items():
+                yield ProductSearchTerm(term=term, product_id=product_id, weight=weight)
+
+    def search(self, queryset, terms):
+        tokens = list(dict.fromkeys(tokenize(' '.join(terms))))
+        if not tokens:
+            return queryset.annotate(search_rank=Value(0)).none()
+
+        for token in tokens:
+            queryset = queryset.filter(
+                pk__in=ProductSearchTerm.objects.filter(term__startswith=token).values('product_id')
+            )
+
+        rank = (
+            ProductSearchTerm.objects
+            .filter(reduce(or_, (Q(term__startswith=token) for token in tokens)), product_id=OuterRef('pk'))
+            .values('product_id')
+            .annotate(rank=Sum(Case(
+                When(term__in=tokens, then=F('weight') * 2), default=F('weight'), output_field=IntegerField()
+            )))
+            .values('rank')
+        )
+        return queryset.annotate(search_rank=Coalesce(Subquery(rank), 0, output_field=IntegerField()))
+
+    @transaction.atomic
+    def index(self, products):
+        products = list(products)
+        self.unindex([product.pk for product in products])
+        ProductSearchTerm.objects.bulk_create(self.get_entries(products))
+
+    def unindex(self, product_ids):
+        ProductSearchTerm.objects.filter(product_id__in=product_ids).delete()
+
+    @transaction.atomic
+    def rebuild(self, chunk_size=2000):
+        ProductSearchTerm.objects.all().delete()
+        rows = Product.objects.order_by().values('id', *self.field_weights).iterator(chunk_size=chunk_size)
+        batch = []
+        for entry in self.get_entries(rows):
+            batch.append(entry)
+            if len(batch) >= chunk_size:
+                ProductSearchTerm.objects.bulk_create(batch)
+                batch = []
+        ProductSearchTerm.objects.bulk_create(batch)
+
+
+def get_search_backend():
+    backend = getattr(settings, 'STORE_SEARCH_BACKEND', 'store.search.InvertedIndexBackend')
+    return import_string(backend)()
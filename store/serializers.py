@@ -1,11 +1,17 @@
-from decimal import Decimal
-
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import Manager
+from django.utils import timezone
+from mosh_django.serializers import CompiledReadMixin
+from mosh_django.sparse import SparseFieldsMixin
 from rest_framework import serializers
 
-from store.models import Product, Collection, Review, Cart, CartItem
+from store.models import Product, Collection, Review, Cart, CartItem, Order, OrderItem
+from store.pricing import apply_tax
+from tags.models import Tag, TaggedItem
 
 
-class CollectionSerializer(serializers.ModelSerializer):
+class CollectionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     products_count = serializers.IntegerField(read_only=True)
 
     class Meta:
@@ -29,18 +35,248 @@ class CollectionSerializer(serializers.ModelSerializer):
     #     return collection.product_set.count()
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductListSerializer(serializers.ListSerializer):
+    """
+    Read-only fast path for product lists.
+
+    When it is handed the dicts of a `.values()` queryset annotated with
+    `price_with_tax` (see `ProductViewSet.get_queryset`), rows are copied
+    straight into the response without building `Product` instances or
+    running each field's `to_representation`, and the tag labels of the
+    whole page are fetched in one query (or taken from `context['tag_labels']`
+    when the caller fetched them already) unless `?fields=` / `?exclude=`
+    leave the tags out. Anything else goes through the regular per-instance
+    serialization.
+    """
+
+    def to_representation(self, data):
+        rows = list(data.all() if isinstance(data, Manager) else data)
+        if not rows or not isinstance(rows[0], dict):
+            return super().to_representation(rows)
+        # the fields left after `?fields=` / `?exclude=`, see SparseFieldsMixin
+        fields = list(self.child.fields)
+        if 'tags' in fields:
+            labels = self.context.get('tag_labels')
+            if labels is None:
+                labels = TaggedItem.objects.get_labels_for(Product, [row['id'] for row in rows])
+            for row in rows:
+                row['tags'] = labels.get(row['id'], [])
+        return [{name: row[name] for name in fields} for row in rows]
+
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Resolves pks from `context['prefetched'][model]`, an `in_bulk()` dict,
+    when the caller loaded the related rows up front, instead of one
+    `queryset.get()` per value.
+    """
+
+    def to_internal_value(self, data):
+        prefetched = self.context.get('prefetched', {}).get(self.get_queryset().model)
+        if prefetched is None:
+            return super().to_internal_value(data)
+        try:
+            return prefetched[self.get_queryset().model._meta.pk.to_python(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, DjangoValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class ProductSerializer(SparseFieldsMixin, CompiledReadMixin, serializers.ModelSerializer):
     price_with_tax = serializers.SerializerMethodField(method_name='calculate_tax')
-    collection = serializers.PrimaryKeyRelatedField(queryset=Collection.objects.all())
+    collection = PrefetchedPrimaryKeyRelatedField(queryset=Collection.objects.all())
+
+    tags = serializers.SerializerMethodField()
+
+    def get_tags(self, product: Product):
+        # prefetched in label order by ProductViewSet, read without building a related manager
+        prefetched = getattr(product, '_prefetched_objects_cache', {})
+        if 'tags' in prefetched:
+            return [item.tag.label for item in prefetched['tags']]
+        # or fetched for all the products at once by the caller
+        labels = self.context.get('tag_labels')
+        if labels is not None:
+            return labels.get(product.pk, [])
+        return TaggedItem.objects.get_labels_for(Product, [product.pk]).get(product.pk, [])
 
     @staticmethod
     def calculate_tax(product: Product):
-        return round(product.unit_price * Decimal(1.1), 2)
+        # computed by the database when the queryset was annotated with it
+        if hasattr(product, 'price_with_tax'):
+            return product.price_with_tax
+        return apply_tax(product.unit_price)
+
+    def validate_slug(self, slug):
+        # ProductBatchSerializer checks the slugs of a whole batch at once
+        if not self.context.get('batch'):
+            taken = Product.objects.filter(slug=slug)
+            if self.instance is not None:
+                taken = taken.exclude(pk=self.instance.pk)
+            if taken.exists():
+                raise serializers.ValidationError('A product with this slug already exists.')
+        return slug
 
     class Meta:
         model = Product
         # Be aware, Mosh said never use __all__ which is for lazy developers
-        fields = ['id', 'title', 'description', 'slug', 'inventory', 'unit_price', 'price_with_tax', 'collection']
+        fields = ['id', 'title', 'description', 'slug', 'inventory', 'unit_price', 'effective_price', 'price_with_tax',
+                  'collection', 'reviews_count', 'last_review_at', 'tags']
+        # validate_slug() instead of a UniqueValidator, one query per product in batches
+        extra_kwargs = {'slug': {'validators': []}}
+        list_serializer_class = ProductListSerializer
+
+
+class ProductOperationSerializer(serializers.Serializer):
+    CREATE, UPDATE, DELETE = 'create', 'update', 'delete'
+
+    op = serializers.ChoiceField(choices=[CREATE, UPDATE, DELETE])
+    id = serializers.IntegerField(required=False)
+    data = serializers.DictField(required=False)
+
+    def validate(self, attrs):
+        if attrs['op'] != self.CREATE and 'id' not in attrs:
+            raise serializers.ValidationError({'id': 'This field is required.'})
+        if attrs['op'] != self.DELETE and 'data' not in attrs:
+            raise serializers.ValidationError({'data': 'This field is required.'})
+        return attrs
+
+
+class ProductBatchSerializer(serializers.Serializer):
+    """
+    A list of product creates, updates and deletes applied all or nothing.
+
+    Creates and updates are validated by ProductSerializer in many mode,
+    with every referenced product and collection loaded in one query each,
+    and written with `bulk_create` / `bulk_update` in one transaction.
+    Errors come back per operation, in the order they were sent.
+    """
+    operations = ProductOperationSerializer(many=True, min_length=1, max_length=1000)
+
+    def validate_operations(self, operations):
+        ops = ProductOperationSerializer
+        errors = [{} for _ in operations]
+
+        ids = [operation['id'] for operation in operations if 'id' in operation]
+        products = Product.objects.in_bulk(ids)
+        seen = set()
+        for index, operation in enumerate(operations):
+            if 'id' not in operation:
+                continue
+            if operation['id'] not in products:
+                errors[index]['id'] = ['Not found.']
+            elif operation['id'] in seen:
+                errors[index]['id'] = ['Only one operation per product is allowed.']
+            seen.add(operation['id'])
+
+        deleted = [operation['id'] for operation in operations if operation['op'] == ops.DELETE]
+        ordered = set(OrderItem.objects.filter(product_id__in=deleted).values_list('product_id', flat=True))
+        for index, operation in enumerate(operations):
+            if operation['op'] == ops.DELETE and operation['id'] in ordered:
+                errors[index]['id'] = ['Product can not be deleted because it is associated with an order item']
+
+        collection_ids = set()
+        for operation in operations:
+            try:
+                collection_ids.add(int(operation.get('data', {}).get('collection')))
+            except (TypeError, ValueError):
+                pass
+        prefetched = {Collection: Collection.objects.in_bulk(collection_ids)}
+        context = {**self.context, 'batch': True, 'prefetched': prefetched}
+
+        for op, partial in ((ops.CREATE, False), (ops.UPDATE, True)):
+            indexes = [index for index, operation in enumerate(operations) if operation['op'] == op]
+            serializer = ProductSerializer(
+                data=[operations[index]['data'] for index in indexes], many=True, partial=partial, context=context
+            )
+            if not serializer.is_valid():
+                for index, item_errors in zip(indexes, serializer.errors):
+                    if item_errors:
+                        errors[index]['data'] = item_errors
+                continue
+            for index, validated_data in zip(indexes, serializer.validated_data):
+                operations[index]['validated_data'] = validated_data
+                operations[index]['instance'] = products.get(operations[index].get('id'))
+
+        self.validate_slugs(operations, errors)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return operations
+
+    @staticmethod
+    def validate_slugs(operations, errors):
+        # {slug: (index, id)} of the creates and updates setting one
+        owners = {}
+        for index, operation in enumerate(operations):
+            slug = operation.get('validated_data', {}).get('slug')
+            if slug is None:
+                continue
+            if slug in owners:
+                errors[index].setdefault('data', {})['slug'] = ['Only one product per slug is allowed.']
+            owners[slug] = index, operation.get('id')
+        for slug, pk in Product.objects.filter(slug__in=owners).values_list('slug', 'pk'):
+            index, owner = owners[slug]
+            if owner != pk:
+                errors[index].setdefault('data', {})['slug'] = ['A product with this slug already exists.']
+
+    def create(self, validated_data):
+        ops = ProductOperationSerializer
+        operations = validated_data['operations']
+        with transaction.atomic():
+            created = [
+                Product(**operation['validated_data'])
+                for operation in operations if operation['op'] == ops.CREATE
+            ]
+            Product.objects.bulk_create(created)
+
+            updated = []
+            fields = set()
+            for operation in operations:
+                if operation['op'] == ops.UPDATE:
+                    product = operation['instance']
+                    for attr, value in operation['validated_data'].items():
+                        setattr(product, attr, value)
+                    fields.update(operation['validated_data'])
+                    updated.append(product)
+            if updated and fields:
+                # bulk_update() leaves auto_now alone
+                now = timezone.now()
+                for product in updated:
+                    product.last_update = now
+                Product.objects.bulk_update(updated, fields | {'last_update'})
+                if 'unit_price' in fields:
+                    # recomputed by the database, read back for the response
+                    prices = dict(
+                        Product.objects.filter(pk__in=[product.pk for product in updated])
+                        .values_list('pk', 'effective_price')
+                    )
+                    for product in updated:
+                        product.effective_price = prices[product.pk]
+
+            deleted = [operation['id'] for operation in operations if operation['op'] == ops.DELETE]
+            if deleted:
+                Product.objects.filter(pk__in=deleted).delete()
+
+        created = iter(created)
+        for operation in operations:
+            if operation['op'] == ops.CREATE:
+                operation['instance'] = next(created)
+        return validated_data
+
+    def to_representation(self, instance):
+        ops = ProductOperationSerializer
+        operations = instance['operations']
+        products = [operation['instance'] for operation in operations if operation['op'] != ops.DELETE]
+        # the tags of every product in one query
+        labels = TaggedItem.objects.get_labels_for(Product, [product.pk for product in products])
+        data = iter(ProductSerializer(products, many=True, context={**self.context, 'tag_labels': labels}).data)
+        results = []
+        for operation in operations:
+            if operation['op'] == ops.DELETE:
+                results.append({'op': operation['op'], 'id': operation['id']})
+            else:
+                results.append({'op': operation['op'], **next(data)})
+        return {'operations': results}
 
 
 class SimpleProductSerializer(serializers.ModelSerializer):
@@ -49,12 +285,14 @@ class SimpleProductSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'unit_price']
 
 
-class CartItemSerializer(serializers.ModelSerializer):
+class CartItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     product = SimpleProductSerializer()
     total_price = serializers.SerializerMethodField()
 
     @staticmethod
     def get_total_price(cart_item: CartItem):
+        if hasattr(cart_item, 'total_price'):
+            return cart_item.total_price
         return cart_item.quantity * cart_item.product.unit_price
 
     class Meta:
@@ -62,14 +300,17 @@ class CartItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'product', 'quantity', 'total_price']
 
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(SparseFieldsMixin, CompiledReadMixin, serializers.ModelSerializer):
     id = serializers.UUIDField(read_only=True)
-    items = CartItemSerializer(many=True)
+    items = CartItemSerializer(many=True, read_only=True)
     total_price = serializers.SerializerMethodField()
 
     @staticmethod
     def get_total_price(cart: Cart):
-        return sum([item.quantity * item.product.unit_price for item in cart.items.all()])
+        # summed by the database when CartViewSet annotated it, NULL for an empty cart
+        if hasattr(cart, 'total_price'):
+            return cart.total_price if cart.total_price is not None else 0
+        return sum(CartItemSerializer.get_total_price(item) for item in cart.items.all())
 
     class Meta:
         model = Cart
@@ -105,9 +346,98 @@ class CartSerializer(serializers.ModelSerializer):
     #     return instance
 
 
-class ReviewSerializer(serializers.ModelSerializer):
-    # 'product.id' was my own creativity :D
-    product = serializers.IntegerField(read_only=True, source='product.id')
+class AddCartItemSerializer(serializers.ModelSerializer):
+    product_id = serializers.IntegerField()
+
+    @staticmethod
+    def validate_product_id(value):
+        if not Product.objects.filter(pk=value).exists():
+            raise serializers.ValidationError('No product with the given ID was found.')
+        return value
+
+    def save(self, **kwargs):
+        try:
+            self.instance = CartItem.objects.add(self.context['cart_id'], **self.validated_data)
+        except DjangoValidationError as error:
+            raise serializers.ValidationError(error.message_dict)
+        return self.instance
+
+    class Meta:
+        model = CartItem
+        fields = ['id', 'product_id', 'quantity']
+        extra_kwargs = {'quantity': {'min_value': 1, 'max_value': CartItem.MAX_QUANTITY}}
+
+
+class UpdateCartItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CartItem
+        fields = ['quantity']
+        extra_kwargs = {'quantity': {'min_value': 1, 'max_value': CartItem.MAX_QUANTITY}}
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    product = SimpleProductSerializer()
+
+    class Meta:
+        model = OrderItem
+        fields = ['id', 'product', 'quantity', 'unit_price']
+
+
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    items = OrderItemSerializer(many=True, source='orderitem_set')
+
+    class Meta:
+        model = Order
+        fields = ['id', 'customer', 'placed_at', 'payment_status', 'items']
+
+
+class CreateOrderSerializer(serializers.Serializer):
+    """
+    Checks the cart out for `context['customer_id']`, the customer of the user placing the order.
+    """
+    cart_id = serializers.UUIDField()
+
+    @staticmethod
+    def validate_cart_id(value):
+        if not Cart.objects.filter(pk=value).exists():
+            raise serializers.ValidationError('No cart with the given ID was found.')
+        return value
+
+    def save(self, **kwargs):
+        # stock is only known once the products are locked, see OrderQuerySet.place
+        try:
+            self.instance = Order.objects.place(customer_id=self.context['customer_id'], **self.validated_data)
+        except DjangoValidationError as error:
+            raise serializers.ValidationError(error.message_dict)
+        return self.instance
+
+
+class TagSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    products_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Tag
+        fields = ['id', 'label', 'products_count']
+
+
+class SalesQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of the sales endpoints, both days inclusive.
+    """
+    since = serializers.DateField(required=False)
+    until = serializers.DateField(required=False)
+    collection_id = serializers.IntegerField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+    def validate(self, data):
+        if 'since' in data and 'until' in data and data['since'] > data['until']:
+            raise serializers.ValidationError({'until': 'Must not be before since.'})
+        return data
+
+
+class ReviewSerializer(SparseFieldsMixin, CompiledReadMixin, serializers.ModelSerializer):
+    # the column itself, no need to load the product
+    product = serializers.IntegerField(read_only=True, source='product_id')
 
     class Meta:
         model = Review
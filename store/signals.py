@@ -0,0 +1,152 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from tags.models import Tag, TaggedItem
+
+from . import cache
+from .models import Product, Collection, Promotion, Review
+from .search import get_search_backend
+
+
+@receiver(pre_save, sender=Product)
+def remember_previous_state(sender, instance: Product, **kwargs):
+    # a product moved to another collection changes both collections' products_count,
+    # a new unit_price its effective_price
+    instance._previous_collection_id = instance._previous_unit_price = None
+    if instance.pk is not None:
+        instance._previous_collection_id, instance._previous_unit_price = (
+            Product.objects.filter(pk=instance.pk).values_list('collection_id', 'unit_price').first()
+            or (None, None)
+        )
+    if instance.effective_price is None:
+        # new products have no promotions yet
+        instance.effective_price = instance.unit_price
+
+
+@receiver(post_save, sender=Product)
+def invalidate_product_on_save(sender, instance: Product, **kwargs):
+    cache.invalidate(cache.PRODUCTS, instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+def invalidate_product_on_delete(sender, instance: Product, **kwargs):
+    cache.invalidate(cache.PRODUCTS, instance.pk)
+
+
+# adjust_products_count also invalidates the cached collections it touches
+@receiver(post_save, sender=Product)
+def count_product_on_save(sender, instance: Product, created, **kwargs):
+    previous_collection_id = getattr(instance, '_previous_collection_id', None)
+    if created:
+        Collection.objects.adjust_products_count({instance.collection_id: 1})
+    elif previous_collection_id is not None and previous_collection_id != instance.collection_id:
+        Collection.objects.adjust_products_count({previous_collection_id: -1, instance.collection_id: 1})
+
+
+@receiver(post_delete, sender=Product)
+def count_product_on_delete(sender, instance: Product, **kwargs):
+    Collection.objects.adjust_products_count({instance.collection_id: -1})
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance: Product, update_fields=None, **kwargs):
+    if update_fields is None or {'title', 'description'} & set(update_fields):
+        get_search_backend().index([instance])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance: Product, **kwargs):
+    get_search_backend().unindex([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+def reprice_product_on_save(sender, instance: Product, created, **kwargs):
+    previous_unit_price = getattr(instance, '_previous_unit_price', None)
+    if not created and previous_unit_price is not None and previous_unit_price != instance.unit_price:
+        Product.objects.filter(pk=instance.pk).refresh_effective_price()
+        # the instance is what the API serializes back
+        instance.refresh_from_db(fields=['effective_price'])
+
+
+@receiver(post_save, sender=Promotion)
+def reprice_promotion_on_save(sender, instance: Promotion, created, **kwargs):
+    if not created:
+        Product.objects.filter(promotions=instance).refresh_effective_price()
+
+
+@receiver(pre_delete, sender=Promotion)
+def remember_promoted_products(sender, instance: Promotion, **kwargs):
+    # the products are only known before the promotion takes its links along
+    instance._product_ids = list(instance.product_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Promotion)
+def reprice_promotion_on_delete(sender, instance: Promotion, **kwargs):
+    Product.objects.filter(pk__in=getattr(instance, '_product_ids', [])).refresh_effective_price()
+
+
+@receiver(post_save, sender=Review)
+def count_review_on_save(sender, instance: Review, created, **kwargs):
+    if created:
+        Product.objects.add_review(instance)
+
+
+@receiver(post_delete, sender=Review)
+def count_review_on_delete(sender, instance: Review, origin=None, **kwargs):
+    # nothing to keep up to date when the reviews go with their product
+    if isinstance(origin, Product) or getattr(origin, 'model', None) is Product:
+        return
+    Product.objects.remove_review(instance)
+
+
+@receiver(post_save, sender=Collection)
+@receiver(post_delete, sender=Collection)
+def invalidate_collection(sender, instance: Collection, **kwargs):
+    cache.invalidate(cache.COLLECTIONS, instance.pk)
+
+
+# tag labels are part of the product payload
+@receiver(post_save, sender=TaggedItem)
+@receiver(post_delete, sender=TaggedItem)
+def invalidate_tagged_item(sender, instance: TaggedItem, **kwargs):
+    cache.invalidate(cache.TAGS)
+    if instance.content_type_id == ContentType.objects.get_for_model(Product).pk:
+        cache.invalidate(cache.PRODUCTS, instance.object_id)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag(sender, instance: Tag, **kwargs):
+    cache.invalidate(cache.TAGS)
+    cache.invalidate_all(cache.PRODUCTS)
+
+
+@receiver(m2m_changed, sender=Product.promotions.through)
+def invalidate_product_promotions(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # the products losing this promotion are only known before the clear
+        instance._cleared_product_ids = list(instance.product_set.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        cache.invalidate(cache.PRODUCTS, instance.pk)
+    elif action == 'post_clear':
+        cache.invalidate(cache.PRODUCTS, *getattr(instance, '_cleared_product_ids', []))
+    else:
+        cache.invalidate(cache.PRODUCTS, *pk_set)
+
+
+@receiver(m2m_changed, sender=Product.promotions.through)
+def reprice_product_promotions(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        products = Product.objects.filter(pk=instance.pk)
+    elif action == 'post_clear':
+        # stashed by invalidate_product_promotions on pre_clear
+        products = Product.objects.filter(pk__in=getattr(instance, '_cleared_product_ids', []))
+    else:
+        products = Product.objects.filter(pk__in=pk_set)
+    products.refresh_effective_price()
@@ -1,3 +1,1725 @@
-from django.test import TestCase
+import csv
+import json
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from importlib.util import find_spec
+from io import BytesIO, StringIO
+from tempfile import NamedTemporaryFile
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlsplit
+from uuid import uuid4
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import F, QuerySet, Sum
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from mosh_django.middleware import get_route_stats, reset_route_stats
+from mosh_django.routers import replica_reads
+from mosh_django.serializers import CompiledReadMixin, get_plan
+from mosh_django.testing import QueryBudgetMixin
+from likes.models import LikeCount, LikedItem
+from tags.models import Tag, TaggedItem
+
+from . import cache
+from .analytics import refresh_sales_rollups
+from .export import EXPORTS, iter_rows
+from .imports import ProductImport, read_rows
+from .models import Cart, CartItem, Collection, CollectionDailySales, Customer, Order, OrderItem, Product, \
+    ProductDailySales, ProductQuerySet, ProductSearchTerm, Promotion, Reservation, Review
+from .pagination import EstimatedCountPaginator, KeysetPagination, ProductPagination
+from .pricing import price_with_tax
+from .serializers import CartSerializer, ProductSerializer, ReviewSerializer
+from .views import CartItemViewSet, CartViewSet, CollectionViewSet, OrderViewSet, ProductViewSet, ReviewViewSet, \
+    SalesViewSet, TagViewSet
+
+
+class CheckoutTests(TransactionTestCase):
+    def setUp(self):
+        collection = Collection.objects.create(title='Checkout')
+        self.products = [
+            Product.objects.create(
+                title='Product {}'.format(index), slug='product-{}'.format(index), inventory=10,
+                unit_price=Decimal('2.50'), collection=collection
+            )
+            for index in range(2)
+        ]
+        self.customer = Customer.objects.create(first_name='A', last_name='B', email='a@b.com', phone='1')
+
+    def make_cart(self, quantities):
+        cart = Cart.objects.create()
+        for product, quantity in quantities:
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+        return cart
+
+    def test_places_order_and_deletes_cart(self):
+        cart = self.make_cart([(self.products[0], 3), (self.products[1], 1)])
+
+        order = Order.objects.place(cart.pk, self.customer.pk)
+
+        self.assertFalse(Cart.objects.filter(pk=cart.pk).exists())
+        self.assertEqual(
+            sorted(order.orderitem_set.values_list('product_id', 'quantity', 'unit_price')),
+            [(self.products[0].pk, 3, Decimal('2.50')), (self.products[1].pk, 1, Decimal('2.50'))]
+        )
+        self.assertEqual(list(Product.objects.order_by('pk').values_list('inventory', flat=True)), [7, 9])
+
+    def test_checkout_as_the_customer_of_the_user(self):
+        cart = self.make_cart([(self.products[0], 1)])
+        other = Customer.objects.create(first_name='C', last_name='D', email='c@d.com', phone='2')
+        data = {'cart_id': str(cart.pk), 'customer_id': other.pk}
+        self.assertEqual(self.client.post('/store/orders/', data).status_code, 403)
+
+        user = get_user_model().objects.create_user('buyer', 'a@b.com', 'secret')
+        self.client.force_login(user)
+        self.assertEqual(self.client.post('/store/orders/', data).status_code, 400)
+
+        self.customer.user = user
+        self.customer.save()
+        response = self.client.post('/store/orders/', data)
+        self.assertEqual(response.status_code, 201)
+        # customer_id in the body is ignored
+        self.assertEqual(response.json()['customer'], self.customer.pk)
+
+    def test_rejects_short_inventory_without_writing(self):
+        cart = self.make_cart([(self.products[0], 11)])
+
+        with self.assertRaises(ValidationError) as raised:
+            Order.objects.place(cart.pk, self.customer.pk)
+
+        self.assertEqual(raised.exception.message_dict, {'items': ['Only 10 of "Product 0" left in stock.']})
+
+        self.assertTrue(Cart.objects.filter(pk=cart.pk).exists())
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).inventory, 10)
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        small = self.make_cart([(self.products[0], 1)])
+        large = self.make_cart([(self.products[0], 1), (self.products[1], 1)])
+
+        with CaptureQueriesContext(connection) as small_queries:
+            Order.objects.place(small.pk, self.customer.pk)
+        with CaptureQueriesContext(connection) as large_queries:
+            Order.objects.place(large.pk, self.customer.pk)
+
+        self.assertEqual(len(small_queries), len(large_queries))
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_concurrent_checkouts_do_not_oversell(self):
+        workers = 25
+        # half of the carts list the products the other way round, locking
+        # in cart order would deadlock
+        carts = [
+            self.make_cart([(self.products[0], 1), (self.products[1], 1)][::1 if index % 2 else -1])
+            for index in range(workers)
+        ]
+        barrier = threading.Barrier(workers)
+        placed, rejected, failed = [], [], []
+
+        def checkout(cart):
+            try:
+                barrier.wait()
+                placed.append(Order.objects.place(cart.pk, self.customer.pk))
+            except ValidationError:
+                rejected.append(cart)
+            except Exception as error:
+                failed.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(cart,)) for cart in carts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(failed, [])
+        self.assertEqual(len(placed), 10)
+        self.assertEqual(len(rejected), workers - 10)
+        for product in self.products:
+            product.refresh_from_db()
+            self.assertEqual(product.inventory, 0)
+            sold = OrderItem.objects.filter(product=product).aggregate(sold=Sum('quantity'))['sold']
+            self.assertEqual(sold, 10)
+
+
+class ReservationTests(TestCase):
+    def setUp(self):
+        collection = Collection.objects.create(title='Reservations')
+        self.product = Product.objects.create(
+            title='Product', slug='product', inventory=5, unit_price=Decimal('1.00'), collection=collection
+        )
+
+    def test_reserve_takes_stock_until_sold_out(self):
+        Reservation.objects.reserve(self.product.pk, 3)
+        Reservation.objects.reserve(self.product.pk, 2)
+
+        with self.assertRaises(ValidationError):
+            Reservation.objects.reserve(self.product.pk, 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.inventory, 0)
+
+    def test_expired_reservations_are_released_when_stock_runs_out(self):
+        expired = Reservation.objects.reserve(self.product.pk, 5, ttl=60)
+        Reservation.objects.filter(pk=expired.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        Reservation.objects.reserve(self.product.pk, 4)
+
+        self.assertFalse(Reservation.objects.filter(pk=expired.pk).exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.inventory, 1)
+
+    def test_confirm_keeps_stock_taken(self):
+        reservation = Reservation.objects.reserve(self.product.pk, 2)
+
+        self.assertEqual(Reservation.objects.filter(pk=reservation.pk).confirm(), 1)
+        self.assertEqual(Reservation.objects.filter(pk=reservation.pk).release(), 0)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.inventory, 3)
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.collection = Collection.objects.create(title='Sales')
+        self.product = Product.objects.create(
+            title='Product', slug='product', inventory=100, unit_price=Decimal('2.00'), collection=self.collection
+        )
+        self.customer = Customer.objects.create(first_name='A', last_name='B', email='a@b.com', phone='1')
+
+    def sell(self, quantity, status=Order.COMPLETE):
+        order = Order.objects.create(customer=self.customer, payment_status=status)
+        OrderItem.objects.create(order=order, product=self.product, quantity=quantity, unit_price=Decimal('2.50'))
+        return order
+
+    def test_refresh_is_incremental_and_idempotent(self):
+        self.sell(2)
+        pending = self.sell(5, status=Order.PENDING)
+        self.assertIsNone(refresh_sales_rollups())
+
+        pending.payment_status = Order.COMPLETE
+        pending.save(update_fields=['payment_status'])
+        self.sell(1)
+        self.assertEqual(refresh_sales_rollups(), timezone.localdate())
+        refresh_sales_rollups()
+
+        self.assertEqual(
+            list(ProductDailySales.objects.values_list('product_id', 'day', 'quantity', 'revenue')),
+            [(self.product.pk, timezone.localdate(), 8, Decimal('20.00'))]
+        )
+        self.assertEqual(
+            list(CollectionDailySales.objects.values_list('collection_id', 'quantity', 'revenue')),
+            [(self.collection.pk, 8, Decimal('20.00'))]
+        )
+
+    def test_collection_sales_stay_with_the_collection_sold_under(self):
+        cart = Cart.objects.create()
+        CartItem.objects.create(cart=cart, product=self.product, quantity=3)
+        order = Order.objects.place(cart.pk, self.customer.pk)
+        Order.objects.filter(pk=order.pk).update(payment_status=Order.COMPLETE, completed_at=timezone.now())
+        refresh_sales_rollups()
+
+        self.product.collection = Collection.objects.create(title='Other')
+        self.product.save()
+        refresh_sales_rollups(full=True)
+        self.assertEqual(
+            list(CollectionDailySales.objects.values_list('collection_id', 'quantity')), [(self.collection.pk, 3)]
+        )
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@b.com', 'admin'))
+
+    def make_products(self, count):
+        collection = Collection.objects.create(title='Admin')
+        start = Product.objects.count()
+        for index in range(start, start + count):
+            Product.objects.create(
+                title='Product {}'.format(index), slug='product-{}'.format(index), inventory=1,
+                unit_price=Decimal('1.00'), collection=collection
+            )
+
+    def count_queries(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertQueriesDoNotGrowWithRows(self, url, **params):
+        self.make_products(2)
+        few = self.count_queries(url, **params)
+        self.make_products(20)
+        self.assertEqual(self.count_queries(url, **params), few)
+
+    def test_product_changelist(self):
+        self.assertQueriesDoNotGrowWithRows(reverse('admin:store_product_changelist'))
+
+    def test_product_search(self):
+        self.assertQueriesDoNotGrowWithRows(reverse('admin:store_product_changelist'), q='Product')
+
+    def test_collection_changelist(self):
+        self.assertQueriesDoNotGrowWithRows(reverse('admin:store_collection_changelist'))
+
+    def test_featured_product_autocomplete(self):
+        self.make_products(3)
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'store', 'model_name': 'collection', 'field_name': 'featured_product', 'term': '"product 1"'
+        })
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_paginator_uses_estimate_for_large_unfiltered_tables(self):
+        with mock.patch('store.pagination.table_row_estimate', return_value=50000):
+            self.assertEqual(EstimatedCountPaginator(Product.objects.all(), 100).count, 50000)
+            self.assertEqual(EstimatedCountPaginator(Product.objects.filter(inventory=1), 100).count, 0)
+        with mock.patch('store.pagination.table_row_estimate', return_value=None):
+            self.assertEqual(EstimatedCountPaginator(Product.objects.all(), 100).count, 0)
+
+
+class AsyncReadTests(TestCase):
+    def setUp(self):
+        self.collection = Collection.objects.create(title='Async')
+        self.products = [
+            Product.objects.create(
+                title='Product {:02}'.format(index), slug='product-{}'.format(index), inventory=index,
+                unit_price=Decimal(index + 1), collection=self.collection
+            )
+            for index in range(12)
+        ]
+        tag = Tag.objects.create(label='sale')
+        for product in self.products[3], self.products[11]:
+            TaggedItem.objects.create(tag=tag, content_object=product)
+        self.cart = Cart.objects.create()
+        CartItem.objects.create(cart=self.cart, product=self.products[0], quantity=2)
+
+    def assertSamePayload(self, sync_url, async_url, **params):
+        sync_response = self.client.get(sync_url, params, HTTP_ACCEPT='application/json')
+        async_response = self.client.get(async_url, params)
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        # page links point back at the endpoint they came from
+        async_payload = json.loads(async_response.content.decode().replace('/store/async/', '/store/'))
+        self.assertEqual(self.decode_links(async_payload), self.decode_links(sync_response.json()))
+        return async_payload
+
+    @staticmethod
+    def decode_links(payload):
+        # page links compared by the cursor they hold rather than by its encoding
+        if not isinstance(payload, dict):
+            return payload
+        payload = dict(payload)
+        for name in ('next', 'previous'):
+            if payload.get(name):
+                url = urlsplit(payload[name])
+                params = parse_qs(url.query)
+                if 'cursor' in params:
+                    params['cursor'] = [KeysetPagination().get_signer().unsign_object(params['cursor'][0])]
+                payload[name] = url.path, params
+        return payload
+
+    def test_product_list(self):
+        page = self.assertSamePayload('/store/products/', reverse('async-products-list'), ordering='-unit_price')
+        self.assertEqual(len(page['results']), 10)
+        self.assertEqual(page['results'][0]['tags'], ['sale'])
+        cursor = parse_qs(urlsplit(page['next']).query)['cursor'][0]
+        page = self.assertSamePayload(
+            '/store/products/', reverse('async-products-list'), ordering='-unit_price', cursor=cursor
+        )
+        self.assertEqual(len(page['results']), 2)
+        self.assertSamePayload('/store/products/', reverse('async-products-list'), unit_price__gte=5)
+        page = self.assertSamePayload(
+            '/store/products/', reverse('async-products-list'), collection_id=self.collection.pk
+        )
+        self.assertEqual(len(page['results']), 10)
+        self.assertSamePayload('/store/products/', reverse('async-products-list'), collection_id=0)
+        self.assertSamePayload('/store/products/', reverse('async-products-list'), cursor='invalid')
+
+    def test_product_detail(self):
+        product = self.products[3]
+        self.assertSamePayload(
+            '/store/products/{}/'.format(product.pk), reverse('async-products-detail', args=[product.pk])
+        )
+        self.assertSamePayload('/store/products/0/', reverse('async-products-detail', args=[0]))
+
+    def test_collection_list(self):
+        self.assertSamePayload('/store/collections/', reverse('async-collection-list'))
+        self.assertSamePayload('/store/collections/', reverse('async-collection-list'), page=2)
+
+    def test_cart_detail(self):
+        self.assertSamePayload(
+            '/store/carts/{}/'.format(self.cart.pk), reverse('async-carts-detail', args=[self.cart.pk])
+        )
+
+
+HAS_REPLICA = 'replica' in getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+@skipUnless(HAS_REPLICA, 'needs a "replica" database alias')
+@override_settings(DATABASE_QUERY_COUNTS_HEADER=True)
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Run with a settings module whose DATABASES has a second database,
+    e.g. another SQLite file, as 'replica' in DATABASE_REPLICAS: rows
+    written to each one tell which database served a request.
+    """
+    databases = {'default', 'replica'} if HAS_REPLICA else {'default'}
+
+    def setUp(self):
+        cache.get_cache().clear()
+        for alias, title in (('default', 'On primary'), ('replica', 'On replica')):
+            collection = Collection.objects.using(alias).create(title=title)
+            product = Product.objects.using(alias).create(
+                title=title, slug='routed', inventory=1, unit_price=Decimal(1), collection=collection
+            )
+            Review.objects.using(alias).create(product=product, name=title, description='Routed')
+        self.reviews_url = '/store/products/{}/reviews/'.format(product.pk)
+
+    def get_reviews(self):
+        response = self.client.get(self.reviews_url, HTTP_ACCEPT='application/json')
+        return [review['name'] for review in response.json()['results']], response['X-DB-Queries']
+
+    def test_safe_requests_read_from_replica(self):
+        names, queries = self.get_reviews()
+
+        self.assertEqual(names, ['On replica'])
+        self.assertEqual(queries, 'replica=1')
+
+    def test_cached_and_conditional_responses_read_from_primary(self):
+        # cached under the current versions, a lagging replica would stick around until the timeout
+        response = self.client.get('/store/collections/', HTTP_ACCEPT='application/json')
+        self.assertEqual([collection['title'] for collection in response.json()['results']], ['On primary'])
+        self.assertEqual(response['X-DB-Queries'], 'default=2')
+        self.assertIn('ETag', response)
+
+    def test_reads_stick_to_primary_after_a_write(self):
+        response = self.client.post('/store/carts/')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('default=', response['X-DB-Queries'])
+
+        self.assertEqual(self.get_reviews(), (['On primary'], 'default=1'))
+
+        self.client.cookies.clear()
+        self.assertEqual(self.get_reviews()[0], ['On replica'])
+
+    def test_transactions_read_from_primary(self):
+        with replica_reads():
+            self.assertEqual(Collection.objects.get().title, 'On replica')
+            with transaction.atomic():
+                self.assertEqual(Collection.objects.get().title, 'On primary')
+        self.assertEqual(Collection.objects.get().title, 'On primary')
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """
+    Every list holds more rows than its budget has queries, so a query per
+    row can not fit.
+    """
+
+    def setUp(self):
+        cache.get_cache().clear()
+        ContentType.objects.get_for_model(Product)
+        self.collection = Collection.objects.create(title='Budget')
+        tag = Tag.objects.create(label='budget')
+        self.products = []
+        for index in range(8):
+            product = Product.objects.create(
+                title='Product {}'.format(index), slug='product-{}'.format(index), inventory=5,
+                unit_price=Decimal(index + 1), collection=self.collection
+            )
+            TaggedItem.objects.create(tag=tag, content_object=product)
+            Review.objects.create(product=product, name='Name', description='Review')
+            self.products.append(product)
+        self.product = self.products[0]
+        for _ in range(6):
+            Review.objects.create(product=self.product, name='Name', description='Review')
+        self.cart = Cart.objects.create()
+        for product in self.products[:6]:
+            CartItem.objects.create(cart=self.cart, product=product, quantity=1)
+        customer = Customer.objects.create(first_name='A', last_name='B', email='a@b.com', phone='1')
+        for _ in range(6):
+            order = Order.objects.create(customer=customer, payment_status=Order.COMPLETE)
+            for product in self.products[:6]:
+                OrderItem.objects.create(order=order, product=product, quantity=1, unit_price=product.unit_price)
+        self.order = order
+        refresh_sales_rollups()
+
+    def test_catalog(self):
+        product_url = '/store/products/{}/'.format(self.product.pk)
+        self.assertWithinQueryBudget(ProductViewSet, 'list', '/store/products/')
+        self.assertWithinQueryBudget(ProductViewSet, 'retrieve', product_url)
+        self.assertWithinQueryBudget(ReviewViewSet, 'list', product_url + 'reviews/')
+        self.assertWithinQueryBudget(
+            ReviewViewSet, 'retrieve', product_url + 'reviews/{}/'.format(self.product.reviews.first().pk)
+        )
+        self.assertWithinQueryBudget(CollectionViewSet, 'list', '/store/collections/')
+        self.assertWithinQueryBudget(CollectionViewSet, 'retrieve', '/store/collections/{}/'.format(self.collection.pk))
+        self.assertWithinQueryBudget(TagViewSet, 'list', '/store/tags/')
+
+    def test_carts(self):
+        cart_url = '/store/carts/{}/'.format(self.cart.pk)
+        self.assertWithinQueryBudget(CartViewSet, 'retrieve', cart_url)
+        self.assertWithinQueryBudget(CartItemViewSet, 'list', cart_url + 'cart-items/')
+
+    def test_admin_reads(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@b.com', 'admin'))
+        self.assertWithinQueryBudget(OrderViewSet, 'list', '/store/orders/')
+        self.assertWithinQueryBudget(OrderViewSet, 'retrieve', '/store/orders/{}/'.format(self.order.pk))
+        for action, path in ('top_products', 'top-products'), ('revenue', 'revenue'), ('collections', 'collections'):
+            self.assertWithinQueryBudget(SalesViewSet, action, '/store/sales/{}/'.format(path))
+
+    def test_exceeding_the_budget_fails(self):
+        with mock.patch.dict(CollectionViewSet.query_budget, {'list': 1}):
+            with self.assertRaises(self.failureException):
+                self.assertWithinQueryBudget(CollectionViewSet, 'list', '/store/collections/')
+
+
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        reset_route_stats()
+
+    def test_reports_queries_and_keeps_route_stats(self):
+        Collection.objects.create(title='Timed')
+
+        response = self.client.get('/store/collections/', HTTP_ACCEPT='application/json')
+        self.client.get('/store/collections/', HTTP_ACCEPT='application/json')
+
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^db;dur=[0-9.]+;desc="2 queries", serialize;dur=[0-9.]+, total;dur=[0-9.]+$'
+        )
+        stats = get_route_stats()['GET collection-list']
+        self.assertEqual(stats['requests'], 2)
+        # the second one was answered by the response cache
+        self.assertEqual(stats['max_queries'], 2)
+        self.assertEqual(sum(stats['duration_ms'].values()), 2)
+
+
+class SeedDataTests(TestCase):
+    def test_seeds_consistent_data(self):
+        call_command(
+            'seed_data', collections=3, products=40, promotions=2, customers=10, orders=30, carts=5, reviews=60,
+            tags=4, users=5, likes=30, chunk_size=7, seed=1, stdout=StringIO()
+        )
+
+        self.assertEqual(Product.objects.count(), 40)
+        self.assertEqual(Order.objects.count(), 30)
+        self.assertEqual(Review.objects.count(), 60)
+        for collection in Collection.objects.all():
+            self.assertEqual(collection.products_count, collection.products.count())
+        self.assertEqual(sum(Product.objects.values_list('reviews_count', flat=True)), 60)
+        self.assertFalse(Product.objects.filter(effective_price__gt=F('unit_price')).exists())
+        self.assertFalse(Order.objects.filter(payment_status=Order.COMPLETE, completed_at__isnull=True).exists())
+        self.assertEqual(
+            sum(LikeCount.objects.values_list('count', flat=True)), LikedItem.objects.count()
+        )
+
+
+class ProductImportTests(TestCase):
+    def setUp(self):
+        self.shoes = Collection.objects.create(title='Shoes')
+        self.widget = Product.objects.create(
+            title='Widget', slug='widget', inventory=1, unit_price=Decimal('1.00'), collection=self.shoes
+        )
+
+    def test_command_upserts_by_slug(self):
+        lines = [
+            'slug,title,description,unit_price,inventory,collection',
+            'widget,Widget Pro,,3.50,7,Gadgets',
+            ',Sprocket Deluxe,Shiny,2.00,4,Gadgets',
+            'bolt,Bolt,,not a price,1,Shoes',
+        ]
+        with NamedTemporaryFile('w', suffix='.csv') as file:
+            file.write('\n'.join(lines))
+            file.flush()
+            stdout, stderr = StringIO(), StringIO()
+            call_command('import_products', file.name, chunk_size=2, stdout=stdout, stderr=stderr)
+
+        self.assertIn('2 products imported, 1 invalid rows skipped, 1 collections created', stdout.getvalue())
+        self.assertIn('line 4: unit_price:', stderr.getvalue())
+        gadgets = Collection.objects.get(title='Gadgets')
+        self.widget.refresh_from_db()
+        self.assertEqual(
+            (self.widget.title, self.widget.unit_price, self.widget.effective_price, self.widget.inventory),
+            ('Widget Pro', Decimal('3.50'), Decimal('3.50'), 7)
+        )
+        self.assertEqual(self.widget.collection, gadgets)
+        self.assertTrue(Product.objects.filter(slug='sprocket-deluxe', description='Shiny').exists())
+        self.assertEqual(
+            dict(Collection.objects.values_list('title', 'products_count')), {'Shoes': 0, 'Gadgets': 2}
+        )
+        response = self.client.get(reverse('products-list'), {'search': 'sprocket'})
+        self.assertEqual([product['slug'] for product in response.json()['results']], ['sprocket-deluxe'])
+
+    def test_last_row_of_a_slug_wins_and_errors_are_capped(self):
+        rows = [
+            (1, {'slug': 'widget', 'title': 'One', 'unit_price': '1', 'inventory': 1, 'collection': 'Shoes'}),
+            (2, {'slug': 'widget', 'title': 'Two', 'unit_price': '2', 'inventory': 1, 'collection': 'Shoes'}),
+            (3, None),
+            (4, {'title': 'No price', 'inventory': 1, 'collection': 'Shoes'}),
+        ]
+        importer = ProductImport(chunk_size=10, max_errors=1).run(rows)
+
+        self.assertEqual(importer.as_dict(), {
+            'rows': 4, 'imported': 1, 'invalid': 2, 'collections_created': 0,
+            'errors': [{'line': 3, 'errors': {'__all__': ['Not a JSON object.']}}],
+        })
+        self.assertEqual(Product.objects.get(slug='widget').title, 'Two')
+
+    def test_new_collections_without_returning(self):
+        # MySQL gives no ids back from a bulk INSERT
+        rows = [
+            (index, {'slug': title.lower(), 'title': title, 'unit_price': '1', 'inventory': 1, 'collection': title})
+            for index, title in enumerate(['Hats', 'Bags'], 1)
+        ]
+        with mock.patch.object(
+            type(connection.features), 'can_return_rows_from_bulk_insert', new_callable=mock.PropertyMock,
+            return_value=False
+        ):
+            importer = ProductImport().run(rows)
+
+        created = Collection.objects.exclude(pk=self.shoes.pk)
+        self.assertEqual(importer.collections, dict(created.values_list('title', 'pk')))
+        self.assertEqual(Product.objects.get(slug='hats').collection.title, 'Hats')
+
+    def test_ndjson_lines(self):
+        rows = read_rows(['{"slug": "a"}\n', '\n', '{oops\n'], 'ndjson')
+        self.assertEqual(list(rows), [(1, {'slug': 'a'}), (3, None)])
+
+    def test_upload(self):
+        url = reverse('import-products')
+        payload = b'{"slug": "bolt", "title": "Bolt", "unit_price": 0.5, "inventory": 3, "collection": "Shoes"}\n'
+        self.assertEqual(self.client.post(url, {'file': SimpleUploadedFile('p.ndjson', payload)}).status_code, 403)
+
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@b.com', 'admin'))
+        response = self.client.post(url, {'file': SimpleUploadedFile('p.ndjson', payload)})
+        self.assertEqual(response.json()['imported'], 1)
+        self.assertEqual(Product.objects.get(slug='bolt').collection, self.shoes)
+        response = self.client.post(url, {'file': SimpleUploadedFile('p.txt', payload)})
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_checks_slugs(self):
+        url = reverse('products-batch')
+        data = {'title': 'Other', 'slug': 'widget', 'inventory': 1, 'unit_price': '1.00', 'collection': self.shoes.pk}
+        response = self.client.post(
+            url, {'operations': [{'op': 'create', 'data': data}]}, content_type='application/json'
+        )
+        self.assertEqual(
+            response.json()['operations'][0]['data']['slug'], ['A product with this slug already exists.']
+        )
+
+        response = self.client.post(url, {'operations': [
+            {'op': 'update', 'id': self.widget.pk, 'data': {'slug': 'widget', 'inventory': 2}},
+        ]}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+
+@skipUnless(find_spec('orjson'), 'orjson is not installed')
+class FastJSONTests(TestCase):
+    def setUp(self):
+        from mosh_django.fastjson import ORJSONParser, ORJSONRenderer
+
+        self.renderer, self.parser = ORJSONRenderer(), ORJSONParser()
+
+    def assertRendersLikeDRF(self, data, accepted_media_type=None):
+        self.assertEqual(
+            self.renderer.render(data, accepted_media_type), JSONRenderer().render(data, accepted_media_type)
+        )
+
+    def parse(self, parser, body):
+        return parser.parse(BytesIO(body), 'application/json', {'encoding': 'utf-8'})
+
+    def test_renders_like_drf(self):
+        self.assertRendersLikeDRF({
+            'price': Decimal('12.30'), 'id': uuid4(), 'at': timezone.now(), 'on': timezone.localdate(),
+            'text': 'caf\u00e9 \u2028 "quoted"', 'keys': {1: 'a', None: 'b'}, 'ids': {3}, 'big': 2 ** 70,
+            'nested': [{'a': 1.5, 'b': None, 'c': True}],
+        })
+        self.assertRendersLikeDRF({'a': [1, 2]}, 'application/json; indent=4')
+        # microseconds are kept, as DRF keeps them
+        self.assertIn(b'.123456Z"', self.renderer.render({'at': timezone.now().replace(microsecond=123456)}))
+        self.assertEqual(self.renderer.render(None), b'')
+
+    def test_renders_api_payloads_like_drf(self):
+        collection = Collection.objects.create(title='JSON')
+        product = Product.objects.create(
+            title='Product', slug='product', inventory=1, unit_price=Decimal('9.99'), collection=collection
+        )
+        cart = self.client.post(reverse('carts-list')).json()
+        self.client.post(reverse('cart-items-list', args=[cart['id']]), {'product_id': product.pk, 'quantity': 2})
+
+        for url in (reverse('products-list'), reverse('products-detail', args=[product.pk]),
+                    reverse('carts-detail', args=[cart['id']])):
+            response = self.client.get(url)
+            self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+    def test_parses_like_drf(self):
+        body = '{"a": [1, 2.5, "caf\u00e9"], "b": {"c": null, "d": true}}'.encode()
+        self.assertEqual(self.parse(self.parser, body), self.parse(JSONParser(), body))
+        for body in (b'{"a": NaN}', b'{"a": ', b'\xff'):
+            with self.assertRaises(ParseError):
+                self.parse(self.parser, body)
+
+
+class CompiledReadTests(TestCase):
+    def setUp(self):
+        collection = Collection.objects.create(title='Compiled')
+        self.products = [
+            Product.objects.create(
+                title='Product {}'.format(index), slug='product-{}'.format(index), inventory=index,
+                unit_price=Decimal('1.5') * (index + 1), collection=collection,
+                description='Described' if index else None
+            )
+            for index in range(3)
+        ]
+        tag = Tag.objects.create(label='sale')
+        TaggedItem.objects.create(tag=tag, content_object=self.products[0])
+        Review.objects.create(product=self.products[0], name='A', description='Good')
+        self.cart = Cart.objects.create()
+        for product in self.products:
+            CartItem.objects.create(cart=self.cart, product=product, quantity=2)
+
+    def assertCompiledLikeDRF(self, serialize):
+        compiled = serialize()
+        with mock.patch.object(CompiledReadMixin, 'compiled_reads', False):
+            self.assertEqual(compiled, serialize())
+
+    def test_same_output_as_drf(self):
+        products = ProductViewSet.queryset.annotate(price_with_tax=price_with_tax()).prefetch_related('tags__tag')
+        self.assertCompiledLikeDRF(lambda: ProductSerializer(products, many=True).data)
+        self.assertCompiledLikeDRF(lambda: ProductSerializer(Product.objects.get(pk=self.products[0].pk)).data)
+        self.assertCompiledLikeDRF(lambda: ReviewSerializer(Review.objects.all(), many=True).data)
+        self.assertCompiledLikeDRF(lambda: CartSerializer(CartViewSet.queryset.get(pk=self.cart.pk)).data)
+        # nothing annotated, the totals are summed in Python
+        self.assertCompiledLikeDRF(lambda: CartSerializer(Cart.objects.get(pk=self.cart.pk)).data)
+        empty = Cart.objects.create()
+        self.assertCompiledLikeDRF(lambda: CartSerializer(empty).data)
+
+    def test_plan_is_compiled_once_per_class(self):
+        first, second = ReviewSerializer(), ReviewSerializer()
+        self.assertIs(get_plan(first), get_plan(second))
+        self.assertEqual([name for name, _ in get_plan(first)], ['id', 'date', 'name', 'description', 'product'])
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        collection = Collection.objects.create(title='Sparse')
+        self.products = [
+            Product.objects.create(
+                title='Product {:02}'.format(index), slug='product-{}'.format(index), inventory=index,
+                unit_price=Decimal(index + 1), collection=collection, description='Long text'
+            )
+            for index in range(12)
+        ]
+        TaggedItem.objects.create(tag=Tag.objects.create(label='sale'), content_object=self.products[0])
+        Review.objects.create(product=self.products[0], name='A', description='Good')
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json(), [query['sql'] for query in queries]
+
+    def test_product_list(self):
+        page, queries = self.get('/store/products/', fields='id,title')
+        self.assertEqual(page['results'][0], {'id': self.products[0].pk, 'title': 'Product 00'})
+        self.assertFalse(any('description' in sql for sql in queries))
+        # the tag labels are not fetched either
+        self.assertFalse(any('tags_taggeditem' in sql for sql in queries))
+        async_page = self.client.get(reverse('async-products-list'), {'fields': 'id,title'}).json()
+        self.assertEqual(async_page['results'], page['results'])
+
+        # ordered by title, which is left out but still selected for the cursor
+        page, _ = self.get('/store/products/', exclude='title,description,tags')
+        self.assertNotIn('title', page['results'][0])
+        self.assertIn('unit_price', page['results'][0])
+        cursor = parse_qs(urlsplit(page['next']).query)['cursor'][0]
+        page, _ = self.get('/store/products/', exclude='title,description,tags', cursor=cursor)
+        self.assertEqual([product['id'] for product in page['results']], [p.pk for p in self.products[10:]])
+
+    def test_product_detail(self):
+        product, queries = self.get('/store/products/{}/'.format(self.products[0].pk), exclude='description')
+        self.assertNotIn('description', product)
+        self.assertEqual(product['tags'], ['sale'])
+        self.assertFalse(any('description' in sql for sql in queries))
+
+        product, _ = self.get('/store/products/{}/'.format(self.products[0].pk), fields='')
+        self.assertEqual(product['description'], 'Long text')
+
+    def test_reviews(self):
+        reviews, queries = self.get('/store/products/{}/reviews/'.format(self.products[0].pk), fields='id,name')
+        self.assertEqual(list(reviews['results'][0]), ['id', 'name'])
+        self.assertFalse(any('description' in sql for sql in queries))
+
+    def test_nested_serializers_keep_their_fields(self):
+        cart = Cart.objects.create()
+        CartItem.objects.create(cart=cart, product=self.products[0], quantity=2)
+        payload, _ = self.get('/store/carts/{}/'.format(cart.pk), fields='items')
+        self.assertEqual(list(payload), ['items'])
+        self.assertEqual(list(payload['items'][0]), ['id', 'product', 'quantity', 'total_price'])
+
+    def test_writes_get_every_field(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@b.com', 'admin'))
+        response = self.client.patch(
+            '/store/collections/{}/?fields=id'.format(self.products[0].collection_id), {'title': 'Renamed'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.json()['title'], 'Renamed')
+
+
+class ProductBatchTests(TestCase):
+    def setUp(self):
+        self.collection = Collection.objects.create(title='Batch')
+        self.url = reverse('products-batch')
+
+    def post(self, *operations):
+        return self.client.post(self.url, {'operations': list(operations)}, content_type='application/json')
+
+    def make_data(self, slug, **data):
+        return {
+            'title': slug.title(), 'slug': slug, 'inventory': 1, 'unit_price': '2.00',
+            'collection': self.collection.pk, **data
+        }
+
+    def test_created_ids_without_returning(self):
+        # MySQL gives no ids back from a bulk INSERT
+        with mock.patch.object(
+            type(connection.features), 'can_return_rows_from_bulk_insert', new_callable=mock.PropertyMock,
+            return_value=False
+        ):
+            response = self.post(
+                {'op': 'create', 'data': self.make_data('first')}, {'op': 'create', 'data': self.make_data('second')}
+            )
+        self.assertEqual(response.status_code, 200)
+        ids = [operation['id'] for operation in response.json()['operations']]
+        self.assertEqual(ids, [Product.objects.get(slug=slug).pk for slug in ('first', 'second')])
+
+    def test_tags_of_the_response_in_one_query(self):
+        product = Product.objects.create(
+            title='Tagged', slug='tagged', inventory=1, unit_price=Decimal(1), collection=self.collection
+        )
+        TaggedItem.objects.create(tag=Tag.objects.create(label='sale'), content_object=product)
+        operations = [{'op': 'create', 'data': self.make_data('new-{}'.format(index))} for index in range(5)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post({'op': 'update', 'id': product.pk, 'data': {'inventory': 3}}, *operations)
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['operations']
+        self.assertEqual([result['tags'] for result in results], [['sale']] + [[]] * 5)
+        self.assertEqual(len([query for query in queries if 'tags_taggeditem' in query['sql']]), 1)
+
+    def make_product(self, slug, **fields):
+        return Product.objects.create(
+            title=slug.title(), slug=slug, inventory=1, unit_price=Decimal(2), collection=self.collection, **fields
+        )
+
+    def test_creates_updates_and_deletes(self):
+        updated, deleted = self.make_product('updated'), self.make_product('deleted')
+        other = Collection.objects.create(title='Other')
+        response = self.post(
+            {'op': 'create', 'data': self.make_data('created', title='Fresh batch')},
+            {'op': 'update', 'id': updated.pk, 'data': {'unit_price': '3.00', 'collection': other.pk}},
+            {'op': 'delete', 'id': deleted.pk},
+        )
+        self.assertEqual(response.status_code, 200)
+        created = Product.objects.get(slug='created')
+        results = response.json()['operations']
+        self.assertEqual([(result['op'], result['id']) for result in results], [
+            ('create', created.pk), ('update', updated.pk), ('delete', deleted.pk)
+        ])
+        self.assertEqual(results[1]['unit_price'], 3)
+        self.assertEqual(results[1]['collection'], other.pk)
+        self.assertFalse(Product.objects.filter(pk=deleted.pk).exists())
+        updated.refresh_from_db()
+        self.assertEqual((updated.unit_price, updated.effective_price), (Decimal(3), Decimal(3)))
+        self.assertEqual(
+            list(Collection.objects.order_by('pk').values_list('products_count', flat=True)), [1, 1]
+        )
+        # the search index follows bulk writes too
+        results = self.client.get('/store/products/', {'search': 'fresh'}).json()['results']
+        self.assertEqual([result['id'] for result in results], [created.pk])
+
+    def test_updates_touch_last_update(self):
+        product = self.make_product('touched')
+        Product.objects.filter(pk=product.pk).update(last_update=timezone.now() - timedelta(days=1))
+        before = Product.objects.get(pk=product.pk).last_update
+        response = self.post({'op': 'update', 'id': product.pk, 'data': {'inventory': 3}})
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(Product.objects.get(pk=product.pk).last_update, before)
+
+    def test_errors_per_operation_and_nothing_written(self):
+        product, ordered = self.make_product('product'), self.make_product('ordered')
+        customer = Customer.objects.create(first_name='A', last_name='B', email='a@b.com', phone='1')
+        OrderItem.objects.create(
+            order=Order.objects.create(customer=customer), product=ordered, quantity=1, unit_price=Decimal(2)
+        )
+        response = self.post(
+            {'op': 'create', 'data': self.make_data('valid')},
+            {'op': 'update', 'id': 0, 'data': {'inventory': 2}},
+            {'op': 'update', 'id': product.pk, 'data': {'slug': 'ordered'}},
+            {'op': 'create', 'data': self.make_data('valid')},
+            {'op': 'delete', 'id': ordered.pk},
+        )
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['operations']
+        self.assertEqual(errors[0], {})
+        self.assertEqual(errors[1], {'id': ['Not found.']})
+        self.assertEqual(errors[2], {'data': {'slug': ['A product with this slug already exists.']}})
+        self.assertEqual(errors[3], {'data': {'slug': ['Only one product per slug is allowed.']}})
+        self.assertIn('id', errors[4])
+        response = self.post(
+            {'op': 'update', 'id': product.pk, 'data': {'inventory': 2}},
+            {'op': 'create', 'data': self.make_data('invalid', collection=0)},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([list(error.get('data', {})) for error in response.json()['operations']], [[], ['collection']])
+        self.assertEqual(sorted(Product.objects.values_list('slug', 'inventory')), [('ordered', 1), ('product', 1)])
+
+    def test_malformed_operations(self):
+        response = self.post({'op': 'delete'}, {'op': 'update', 'id': 1}, {'op': 'rename', 'id': 1})
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['operations']
+        self.assertEqual([list(error) for error in errors], [['id'], ['data'], ['op']])
+        self.assertEqual(self.post().status_code, 400)
+
+    def test_queries_do_not_grow_with_the_batch(self):
+        def count_queries(size):
+            products = [self.make_product('existing-{}-{}'.format(size, index)) for index in range(size)]
+            operations = [
+                operation
+                for index, product in enumerate(products)
+                for operation in (
+                    {'op': 'create', 'data': self.make_data('new-{}-{}'.format(size, index))},
+                    {'op': 'update', 'id': product.pk, 'data': {'inventory': 5}},
+                )
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.post(*operations).status_code, 200)
+            return len(queries)
+
+        self.assertEqual(count_queries(2), count_queries(20))
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        self.collection = Collection.objects.create(title='Cached')
+
+    def test_versions_are_bumped_on_commit(self):
+        before = cache.get_versions(cache.PRODUCTS)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Product.objects.create(
+                    title='New', slug='new', inventory=1, unit_price=Decimal(1), collection=self.collection
+                )
+                # a read in between must not cache the uncommitted row under a new version
+                self.assertEqual(cache.get_versions(cache.PRODUCTS), before)
+            self.assertEqual(cache.get_versions(cache.PRODUCTS), before)
+        self.assertNotEqual(cache.get_versions(cache.PRODUCTS), before)
+
+    def make_products(self, count):
+        return Product.objects.bulk_create(
+            Product(
+                title='Product {}'.format(index), slug='cached-{}'.format(index), inventory=10,
+                unit_price=Decimal(1), collection=self.collection
+            )
+            for index in range(count)
+        )
+
+    def test_updates_invalidate_the_products_they_touch(self):
+        first, second = self.make_products(2)
+        versions = {pk: cache.get_versions(cache.PRODUCTS, pk) for pk in (None, first.pk, second.pk)}
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=first.pk).update(inventory=F('inventory') - 1)
+        self.assertNotEqual(cache.get_versions(cache.PRODUCTS), versions[None])
+        self.assertNotEqual(cache.get_versions(cache.PRODUCTS, first.pk), versions[first.pk])
+        self.assertEqual(cache.get_versions(cache.PRODUCTS, second.pk), versions[second.pk])
+
+    def test_large_updates_invalidate_every_product(self):
+        products = self.make_products(3)
+        versions = cache.get_versions(cache.PRODUCTS, products[0].pk)
+        with mock.patch.object(ProductQuerySet, 'invalidate_limit', 2), self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(collection=self.collection).update(inventory=0)
+        self.assertNotEqual(cache.get_versions(cache.PRODUCTS, products[0].pk)[0], versions[0])
+
+    def test_cart_etag_follows_bulk_price_changes(self):
+        product, = self.make_products(1)
+        cart = Cart.objects.create()
+        CartItem.objects.create(cart=cart, product=product, quantity=1)
+        url = '/store/carts/{}/'.format(cart.pk)
+        etag = self.client.get(url)['ETag']
+        Product.objects.filter(pk=product.pk).update(inventory=5)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Product.objects.filter(pk=product.pk).update(unit_price=Decimal(2))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        collection = Collection.objects.create(title='Keyset')
+        self.products = Product.objects.bulk_create(
+            Product(
+                title='Product {:02}'.format(index), slug='keyset-{}'.format(index), inventory=index,
+                unit_price=Decimal(index % 4 + 1), collection=collection
+            )
+            for index in range(25)
+        )
+
+    def test_cursors_are_deterministic(self):
+        first = self.client.get('/store/products/').json()['next']
+        with mock.patch('time.time', return_value=time.time() + 3600):
+            self.assertEqual(self.client.get('/store/products/').json()['next'], first)
+
+    def test_capped_counts_are_marked(self):
+        payload = self.client.get('/store/products/', {'unit_price__gte': 1}).json()
+        self.assertEqual((payload['count'], payload['count_is_exact']), (25, True))
+        with mock.patch.object(ProductPagination, 'count_limit', 10):
+            payload = self.client.get('/store/products/', {'unit_price__gte': 2}).json()
+        # a lower bound, there are 18 of them
+        self.assertEqual((payload['count'], payload['count_is_exact']), (10, False))
+        schema = ProductPagination().get_paginated_response_schema({})
+        self.assertEqual(schema['properties']['count_is_exact']['type'], 'boolean')
+
+    def walk(self, url, link):
+        pages = []
+        while url is not None:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            payload = response.json()
+            pages.append([product['id'] for product in payload['results']])
+            url = payload[link]
+        return pages
+
+    def test_walks_forward_and_back(self):
+        # repeated prices, the pk breaks the ties
+        expected = [
+            product.pk for product in sorted(self.products, key=lambda product: (product.unit_price, product.pk))
+        ]
+        forward = self.walk('/store/products/?ordering=unit_price', 'next')
+        self.assertEqual([len(page) for page in forward], [10, 10, 5])
+        self.assertEqual(sum(forward, []), expected)
+
+        last = self.client.get('/store/products/?ordering=unit_price').json()
+        while last['next'] is not None:
+            last = self.client.get(last['next']).json()
+        backward = self.walk(last['previous'], 'previous')
+        self.assertEqual(backward, forward[-2::-1])
+
+    def test_descending_ordering(self):
+        expected = [
+            product.pk for product in sorted(self.products, key=lambda product: (-product.unit_price, product.pk))
+        ]
+        self.assertEqual(sum(self.walk('/store/products/?ordering=-unit_price', 'next'), []), expected)
+
+    def test_rejects_tampered_and_foreign_cursors(self):
+        link = self.client.get('/store/products/?ordering=unit_price').json()['next']
+        cursor = parse_qs(urlsplit(link).query)['cursor'][0]
+        tampered = cursor[:-1] + ('A' if cursor[-1] != 'A' else 'B')
+        for url in (
+            '/store/products/?ordering=unit_price&cursor={}'.format(tampered),
+            '/store/products/?ordering=unit_price&cursor=garbage',
+            # issued for another ordering
+            '/store/products/?ordering=-unit_price&cursor={}'.format(cursor),
+            '/store/products/?cursor={}'.format(cursor),
+        ):
+            self.assertEqual(self.client.get(url).status_code, 404, url)
+        url = '/store/products/?ordering=unit_price&cursor={}'.format(cursor)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class CartItemTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(
+            title='Added', slug='added', inventory=1, unit_price=Decimal(1),
+            collection=Collection.objects.create(title='Carts')
+        )
+        self.cart = Cart.objects.create()
+        self.url = reverse('cart-items-list', args=[self.cart.pk])
+
+    def add(self, quantity):
+        return self.client.post(self.url, {'product_id': self.product.pk, 'quantity': quantity})
+
+    def test_repeated_adds_update_one_item(self):
+        first = self.add(2)
+        self.assertEqual(first.status_code, 201)
+        second = self.add(3)
+        self.assertEqual(second.json(), {'id': first.json()['id'], 'product_id': self.product.pk, 'quantity': 5})
+        self.assertEqual(list(CartItem.objects.values_list('cart_id', 'quantity')), [(self.cart.pk, 5)])
+
+    def test_quantity_is_bounded(self):
+        self.assertEqual(self.add(32000).status_code, 201)
+        response = self.add(1000)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('quantity', response.json())
+        self.assertEqual(CartItem.objects.get().quantity, 32000)
+        self.assertEqual(self.add(767).json()['quantity'], 32767)
+
+    def test_insert_race_falls_back_to_the_update(self):
+        update = QuerySet.update
+        raced = []
+
+        def update_after_a_racing_insert(queryset, **kwargs):
+            if queryset.model is CartItem and not raced:
+                # another request inserts the item between our UPDATE and INSERT
+                raced.append(CartItem.objects.create(cart=self.cart, product=self.product, quantity=2))
+                return 0
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', autospec=True, side_effect=update_after_a_racing_insert):
+            response = self.add(3)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['id'], raced[0].pk)
+        self.assertEqual(list(CartItem.objects.values_list('quantity', flat=True)), [5])
+
+    def test_item_endpoints(self):
+        item = self.add(2).json()
+        url = reverse('cart-items-detail', args=[self.cart.pk, item['id']])
+        items = self.client.get(self.url).json()['results']
+        self.assertEqual([(row['id'], row['quantity'], row['total_price']) for row in items], [(item['id'], 2, 2)])
+        response = self.client.patch(url, {'quantity': 4}, content_type='application/json')
+        self.assertEqual(response.json(), {'quantity': 4})
+        self.assertEqual(self.client.patch(url, {'quantity': 0}, content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertFalse(CartItem.objects.exists())
+
+        self.assertIn('product_id', self.client.post(self.url, {'product_id': 0, 'quantity': 1}).json())
+        missing = reverse('cart-items-list', args=[uuid4()])
+        self.assertEqual(self.client.post(missing, {'product_id': self.product.pk, 'quantity': 1}).status_code, 404)
+
+
+class ProductListTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        collection = Collection.objects.create(title='Listed')
+        # 1.05 and 0.15 land on half a cent once taxed
+        self.products = [
+            Product.objects.create(
+                title='Product {}'.format(index), slug='listed-{}'.format(index), inventory=index, unit_price=price,
+                collection=collection, description='Described' if index else None
+            )
+            for index, price in enumerate([Decimal('1.05'), Decimal('0.15'), Decimal('19.99'), Decimal('1000')])
+        ]
+        TaggedItem.objects.create(tag=Tag.objects.create(label='sale'), content_object=self.products[1])
+        Review.objects.create(product=self.products[2], name='A', description='Good')
+
+    def get_results(self, url='/store/products/'):
+        cache.get_cache().clear()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_values_rows_serialize_like_instances(self):
+        products = Product.objects.order_by('title', 'pk')
+        expected = json.loads(JSONRenderer().render(ProductSerializer(products, many=True).data))
+        self.assertEqual(self.get_results(), expected)
+        with mock.patch.object(ProductViewSet, 'serialize_from_values', False):
+            self.assertEqual(self.get_results(), expected)
+        self.assertEqual([product['price_with_tax'] for product in expected], [1.16, 0.17, 21.99, 1100])
+
+    def test_sparse_fields_and_ordering(self):
+        url = '/store/products/?fields=id,price_with_tax,tags&ordering=-unit_price'
+        with mock.patch.object(ProductViewSet, 'serialize_from_values', False):
+            expected = self.get_results(url)
+        self.assertEqual(self.get_results(url), expected)
+        self.assertEqual(list(expected[0]), ['id', 'price_with_tax', 'tags'])
+
+    @override_settings(STORE_TAX_RATE=Decimal('0.2'))
+    def test_tax_rate_setting(self):
+        self.assertEqual(
+            [product['price_with_tax'] for product in self.get_results()], [1.26, 0.18, 23.99, 1200]
+        )
+        self.assertEqual(
+            self.client.get('/store/products/{}/'.format(self.products[0].pk)).json()['price_with_tax'], 1.26
+        )
+
+
+class ResponseInvalidationTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        self.collection = Collection.objects.create(title='Invalidated')
+        self.product = Product.objects.create(
+            title='Cached', slug='cached', inventory=1, unit_price=Decimal(10), collection=self.collection
+        )
+        self.product_url = '/store/products/{}/'.format(self.product.pk)
+        self.collection_url = '/store/collections/{}/'.format(self.collection.pk)
+
+    def assertInvalidated(self, write, *urls):
+        for url in urls:
+            self.client.get(url)
+            self.assertEqual(self.client.get(url)['X-Cache'], 'HIT', url)
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+        for url in urls:
+            # a MISS, or a 404 for what the write deleted
+            self.assertNotEqual(self.client.get(url).get('X-Cache'), 'HIT', url)
+
+    def test_api_writes(self):
+        self.assertInvalidated(
+            lambda: self.client.patch(self.product_url, {'title': 'Renamed'}, content_type='application/json'),
+            self.product_url, '/store/products/'
+        )
+        self.assertEqual(self.client.get(self.product_url).json()['title'], 'Renamed')
+        self.assertInvalidated(
+            lambda: self.client.patch(self.collection_url, {'title': 'Renamed'}, content_type='application/json'),
+            self.collection_url, '/store/collections/'
+        )
+
+    def test_product_saves_and_deletes(self):
+        other = Product.objects.create(
+            title='Other', slug='other', inventory=1, unit_price=Decimal(1), collection=self.collection
+        )
+        other_url = '/store/products/{}/'.format(other.pk)
+        self.client.get(other_url)
+
+        self.product.inventory = 5
+        self.assertInvalidated(self.product.save, self.product_url, '/store/products/')
+        self.assertEqual(self.client.get(other_url)['X-Cache'], 'HIT')
+        # products_count of the collection changes too
+        self.assertInvalidated(other.delete, other_url, self.collection_url)
+        self.assertEqual(self.client.get(other_url).status_code, 404)
+        self.assertEqual(self.client.get(self.collection_url).json()['products_count'], 1)
+
+    def test_padded_pks(self):
+        padded_url = '/store/products/0{}/'.format(self.product.pk)
+        self.assertInvalidated(
+            lambda: Product.objects.filter(pk=self.product.pk).update(title='Renamed'), padded_url
+        )
+        self.assertEqual(self.client.get(padded_url).json()['title'], 'Renamed')
+        self.assertEqual(self.client.get('/store/products/x/').status_code, 404)
+
+    def test_collection_saves_and_deletes(self):
+        empty = Collection.objects.create(title='Empty')
+        self.assertInvalidated(empty.delete, '/store/collections/', '/store/collections/{}/'.format(empty.pk))
+
+    def test_queryset_writes(self):
+        self.assertInvalidated(
+            lambda: Product.objects.filter(pk=self.product.pk).update(inventory=3), self.product_url,
+            '/store/products/'
+        )
+        self.assertInvalidated(
+            lambda: Product.objects.bulk_create([
+                Product(title='Bulk', slug='bulk', inventory=1, unit_price=Decimal(1), collection=self.collection)
+            ]),
+            self.product_url, '/store/products/', self.collection_url
+        )
+
+    def test_tags(self):
+        tag = Tag.objects.create(label='sale')
+        item = TaggedItem(tag=tag, content_object=self.product)
+        self.assertInvalidated(item.save, self.product_url, '/store/products/', '/store/tags/')
+        self.assertEqual(self.client.get(self.product_url).json()['tags'], ['sale'])
+        tag.label = 'clearance'
+        self.assertInvalidated(tag.save, self.product_url, '/store/tags/')
+        self.assertInvalidated(item.delete, self.product_url, '/store/tags/')
+
+    def test_promotions(self):
+        promotion = Promotion.objects.create(description='Half off', discount=0.5)
+        self.assertInvalidated(lambda: self.product.promotions.add(promotion), self.product_url, '/store/products/')
+        self.assertEqual(self.client.get(self.product_url).json()['effective_price'], 5)
+        self.assertInvalidated(promotion.product_set.clear, self.product_url)
+        self.assertInvalidated(lambda: promotion.product_set.add(self.product), self.product_url)
+        self.assertInvalidated(lambda: self.product.promotions.remove(promotion), self.product_url)
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        self.shoes, self.clothes = Collection.objects.create(title='Shoes'), Collection.objects.create(title='Clothes')
+        self.red_shoes = self.make_product('Red Shoes', 'Comfortable running shoes', 10, self.shoes)
+        self.shirt = self.make_product('Blue Shirt', 'Goes with red shoes', 20, self.clothes)
+        self.shoehorn = self.make_product('Shoehorn', None, 5, self.shoes)
+
+    def make_product(self, title, description, price, collection):
+        return Product.objects.create(
+            title=title, slug=title.lower().replace(' ', '-'), description=description, inventory=1,
+            unit_price=Decimal(price), collection=collection
+        )
+
+    def search(self, **params):
+        response = self.client.get('/store/products/', params)
+        self.assertEqual(response.status_code, 200)
+        return [product['id'] for product in response.json()['results']]
+
+    def test_prefixes_all_terms_and_rank(self):
+        # title tokens weigh more, exact matches count double
+        self.assertEqual(self.search(search='shoe'), [self.red_shoes.pk, self.shoehorn.pk, self.shirt.pk])
+        self.assertEqual(self.search(search='SHOES'), [self.red_shoes.pk, self.shirt.pk])
+        self.assertEqual(self.search(search='red shoe'), [self.red_shoes.pk, self.shirt.pk])
+        self.assertEqual(self.search(search='red horn'), [])
+        self.assertEqual(self.search(search='!!'), [])
+
+    def test_combines_with_filters_and_ordering(self):
+        self.assertEqual(
+            self.search(search='shoe', collection_id=self.shoes.pk), [self.red_shoes.pk, self.shoehorn.pk]
+        )
+        self.assertEqual(self.search(search='shoe', unit_price__gte=10), [self.red_shoes.pk, self.shirt.pk])
+        self.assertEqual(
+            self.search(search='shoe', ordering='unit_price'), [self.shoehorn.pk, self.red_shoes.pk, self.shirt.pk]
+        )
+
+    def test_pages_by_rank(self):
+        for index in range(12):
+            self.make_product('Widget {}'.format(index), 'widget ' * (index % 3), 1, self.shoes)
+        url, ids = '/store/products/?search=widget', []
+        while url is not None:
+            payload = self.client.get(url).json()
+            ids += [product['id'] for product in payload['results']]
+            url = payload['next']
+        # the more "widget" in the description the higher the rank, ties in pk order
+        ranked = Product.objects.filter(title__startswith='Widget').order_by('-description', 'pk')
+        self.assertEqual(ids, [product.pk for product in ranked])
+
+    def test_index_follows_writes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shirt.title = 'Blue Shoe'
+            self.shirt.save()
+            self.red_shoes.delete()
+        self.assertEqual(self.search(search='shoe'), [self.shirt.pk, self.shoehorn.pk])
+        self.assertFalse(ProductSearchTerm.objects.filter(product_id=self.red_shoes.pk).exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.bulk_create([Product(
+                title='Snow Shoes', slug='snow-shoes', inventory=1, unit_price=Decimal(1), collection=self.shoes
+            )])
+        self.assertEqual(len(self.search(search='snow')), 1)
+
+    def test_rebuild_command(self):
+        terms = sorted(ProductSearchTerm.objects.values_list('term', 'product_id', 'weight'))
+        ProductSearchTerm.objects.all().delete()
+        call_command('rebuild_search_index', chunk_size=2, stdout=StringIO())
+        self.assertEqual(sorted(ProductSearchTerm.objects.values_list('term', 'product_id', 'weight')), terms)
+
+
+class ProductsCountTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        self.first, self.second = Collection.objects.create(title='First'), Collection.objects.create(title='Second')
+
+    def make_products(self, count, collection):
+        return Product.objects.bulk_create(
+            Product(
+                title='Product {}'.format(index), slug='{}-{}'.format(collection.pk, index), inventory=1,
+                unit_price=Decimal(1), collection=collection
+            )
+            for index in range(count)
+        )
+
+    def assertCounts(self, first, second):
+        collections = (self.first.pk, self.second.pk)
+        self.assertEqual([Product.objects.filter(collection_id=pk).count() for pk in collections], [first, second])
+        self.assertEqual([Collection.objects.get(pk=pk).products_count for pk in collections], [first, second])
+
+    def test_api_writes(self):
+        response = self.client.post('/store/products/', {
+            'title': 'New', 'slug': 'new', 'inventory': 1, 'unit_price': '1.00', 'collection': self.first.pk
+        })
+        self.assertEqual(response.status_code, 201)
+        url = '/store/products/{}/'.format(response.json()['id'])
+        self.assertEqual(self.client.get('/store/collections/{}/'.format(self.first.pk)).json()['products_count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url, {'collection': self.second.pk}, content_type='application/json')
+        self.assertCounts(0, 1)
+        self.assertEqual(self.client.get('/store/collections/{}/'.format(self.second.pk)).json()['products_count'], 1)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertCounts(0, 0)
+
+    def test_queryset_writes(self):
+        products = self.make_products(3, self.first)
+        self.assertCounts(3, 0)
+        Product.objects.filter(pk=products[0].pk).update(collection=self.second)
+        self.assertCounts(2, 1)
+        products[1].collection = products[2].collection = self.second
+        # CASE WHEN ... the new collection is only known to the database
+        Product.objects.bulk_update(products[1:], ['collection'])
+        self.assertCounts(0, 3)
+        Product.objects.filter(pk=products[2].pk).delete()
+        self.assertCounts(0, 2)
+
+    def test_upserts(self):
+        products = self.make_products(2, self.first)
+        moved = Product(
+            title='Moved', slug=products[0].slug, inventory=1, unit_price=Decimal(1), collection=self.second
+        )
+        new = Product(title='New', slug='new', inventory=1, unit_price=Decimal(1), collection=self.second)
+        Product.objects.bulk_create(
+            [moved, new], update_conflicts=True, unique_fields=['slug'], update_fields=['title', 'collection']
+        )
+        self.assertCounts(1, 2)
+
+    def test_reconcile_command(self):
+        self.make_products(2, self.first)
+        Collection.objects.filter(pk=self.first.pk).update(products_count=7)
+        out = StringIO()
+        call_command('reconcile_collection_counts', stdout=out)
+        self.assertIn('1 collection(s) fixed.', out.getvalue())
+        self.assertCounts(2, 0)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        self.collection = Collection.objects.create(title='Polled')
+        self.product = Product.objects.create(
+            title='Polled', slug='polled', inventory=1, unit_price=Decimal(1), collection=self.collection
+        )
+
+    def assertConditional(self, url, write):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        # answered from the validators alone
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+        self.assertEqual(not_modified['ETag'], etag)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_MODIFIED_SINCE='Mon, 01 Jan 2001 00:00:00 GMT').status_code, 200
+        )
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+        # the same state under another query string or renderer is another representation
+        self.assertNotEqual(self.client.get(url, {'format': 'api'})['ETag'], etag)
+        self.assertNotEqual(self.client.get(url, {'fields': 'id'})['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+        modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(modified.status_code, 200)
+        self.assertNotEqual(modified['ETag'], etag)
+
+    def rename(self, instance):
+        instance.title = 'Renamed'
+        instance.save()
+
+    def test_products(self):
+        self.assertConditional('/store/products/', lambda: self.rename(self.product))
+        self.assertConditional(
+            '/store/products/{}/'.format(self.product.pk),
+            lambda: Product.objects.filter(pk=self.product.pk).update(inventory=5)
+        )
+
+    def test_collections(self):
+        self.assertConditional('/store/collections/', lambda: self.rename(self.collection))
+        self.assertConditional(
+            '/store/collections/{}/'.format(self.collection.pk),
+            lambda: Product.objects.create(
+                title='New', slug='new', inventory=1, unit_price=Decimal(1), collection=self.collection
+            )
+        )
+
+    def test_product_detail_is_not_invalidated_by_other_products(self):
+        url = '/store/products/{}/'.format(self.product.pk)
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(
+                title='Other', slug='other', inventory=1, unit_price=Decimal(1), collection=self.collection
+            )
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_padded_pks(self):
+        url = '/store/products/0{}/'.format(self.product.pk)
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=self.product.pk).update(inventory=5)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_carts(self):
+        cart = Cart.objects.create()
+        url = '/store/carts/{}/'.format(cart.pk)
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        item = CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        CartItem.objects.filter(pk=item.pk).update(quantity=2)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['items'][0]['quantity'], 2)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        missing = self.client.get('/store/carts/{}/'.format(uuid4()))
+        self.assertEqual(missing.status_code, 404)
+        self.assertNotIn('ETag', missing)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.collections = [Collection.objects.create(title='First'), Collection.objects.create(title='Second')]
+        self.products = [
+            Product.objects.create(
+                title='Product, "{}"'.format(index), slug='exported-{}'.format(index), inventory=index,
+                unit_price=Decimal(index + 1), collection=self.collections[index % 2]
+            )
+            for index in range(5)
+        ]
+
+    def read_ndjson(self, response):
+        self.assertTrue(response.streaming)
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_products_ndjson(self):
+        response = self.client.get(reverse('export-products'))
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="products.ndjson"')
+        rows = self.read_ndjson(response)
+        self.assertEqual([row['id'] for row in rows], [product.pk for product in self.products])
+        self.assertEqual(rows[0]['title'], 'Product, "0"')
+        self.assertEqual((rows[0]['unit_price'], rows[0]['price_with_tax']), (1, 1.1))
+
+        filtered = self.client.get(
+            reverse('export-products'), {'collection_id': self.collections[0].pk, 'unit_price__gte': 2}
+        )
+        self.assertEqual([row['id'] for row in self.read_ndjson(filtered)], [self.products[2].pk, self.products[4].pk])
+
+    def test_products_csv(self):
+        for response in (
+            self.client.get(reverse('export-products'), HTTP_ACCEPT='text/csv'),
+            self.client.get(reverse('export-products'), {'format': 'csv'}),
+        ):
+            self.assertEqual(response['Content-Disposition'], 'attachment; filename="products.csv"')
+            rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+            self.assertEqual(rows[0], EXPORTS['products'].columns)
+            self.assertEqual(len(rows), 6)
+            self.assertEqual(rows[1][:3], [str(self.products[0].pk), 'Product, "0"', 'exported-0'])
+
+    def test_orders_are_for_admins(self):
+        customer = Customer.objects.create(first_name='A', last_name='B', email='a@b.com', phone='1')
+        order = Order.objects.create(customer=customer)
+        OrderItem.objects.create(order=order, product=self.products[0], quantity=2, unit_price=Decimal(1))
+        for name in ('export-orders', 'export-order-items'):
+            self.assertEqual(self.client.get(reverse(name)).status_code, 403)
+        self.client.force_login(get_user_model().objects.create_user('admin', is_staff=True))
+        self.assertEqual([row['id'] for row in self.read_ndjson(self.client.get(reverse('export-orders')))], [order.pk])
+        items = self.read_ndjson(self.client.get(reverse('export-order-items')))
+        self.assertEqual([(row['product_id'], row['quantity']) for row in items], [(self.products[0].pk, 2)])
+
+    def test_rows_are_read_a_chunk_at_a_time(self):
+        queryset = Product.objects.all()
+        with self.assertNumQueries(3):
+            rows = list(iter_rows(queryset, ['id', 'slug'], chunk_size=2))
+        self.assertEqual([row['id'] for row in rows], [product.pk for product in self.products])
+
+    def test_command(self):
+        with NamedTemporaryFile(suffix='.csv') as output:
+            call_command(
+                'export_data', 'products', '--format', 'csv', '--chunk-size', '2', '--output', output.name,
+                '--filter', 'collection_id={}'.format(self.collections[1].pk)
+            )
+            with open(output.name, newline='', encoding='utf-8') as exported:
+                rows = list(csv.reader(exported))
+        self.assertEqual([row[0] for row in rows[1:]], [str(self.products[1].pk), str(self.products[3].pk)])
+        with self.assertRaises(CommandError):
+            call_command('export_data', 'orders', '--filter', 'collection_id=1')
+        with self.assertRaises(CommandError):
+            call_command('export_data', 'products', '--filter', 'unit_price__gte=cheap')
+
+
+class ReviewTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        self.product = Product.objects.create(
+            title='Reviewed', slug='reviewed', inventory=1, unit_price=Decimal(1),
+            collection=Collection.objects.create(title='Reviews')
+        )
+        self.url = reverse('product-reviews-list', args=[self.product.pk])
+
+    def get_stats(self):
+        product = self.client.get('/store/products/{}/'.format(self.product.pk)).json()
+        return product['reviews_count'], product['last_review_at']
+
+    def test_stats_follow_reviews(self):
+        self.assertEqual(self.get_stats(), (0, None))
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.client.post(self.url, {'name': 'A', 'description': 'Good'}).json()
+            second = self.client.post(self.url, {'name': 'B', 'description': 'Bad'}).json()
+        self.assertEqual(second['product'], self.product.pk)
+        self.assertEqual(self.get_stats(), (2, second['date']))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('product-reviews-detail', args=[self.product.pk, second['id']]))
+        self.assertEqual(self.get_stats(), (1, first['date']))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('product-reviews-detail', args=[self.product.pk, first['id']]))
+        self.assertEqual(self.get_stats(), (0, None))
+
+    def test_refresh_after_bulk_writes(self):
+        now = timezone.now()
+        Review.objects.bulk_create(Review(product=self.product, name='A', description='Bulk') for _ in range(3))
+        Review.objects.update(date=now)
+        Product.objects.filter(pk=self.product.pk).refresh_review_stats()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.reviews_count, self.product.last_review_at), (3, now))
+
+    def test_products_go_with_their_reviews(self):
+        Review.objects.create(product=self.product, name='A', description='Good')
+        self.assertEqual(self.client.delete('/store/products/{}/'.format(self.product.pk)).status_code, 204)
+        self.assertFalse(Review.objects.exists())
+
+    def test_pages_newest_first(self):
+        now = timezone.now()
+        reviews = Review.objects.bulk_create(
+            Review(product=self.product, name=str(index), description='Paged') for index in range(12)
+        )
+        for index, review in enumerate(reviews):
+            # pairs of reviews posted at the same time
+            Review.objects.filter(pk=review.pk).update(date=now - timedelta(minutes=index // 2))
+        url, pages = self.url, []
+        while url is not None:
+            payload = self.client.get(url).json()
+            pages.append([review['id'] for review in payload['results']])
+            url = payload['next']
+        expected = list(Review.objects.order_by('-date', 'pk').values_list('pk', flat=True))
+        self.assertEqual([len(page) for page in pages], [10, 2])
+        self.assertEqual(sum(pages, []), expected)
+        self.assertEqual(expected[:2], [reviews[0].pk, reviews[1].pk])
+
+        previous = self.client.get(self.client.get(self.url).json()['next']).json()['previous']
+        self.assertEqual([review['id'] for review in self.client.get(previous).json()['results']], pages[0])
+
+
+class ProductTagTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        collection = Collection.objects.create(title='Tagged')
+        self.products = [
+            Product.objects.create(
+                title='Product {}'.format(index), slug='tagged-{}'.format(index), inventory=1, unit_price=Decimal(1),
+                collection=collection
+            )
+            for index in range(3)
+        ]
+        self.sale, self.new = Tag.objects.create(label='sale'), Tag.objects.create(label='new')
+        Tag.objects.create(label='unused')
+        for tag, product in ((self.sale, 0), (self.sale, 1), (self.new, 1)):
+            TaggedItem.objects.create(tag=tag, content_object=self.products[product])
+        # a collection sharing its id with the last product
+        TaggedItem.objects.create(
+            tag=self.new, content_type=ContentType.objects.get_for_model(Collection), object_id=self.products[2].pk
+        )
+
+    def get_products(self, **params):
+        results = self.client.get('/store/products/', params).json()['results']
+        return [(product['id'], product['tags']) for product in results]
+
+    def test_filter_by_tag(self):
+        first, second, _ = self.products
+        self.assertEqual(self.get_products(tag=self.sale.pk), [(first.pk, ['sale']), (second.pk, ['new', 'sale'])])
+        self.assertEqual(self.get_products(tag=self.new.pk), [(second.pk, ['new', 'sale'])])
+        self.assertEqual(self.get_products(tag=self.sale.pk, search='product'), self.get_products(tag=self.sale.pk))
+        self.assertEqual(self.get_products(tag=0), [])
+
+    def test_cloud(self):
+        cloud = self.client.get('/store/tags/').json()
+        self.assertEqual(cloud, [
+            {'id': self.sale.pk, 'label': 'sale', 'products_count': 2},
+            {'id': self.new.pk, 'label': 'new', 'products_count': 1},
+        ])
+        self.assertEqual(self.client.get('/store/tags/')['X-Cache'], 'HIT')
+        with self.captureOnCommitCallbacks(execute=True):
+            TaggedItem.objects.create(tag=self.new, content_object=self.products[0])
+            TaggedItem.objects.create(tag=self.new, content_object=self.products[2])
+        self.assertEqual(
+            [(tag['label'], tag['products_count']) for tag in self.client.get('/store/tags/').json()],
+            [('new', 3), ('sale', 2)]
+        )
+
+
+class EffectivePriceTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        collection = Collection.objects.create(title='Promoted')
+        self.cheap, self.dear = (
+            Product.objects.create(
+                title=title, slug=title.lower(), inventory=1, unit_price=Decimal(price), collection=collection
+            )
+            for title, price in (('Cheap', '4.00'), ('Dear', '10.00'))
+        )
+        self.quarter = Promotion.objects.create(description='Quarter off', discount=0.25)
+        self.half = Promotion.objects.create(description='Half off', discount=0.5)
+
+    def assertEffectivePrice(self, product, price):
+        product.refresh_from_db()
+        self.assertEqual(product.effective_price, Decimal(price))
+
+    def test_follows_promotions(self):
+        self.assertEffectivePrice(self.dear, '10.00')
+        self.dear.promotions.add(self.quarter)
+        self.assertEffectivePrice(self.dear, '7.50')
+        # the best promotion wins, they do not stack
+        self.half.product_set.add(self.dear, self.cheap)
+        self.assertEffectivePrice(self.dear, '5.00')
+        self.assertEffectivePrice(self.cheap, '2.00')
+        self.half.discount = 0.1
+        self.half.save()
+        self.assertEffectivePrice(self.dear, '7.50')
+        self.assertEffectivePrice(self.cheap, '3.60')
+        self.dear.promotions.remove(self.quarter)
+        self.assertEffectivePrice(self.dear, '9.00')
+        self.half.product_set.clear()
+        self.assertEffectivePrice(self.dear, '10.00')
+        self.assertEffectivePrice(self.cheap, '4.00')
+        self.dear.promotions.add(self.quarter)
+        self.quarter.delete()
+        self.assertEffectivePrice(self.dear, '10.00')
+
+    def test_discounts_are_clamped(self):
+        self.quarter.discount, self.half.discount = -1, 2
+        self.quarter.save()
+        self.half.save()
+        self.cheap.promotions.add(self.quarter)
+        self.assertEffectivePrice(self.cheap, '4.00')
+        self.dear.promotions.add(self.half)
+        self.assertEffectivePrice(self.dear, '0.00')
+
+    def test_follows_unit_price(self):
+        self.dear.promotions.add(self.half)
+        self.dear.unit_price = Decimal(20)
+        self.dear.save()
+        self.assertEffectivePrice(self.dear, '10.00')
+        Product.objects.filter(pk=self.dear.pk).update(unit_price=Decimal(8))
+        self.assertEffectivePrice(self.dear, '4.00')
+        self.dear.unit_price = Decimal(6)
+        Product.objects.bulk_update([self.dear], ['unit_price'])
+        self.assertEffectivePrice(self.dear, '3.00')
+
+    def test_filter_and_ordering(self):
+        self.dear.promotions.add(self.half)
+        self.cheap.promotions.add(self.quarter)
+
+        def get(**params):
+            return [product['id'] for product in self.client.get('/store/products/', params).json()['results']]
+
+        self.assertEqual(get(ordering='effective_price'), [self.cheap.pk, self.dear.pk])
+        self.assertEqual(get(ordering='-effective_price'), [self.dear.pk, self.cheap.pk])
+        self.assertEqual(get(effective_price__gte='4'), [self.dear.pk])
+        self.assertEqual(get(effective_price__lte='3'), [self.cheap.pk])
+        product = self.client.get('/store/products/{}/'.format(self.dear.pk)).json()
+        self.assertEqual((product['unit_price'], product['effective_price']), (10, 5))
+
+    def test_write_responses_carry_the_new_price(self):
+        self.dear.promotions.add(self.half)
+        self.cheap.promotions.add(self.quarter)
+        response = self.client.patch(
+            '/store/products/{}/'.format(self.dear.pk), {'unit_price': '20.00'}, content_type='application/json'
+        )
+        self.assertEqual((response.json()['unit_price'], response.json()['effective_price']), (20, 10))
+        response = self.client.post(reverse('products-batch'), {'operations': [
+            {'op': 'update', 'id': self.dear.pk, 'data': {'unit_price': '30.00'}},
+            {'op': 'update', 'id': self.cheap.pk, 'data': {'unit_price': '8.00'}},
+        ]}, content_type='application/json')
+        self.assertEqual([result['effective_price'] for result in response.json()['operations']], [15, 6])
+        self.assertEffectivePrice(self.dear, '15.00')
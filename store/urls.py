@@ -1,7 +1,7 @@
-from django.urls import include, path
+from django.urls import include, path, re_path
 from rest_framework_nested import routers
 
-from . import views
+from . import async_views, views
 
 # router = SimpleRouter()
 
@@ -9,7 +9,10 @@ from . import views
 router = routers.DefaultRouter()
 router.register('products', views.ProductViewSet, basename='products')
 router.register('collections', views.CollectionViewSet)
+router.register('tags', views.TagViewSet, basename='tags')
 router.register('carts', views.CartViewSet, basename='carts')
+router.register('orders', views.OrderViewSet, basename='orders')
+router.register('sales', views.SalesViewSet, basename='sales')
 # urlpatterns = router.urls
 
 # lookup field will make a product_pk parameter in our url
@@ -17,10 +20,23 @@ products_router = routers.NestedDefaultRouter(router, 'products', lookup='produc
 products_router.register('reviews', views.ReviewViewSet, basename='product-reviews')
 
 carts_router = routers.NestedDefaultRouter(router, 'carts', lookup='cart')
-carts_router.register('cart-items', views.CartViewSet, basename='cart-items')
+carts_router.register('cart-items', views.CartItemViewSet, basename='cart-items')
 
 # in case you want to have some customized paths
 urlpatterns = [
     path('', include(router.urls)),
     path('', include(products_router.urls)),
+    path('', include(carts_router.urls)),
+    path('export/products/', views.ProductExportView.as_view(), name='export-products'),
+    path('export/orders/', views.OrderExportView.as_view(), name='export-orders'),
+    path('export/order-items/', views.OrderItemExportView.as_view(), name='export-order-items'),
+    path('import/products/', views.ProductImportView.as_view(), name='import-products'),
+    # async versions of the hottest reads, for ASGI deployments
+    path('async/products/', async_views.ProductListView.as_view(), name='async-products-list'),
+    path('async/products/<int:pk>/', async_views.ProductDetailView.as_view(), name='async-products-detail'),
+    path('async/collections/', async_views.CollectionListView.as_view(), name='async-collection-list'),
+    re_path(
+        r'^async/carts/(?P<pk>{})/$'.format(views.CartViewSet.lookup_value_regex),
+        async_views.CartDetailView.as_view(), name='async-carts-detail'
+    ),
 ]
@@ -1,49 +1,101 @@
-from django.db.models import Count
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, F, Prefetch, Sum
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
+from mosh_django.sparse import SparseQuerySetMixin
 from rest_framework import status
-from rest_framework.filters import SearchFilter, OrderingFilter
-from rest_framework.mixins import CreateModelMixin, RetrieveModelMixin
+from rest_framework.decorators import action
+from rest_framework.filters import OrderingFilter
+from rest_framework.generics import GenericAPIView
+from rest_framework.mixins import CreateModelMixin, ListModelMixin, RetrieveModelMixin
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.viewsets import ModelViewSet, GenericViewSet
+from rest_framework.viewsets import ModelViewSet, GenericViewSet, ViewSet
+from tags.models import Tag, TaggedItem
 
-from .filters import ProductFilter
-from .models import Product, Collection, OrderItem, Review, Cart
-from .pagination import DefaultPagination
-from .serializers import ProductSerializer, CollectionSerializer, ReviewSerializer, CartSerializer
+from .cache import CachedResponseMixin, PRODUCTS, COLLECTIONS, TAGS
+from .conditional import ConditionalGetMixin
+from .export import EXPORTS, iter_rows, render_lines
+from .filters import ProductFilter, ProductSearchFilter
+from .imports import ProductImport, guess_format, open_text, read_rows
+from .models import Product, Collection, Customer, Order, OrderItem, Review, Cart, CartItem, ProductDailySales, \
+    CollectionDailySales
+from .pagination import DefaultPagination, ProductPagination, ReviewPagination
+from .pricing import price_with_tax
+from .renderers import NDJSONRenderer, CSVRenderer
+from .serializers import ProductSerializer, CollectionSerializer, ReviewSerializer, CartSerializer, \
+    ProductBatchSerializer, CartItemSerializer, AddCartItemSerializer, UpdateCartItemSerializer, OrderSerializer, \
+    CreateOrderSerializer, SalesQuerySerializer, TagSerializer
 
 
-class ReviewViewSet(ModelViewSet):
+class ReviewViewSet(SparseQuerySetMixin, ModelViewSet):
+    # queries per request, checked by the tests through mosh_django.testing.QueryBudgetMixin
+    query_budget = {'list': 1, 'retrieve': 1}
+    queryset = Review.objects.all()
     serializer_class = ReviewSerializer
+    pagination_class = ReviewPagination
 
     def get_serializer_context(self):
         return {
+            'request': self.request,
             'product_id': self.kwargs.get('product_pk'),
         }
 
     def get_queryset(self):
-        return Review.objects.filter(product_id=self.kwargs['product_pk']).prefetch_related('product')
+        return super().get_queryset().filter(product_id=self.kwargs['product_pk'])
 
 
-class ProductViewSet(ModelViewSet):
+class ProductViewSet(ConditionalGetMixin, CachedResponseMixin, SparseQuerySetMixin, ModelViewSet):
+    cache_namespace = PRODUCTS
+    query_budget = {'list': 3, 'retrieve': 2}
     queryset = Product.objects.all()
     # filtering by third-party application: django-filter
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    # ProductSearchFilter searches title and description through store.search
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, OrderingFilter]
     filterset_class = ProductFilter
-    search_fields = ['title', 'description']
-    ordering_fields = ['unit_price', 'last_update']
+    ordering_fields = ['unit_price', 'effective_price', 'last_update']
+    # default ordering, also the one keyset pagination falls back to
+    ordering = ['title']
 
     # filter_fields = ['collection_id']
 
     # pagination_class = PageNumberPagination
-    pagination_class = DefaultPagination
+    # pagination_class = DefaultPagination
+    pagination_class = ProductPagination
 
     serializer_class = ProductSerializer
     lookup_field = 'pk'  # name of the url parameter
     lookup_url_kwarg = 'pk'
 
+    # serve the list action from `.values()` rows, see ProductListSerializer
+    serialize_from_values = True
+
+    def get_queryset(self):
+        queryset = super().get_queryset().annotate(price_with_tax=price_with_tax())
+        fields = self.get_sparse_fields()
+        if self.action == 'list' and self.serialize_from_values:
+            # only the fields asked for, plus the pk for the tag labels and the ordering fields for the cursors
+            columns = dict.fromkeys(['id', *fields, *self.ordering, *self.ordering_fields])
+            # not a column, ProductListSerializer fetches the tags of a whole page at once
+            columns.pop('tags', None)
+            return queryset.values(*columns)
+        if 'tags' not in fields:
+            return queryset
+        return queryset.prefetch_related(
+            Prefetch('tags', queryset=TaggedItem.objects.select_related('tag').order_by('tag__label', 'pk'))
+        )
+
     def get_serializer_context(self):
         return {'request': self.request}
 
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        serializer = ProductBatchSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
+
     def destroy(self, request, *args, **kwargs):
         if OrderItem.objects.filter(product_id=kwargs['pk']).count() > 0:
             return Response({'error': 'Product can not be deleted because it is associated with an order item'},
@@ -60,9 +112,12 @@ class ProductViewSet(ModelViewSet):
     #     return Product.objects.all()
 
 
-class CollectionViewSet(ModelViewSet):
+class CollectionViewSet(ConditionalGetMixin, CachedResponseMixin, SparseQuerySetMixin, ModelViewSet):
+    cache_namespace = COLLECTIONS
+    query_budget = {'list': 2, 'retrieve': 1}
     serializer_class = CollectionSerializer
-    queryset = Collection.objects.annotate(products_count=Count('products')).all()
+    queryset = Collection.objects.all()
+    pagination_class = DefaultPagination
 
     def get_serializer_context(self):
         return {'request': self.request}
@@ -74,16 +129,246 @@ class CollectionViewSet(ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
 
-class CartViewSet(CreateModelMixin, GenericViewSet, RetrieveModelMixin):
-    queryset = Cart.objects.prefetch_related('items__product').all()
+class TagViewSet(ConditionalGetMixin, CachedResponseMixin, ListModelMixin, GenericViewSet):
+    """
+    Tag cloud: every tag used on products with the number of products it is on.
+    """
+    cache_namespace = TAGS
+    query_budget = {'list': 1}
+    serializer_class = TagSerializer
+    pagination_class = None
+
+    def get_queryset(self):
+        return (
+            Tag.objects.filter(taggeditem__content_type=ContentType.objects.get_for_model(Product))
+            .annotate(products_count=Count('taggeditem'))
+            .order_by('-products_count', 'label')
+        )
+
+
+class CartViewSet(ConditionalGetMixin, SparseQuerySetMixin, CreateModelMixin, GenericViewSet, RetrieveModelMixin):
+    # the ETag query, the cart and its items
+    query_budget = {'retrieve': 3}
+    queryset = Cart.objects.prefetch_related(
+        Prefetch('items', queryset=CartItem.objects.select_related('product').annotate(
+            total_price=F('quantity') * F('product__unit_price')
+        ))
+    ).annotate(
+        total_price=Sum(F('items__quantity') * F('items__product__unit_price'))
+    ).all()
     serializer_class = CartSerializer
     pagination_class = DefaultPagination
+    lookup_value_regex = '[0-9a-fA-F-]{32,36}'
 
     def get_serializer_context(self):
         return {
             'request': self.request
         }
 
+    def get_validators(self, request, object_pk=None):
+        # every input of the cart payload (see CartSerializer) in one small query, the LEFT JOIN
+        # gives an empty cart a single row of NULLs and a missing cart none
+        state = list(
+            Cart.objects.filter(pk=object_pk)
+            .values_list(
+                'items__id', 'items__product_id', 'items__quantity', 'items__product__title',
+                'items__product__unit_price'
+            )
+            .order_by('items__id')
+        )
+        if not state:
+            return None, None
+        # quantities change without touching any timestamp, so ETag only
+        return self.make_etag(request, state), None
+
+
+class ExportView(GenericAPIView):
+    """
+    Streams every row of an export as NDJSON or CSV, picked by the Accept
+    header or `?format=`, without holding the result set in memory.
+    """
+    renderer_classes = [NDJSONRenderer, CSVRenderer]
+    filter_backends = [DjangoFilterBackend]
+    export_name = None
+
+    @property
+    def filterset_class(self):
+        return EXPORTS[self.export_name].filterset_class
+
+    def get_queryset(self):
+        return EXPORTS[self.export_name].get_queryset()
+
+    def get(self, request):
+        columns = EXPORTS[self.export_name].columns
+        rows = iter_rows(self.filter_queryset(self.get_queryset()), columns)
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            render_lines(rows, columns, renderer.format),
+            content_type='{}; charset={}'.format(renderer.media_type, renderer.charset)
+        )
+        response['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(self.export_name, renderer.format)
+        return response
+
+
+class ProductExportView(ExportView):
+    export_name = 'products'
+
+
+class OrderExportView(ExportView):
+    export_name = 'orders'
+    permission_classes = [IsAdminUser]
+
+
+class OrderItemExportView(ExportView):
+    export_name = 'order-items'
+    permission_classes = [IsAdminUser]
+
+
+class ProductImportView(GenericAPIView):
+    """
+    Upserts products by slug from an uploaded CSV or NDJSON `file`, picked
+    by `format` or the file extension, see store.imports.ProductImport.
+    Uploads past FILE_UPLOAD_MAX_MEMORY_SIZE are spooled to disk and read
+    back a chunk at a time.
+    """
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'file': ['No file was submitted.']}, status=status.HTTP_400_BAD_REQUEST)
+        input_format = request.data.get('format') or guess_format(upload.name)
+        if input_format not in ('csv', 'ndjson'):
+            return Response({'format': ['Either csv or ndjson.']}, status=status.HTTP_400_BAD_REQUEST)
+
+        importer = ProductImport()
+        try:
+            importer.run(read_rows(open_text(upload.file), input_format))
+        except UnicodeDecodeError:
+            return Response({'file': ['Not UTF-8 text.']}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(importer.as_dict())
+
+
+class CartItemViewSet(SparseQuerySetMixin, ModelViewSet):
+    http_method_names = ['get', 'post', 'patch', 'delete']
+    query_budget = {'list': 2}
+    queryset = CartItem.objects.all()
+
+    def get_serializer_class(self):
+        if self.request.method == 'POST':
+            return AddCartItemSerializer
+        if self.request.method == 'PATCH':
+            return UpdateCartItemSerializer
+        return CartItemSerializer
+
+    def get_serializer_context(self):
+        return {
+            'request': self.request,
+            'cart_id': self.kwargs.get('cart_pk'),
+        }
+
+    def get_queryset(self):
+        return super().get_queryset().filter(cart_id=self.kwargs['cart_pk']).select_related('product').annotate(
+            total_price=F('quantity') * F('product__unit_price')
+        ).order_by('id')
+
+    def create(self, request, *args, **kwargs):
+        if not Cart.objects.filter(pk=self.kwargs['cart_pk']).exists():
+            return Response({'error': 'Cart was not found'}, status=status.HTTP_404_NOT_FOUND)
+        return super().create(request, *args, **kwargs)
+
+
+class OrderViewSet(SparseQuerySetMixin, ModelViewSet):
+    """
+    Orders are placed by checking a cart out, see OrderQuerySet.place, as the
+    customer of the user signed in.
+    """
+    http_method_names = ['get', 'post']
+    # session and user lookups included
+    query_budget = {'list': 5, 'retrieve': 4}
+    queryset = Order.objects.prefetch_related(
+        Prefetch('orderitem_set', queryset=OrderItem.objects.select_related('product').order_by('id'))
+    ).order_by('-placed_at', '-id')
+    pagination_class = DefaultPagination
+
+    def get_permissions(self):
+        if self.request.method == 'POST':
+            return [IsAuthenticated()]
+        return [IsAdminUser()]
+
+    def get_serializer_class(self):
+        if self.request.method == 'POST':
+            return CreateOrderSerializer
+        return OrderSerializer
+
+    def create(self, request, *args, **kwargs):
+        customer_id = Customer.objects.filter(user=request.user).values_list('pk', flat=True).first()
+        if customer_id is None:
+            return Response({'error': 'There is no customer for this user'}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = CreateOrderSerializer(data=request.data, context={'customer_id': customer_id})
+        serializer.is_valid(raise_exception=True)
+        order = serializer.save()
+        serializer = OrderSerializer(self.get_queryset().get(pk=order.pk))
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class SalesViewSet(ViewSet):
+    """
+    Sales figures read from the daily rollups of store.analytics, which
+    the refresh_sales_rollups command keeps up to date.
+    """
+    permission_classes = [IsAdminUser]
+    # session and user lookups included
+    query_budget = {'top_products': 3, 'revenue': 3, 'collections': 3}
+
+    def get_query(self, request):
+        serializer = SalesQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    @staticmethod
+    def in_range(queryset, query):
+        if 'since' in query:
+            queryset = queryset.filter(day__gte=query['since'])
+        if 'until' in query:
+            queryset = queryset.filter(day__lte=query['until'])
+        return queryset
+
+    @action(detail=False, url_path='top-products')
+    def top_products(self, request):
+        query = self.get_query(request)
+        queryset = self.in_range(ProductDailySales.objects.all(), query)
+        if 'collection_id' in query:
+            queryset = queryset.filter(product__collection_id=query['collection_id'])
+        rows = (
+            queryset.values('product_id', title=F('product__title'))
+            .annotate(quantity=Sum('quantity'), revenue=Sum('revenue'))
+            .order_by('-revenue', 'product_id')[:query['limit']]
+        )
+        return Response(list(rows))
+
+    @action(detail=False)
+    def revenue(self, request):
+        query = self.get_query(request)
+        queryset = self.in_range(CollectionDailySales.objects.all(), query)
+        if 'collection_id' in query:
+            queryset = queryset.filter(collection_id=query['collection_id'])
+        rows = queryset.values('day').annotate(quantity=Sum('quantity'), revenue=Sum('revenue')).order_by('day')
+        return Response(list(rows))
+
+    @action(detail=False)
+    def collections(self, request):
+        query = self.get_query(request)
+        rows = (
+            self.in_range(CollectionDailySales.objects.all(), query)
+            .values('collection_id', title=F('collection__title'))
+            .annotate(quantity=Sum('quantity'), revenue=Sum('revenue'))
+            .order_by('-revenue', 'collection_id')
+        )
+        return Response(list(rows))
+
+
 # class ProductList(ListCreateAPIView):
 #     pass
 #     def get_queryset(self):
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.3 on 2026-10-18 10:48
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def drop_duplicates(apps, schema_editor):
+    # the same tag on the same object twice, keep the first
+    TaggedItem = apps.get_model('tags', 'TaggedItem')
+    duplicates = (
+        TaggedItem.objects.values('content_type', 'object_id', 'tag')
+        .annotate(first=Min('pk'), count=Count('pk')).filter(count__gt=1).order_by()
+    )
+    for duplicate in duplicates:
+        TaggedItem.objects.filter(
+            content_type=duplicate['content_type'], object_id=duplicate['object_id'], tag=duplicate['tag']
+        ).exclude(pk=duplicate['first']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('tags', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='taggeditem',
+            constraint=models.UniqueConstraint(fields=('content_type', 'object_id', 'tag'), name='tags_taggeditem_unique'),
+        ),
+    ]
@@ -1,3 +1,5 @@
+from collections import defaultdict
+
 from django.db import models
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
@@ -9,8 +11,49 @@ class Tag(models.Model):
     label = models.CharField(max_length=255)
 
 
+class TaggedItemManager(models.Manager):
+    def get_labels_for(self, model, object_ids):
+        """
+        `{object_id: [label, ...]}` for the given objects of the model, in one query.
+        """
+        labels = defaultdict(list)
+        rows = self._label_rows(object_ids, content_type=ContentType.objects.get_for_model(model))
+        for object_id, label in rows:
+            labels[object_id].append(label)
+        return labels
+
+    async def aget_labels_for(self, model, object_ids):
+        """
+        `get_labels_for()` for async code. The content type is matched by
+        name in the same query, looking it up could hit the database
+        synchronously.
+        """
+        labels = defaultdict(list)
+        rows = self._label_rows(
+            object_ids, content_type__app_label=model._meta.app_label, content_type__model=model._meta.model_name
+        )
+        async for object_id, label in rows:
+            labels[object_id].append(label)
+        return labels
+
+    def _label_rows(self, object_ids, **content_type):
+        return (
+            self.filter(object_id__in=object_ids, **content_type)
+            .order_by('tag__label', 'pk')
+            .values_list('object_id', 'tag__label')
+        )
+
+
 class TaggedItem(models.Model):
     tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     object_id = models.PositiveIntegerField()
     content_object = GenericForeignKey()
+
+    objects = TaggedItemManager()
+
+    class Meta:
+        # also the (content_type, object_id) index the reverse lookups go through
+        constraints = [
+            models.UniqueConstraint(fields=['content_type', 'object_id', 'tag'], name='tags_taggeditem_unique')
+        ]